@@ -0,0 +1,79 @@
+"""
+Выгрузка счетов со владельцем для админки без ORM: Core select кортежей (без identity map
+и Pydantic на каждую строку), сериализация строк сразу в JSON / NDJSON кусками.
+"""
+
+import json
+from collections.abc import Iterator
+from typing import Literal
+
+from sqlalchemy import Select, select
+from sqlalchemy.engine import Engine
+
+from app.models import Account, User
+
+ExportFormat = Literal["json", "ndjson"]
+
+# Сколько строк забирать из курсора и сериализовать за один кусок ответа
+EXPORT_CHUNK_ROWS = 1000
+
+ACCOUNT_EXPORT_COLUMNS = (
+    Account.id,
+    Account.account_number,
+    Account.account_type,
+    Account.currency,
+    Account.balance,
+    Account.is_primary,
+    Account.user_id,
+    User.login.label("owner_login"),
+)
+
+
+def accounts_with_owner_query(*, after_id: int | None = None, limit: int | None = None) -> Select:
+    """Активные счета с логином владельца, по возрастанию id (keyset: after_id — id последней полученной строки)."""
+    q = (
+        select(*ACCOUNT_EXPORT_COLUMNS)
+        .join(User, User.id == Account.user_id)
+        .where(Account.is_active.is_(True))
+        .order_by(Account.id)
+    )
+    if after_id is not None:
+        q = q.where(Account.id > after_id)
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+
+def _row_json(row) -> str:
+    return json.dumps(
+        {
+            "id": row.id,
+            "account_number": row.account_number,
+            "account_type": row.account_type.value,
+            "currency": row.currency.value,
+            "balance": str(row.balance),
+            "is_primary": row.is_primary,
+            "user_id": row.user_id,
+            "owner_login": row.owner_login,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def stream_accounts(bind: Engine, query: Select, fmt: ExportFormat) -> Iterator[bytes]:
+    """Куски ответа: соединение своё (живёт, пока идёт выгрузка), курсор серверный (stream_results)."""
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(query)
+        first = True
+        if fmt == "json":
+            yield b"["
+        for rows in result.partitions():
+            lines = [_row_json(row) for row in rows]
+            if fmt == "ndjson":
+                yield ("\n".join(lines) + "\n").encode()
+            else:
+                yield (("" if first else ",") + ",".join(lines)).encode()
+            first = False
+        if fmt == "json":
+            yield b"]"
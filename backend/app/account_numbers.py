@@ -0,0 +1,109 @@
+"""
+Выдача номеров счетов без проверок уникальности.
+
+Номер = префикс валюты (4 цифры) + 11 цифр тела + контрольная цифра по алгоритму Луна.
+Тело получается из значения последовательности БД (отдельная на каждую валюту) ключевой
+перестановкой: несбалансированная сеть Фейстеля над [0, 10^11) (половины 10^5 и 10^6).
+Перестановка — биекция, поэтому разные значения последовательности всегда дают разные
+номера, а соседние значения не выглядят последовательными. Ключ — ACCOUNT_NUMBER_KEY, отдельный
+от SECRET_KEY: ротация секрета JWT не должна менять перестановку (новые номера совпали бы со старыми).
+"""
+
+import hashlib
+import hmac
+from functools import lru_cache
+
+from sqlalchemy import Sequence, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import Base
+from app.models import Currency
+
+ACCOUNT_NUMBER_PREFIXES: dict[Currency, str] = {
+    Currency.RUB: "2202",
+    Currency.USD: "3202",
+    Currency.EUR: "4202",
+    Currency.CNY: "5202",
+}
+
+ACCOUNT_NUMBER_LENGTH = 16
+_BODY_DIGITS = ACCOUNT_NUMBER_LENGTH - 4 - 1
+_BODY_SPACE = 10**_BODY_DIGITS
+_LEFT_SPACE = 10**5
+_RIGHT_SPACE = _BODY_SPACE // _LEFT_SPACE
+_FEISTEL_ROUNDS = 4  # чётное число раундов: половины возвращаются к исходным размерам
+
+# Последовательности создаются вместе с таблицами (Base.metadata.create_all)
+ACCOUNT_NUMBER_SEQUENCES: dict[Currency, Sequence] = {
+    currency: Sequence(
+        f"account_number_seq_{currency.value.lower()}", start=1, maxvalue=_BODY_SPACE - 1, metadata=Base.metadata
+    )
+    for currency in ACCOUNT_NUMBER_PREFIXES
+}
+
+
+@lru_cache(maxsize=1)
+def _permutation_key() -> bytes:
+    return hashlib.sha256(b"shlapabank:account-number:" + settings.account_number_key.encode()).digest()
+
+
+def _round_value(key: bytes, round_no: int, value: int) -> int:
+    digest = hmac.new(key, bytes([round_no]) + value.to_bytes(4, "big"), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def permute(value: int) -> int:
+    """Биекция [0, 10^11) → [0, 10^11), зависящая от ключа."""
+    if not 0 <= value < _BODY_SPACE:
+        raise ValueError("account_number_space_exhausted")
+    key = _permutation_key()
+    left, right = divmod(value, _RIGHT_SPACE)
+    left_space, right_space = _LEFT_SPACE, _RIGHT_SPACE
+    for round_no in range(_FEISTEL_ROUNDS):
+        left, right = right, (left + _round_value(key, round_no, right)) % left_space
+        left_space, right_space = right_space, left_space
+    return left * right_space + right
+
+
+def luhn_check_digit(digits: str) -> str:
+    """Контрольная цифра Луна для строки цифр (дописывается в конец)."""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(number: str) -> bool:
+    """Номер из 16 цифр с корректной контрольной цифрой."""
+    if len(number) != ACCOUNT_NUMBER_LENGTH or not number.isdigit():
+        return False
+    return luhn_check_digit(number[:-1]) == number[-1]
+
+
+def format_account_number(currency: Currency, sequence_value: int) -> str:
+    """Номер счёта для значения последовательности валюты."""
+    body = f"{ACCOUNT_NUMBER_PREFIXES[currency]}{permute(sequence_value):0{_BODY_DIGITS}d}"
+    return body + luhn_check_digit(body)
+
+
+def allocate_account_number(db: Session | Connection, currency: Currency) -> str:
+    """Новый номер счёта: один nextval(), без проверки уникальности в таблице."""
+    value = db.scalar(select(ACCOUNT_NUMBER_SEQUENCES[currency].next_value()))
+    return format_account_number(currency, value)
+
+
+def allocate_account_numbers(db: Session | Connection, currency: Currency, count: int) -> list[str]:
+    """Пачка номеров одним запросом (nextval по generate_series) — для сидирования и генераторов данных."""
+    if count <= 0:
+        return []
+    values = db.scalars(
+        select(ACCOUNT_NUMBER_SEQUENCES[currency].next_value()).select_from(func.generate_series(1, count))
+    ).all()
+    return [format_account_number(currency, value) for value in values]
@@ -0,0 +1,237 @@
+"""
+Сжатие ответов (zstd / brotli / gzip по Accept-Encoding).
+
+Чистый ASGI-middleware: тело копится до STREAM_BUFFER_SIZE; если ответ закончился раньше, он
+сжимается целиком (тела меньше COMPRESSION_MIN_SIZE — не сжимаются). Длинный поток
+(StreamingResponse — выгрузка счетов и т.п.) сжимается по мере отдачи, каждый кусок
+сбрасывается в сеть сразу. Не трогаем ответы, у которых уже есть Content-Encoding (готовые
+варианты статики UI), text/event-stream и несжимаемые типы (картинки, шрифты).
+zstd и brotli — необязательные пакеты: без них остаётся gzip.
+"""
+
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "text/",
+    "image/svg+xml",
+)
+# Порядок предпочтения при равных q
+_PREFERENCE = ("zstd", "br", "gzip")
+# Сколько тела копить, прежде чем считать ответ потоковым и сжимать по кускам без Content-Length
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Разрешает ли Accept-Encoding кодировку coding (q > 0)."""
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() != coding:
+            continue
+        key, _, value = params.strip().partition("=")
+        if key.strip().lower() == "q":
+            try:
+                return float(value) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def available_encodings() -> tuple[str, ...]:
+    return tuple(
+        coding
+        for coding in _PREFERENCE
+        if (coding != "zstd" or zstandard is not None) and (coding != "br" or brotli is not None)
+    )
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    for coding in available_encodings():
+        if accepts_encoding(accept_encoding, coding):
+            return coding
+    return None
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        """Отдать всё накопленное, поток продолжается."""
+        ...
+
+    def finish(self) -> bytes: ...
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def make_compressor(coding: str, level: int) -> StreamCompressor:
+    if coding == "zstd":
+        return _ZstdCompressor(level)
+    if coding == "br":
+        return _BrotliCompressor(level)
+    return _GzipCompressor(level)
+
+
+def compress_bytes(coding: str, data: bytes, level: int) -> bytes:
+    compressor = make_compressor(coding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").lower()
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, *, minimum_size: int = 1024, level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(send, coding, self.minimum_size, self.level)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, coding: str | None, minimum_size: int, level: int):
+        self._send = send
+        self._coding = coding
+        self._minimum_size = minimum_size
+        self._level = level
+        self._start: Message | None = None
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._compressor: StreamCompressor | None = None
+        # None — решение ещё не принято (тело копится в буфере); False — отдаём как есть; True — сжимаем поток
+        self._active: bool | None = None
+
+    async def send(self, message: Message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            self._start = message
+            headers = Headers(raw=message["headers"])
+            status = message["status"]
+            if "content-encoding" in headers or status < 200 or status in (204, 304) or not _compressible(headers):
+                self._active = False
+                await self._send(message)
+                return
+            # Ответ зависит от Accept-Encoding, даже если этот клиент сжатие не принял
+            MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            if self._coding is None:
+                self._active = False
+                await self._send(message)
+            return
+        if kind != "http.response.body" or self._active is False:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._active is None:
+            # BaseHTTPMiddleware отдаёт даже обычный ответ кусками, поэтому копим тело: если оно кончится
+            # в пределах буфера — сожмём целиком (с Content-Length) или отдадим как есть, если оно мелкое
+            self._buffer.append(body)
+            self._buffered += len(body)
+            if more_body and self._buffered < max(self._minimum_size, STREAM_BUFFER_SIZE):
+                return
+            body = b"".join(self._buffer)
+            self._buffer = []
+            if not more_body and len(body) < self._minimum_size:
+                self._active = False
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._begin(complete_length=None if more_body else len(body), body=body)
+            return
+
+        await self._emit(body, more_body)
+
+    async def _begin(self, *, complete_length: int | None, body: bytes) -> None:
+        self._active = True
+        self._compressor = make_compressor(self._coding, self._level)
+        headers = MutableHeaders(raw=self._start["headers"])
+        headers["Content-Encoding"] = self._coding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # Сжатое тело — другое представление: сильный ETag исходного тела ему не подходит
+            headers["ETag"] = "W/" + etag
+        if complete_length is None:
+            del headers["Content-Length"]
+            await self._send(self._start)
+            await self._emit(body, True)
+            return
+        compressed = self._compressor.compress(body) + self._compressor.finish()
+        headers["Content-Length"] = str(len(compressed))
+        await self._send(self._start)
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def _emit(self, body: bytes, more_body: bool) -> None:
+        # Каждый кусок потока сбрасываем сразу: клиент получает данные по мере выгрузки
+        chunk = self._compressor.compress(body)
+        chunk += self._compressor.flush() if more_body else self._compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
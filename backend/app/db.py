@@ -1,12 +1,84 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.core.config import settings
 
+logger = logging.getLogger("shlapabank.db")
+
 engine = create_engine(settings.database_url, future=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 Base = declarative_base()
 
+# Реплика только для чтения: если DATABASE_REPLICA_URL не задан, чтение идёт в основную БД
+read_engine = (
+    create_engine(
+        settings.database_replica_url,
+        future=True,
+        connect_args={"connect_timeout": settings.replica_connect_timeout_seconds},
+    )
+    if settings.database_replica_url
+    else engine
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, future=True)
+
+# Отставание реплики проверяется не чаще раза в секунду на процесс, а не в каждом запросе
+_REPLICA_CHECK_INTERVAL_SECONDS = 1.0
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+_replica_lock = threading.Lock()
+_replica_checked_at = 0.0
+_replica_usable = True
+
+
+def _check_replica() -> bool:
+    try:
+        with read_engine.connect() as conn:
+            lag = conn.scalar(_REPLICA_LAG_SQL)
+    except Exception:
+        logger.warning("replica unavailable, reading from primary", exc_info=True)
+        return False
+    lag_seconds = float(lag or 0)
+    if lag_seconds > settings.replica_max_lag_seconds:
+        logger.warning(
+            "replica lag %.1fs exceeds %.1fs, reading from primary",
+            lag_seconds,
+            settings.replica_max_lag_seconds,
+        )
+        return False
+    return True
+
+
+def replica_is_usable() -> bool:
+    """Можно ли читать с реплики: она настроена, доступна и отстаёт не больше допустимого."""
+    global _replica_checked_at, _replica_usable
+    if read_engine is engine:
+        return False
+    now = time.monotonic()
+    if now - _replica_checked_at < _REPLICA_CHECK_INTERVAL_SECONDS:
+        return _replica_usable
+    # Проверяет один поток; остальные не ждут его (подключение к зависшей реплике — до таймаута),
+    # а берут прошлый результат
+    if not _replica_lock.acquire(blocking=False):
+        return _replica_usable
+    try:
+        if now - _replica_checked_at >= _REPLICA_CHECK_INTERVAL_SECONDS:
+            _replica_usable = _check_replica()
+            _replica_checked_at = time.monotonic()
+        return _replica_usable
+    finally:
+        _replica_lock.release()
+
+
+def current_read_engine():
+    """Движок для чтения с учётом состояния реплики (для потоковых выгрузок со своим соединением)."""
+    return read_engine if replica_is_usable() else engine
+
 
 def get_db():
     db = SessionLocal()
@@ -14,3 +86,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Сессия для ручек только на чтение (история, админские списки): реплика или, при отставании, основная БД.
+    Денежные операции и всё, что пишет, используют get_db."""
+    db = ReadSessionLocal() if replica_is_usable() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -6,7 +6,8 @@ import logging
 import re
 import threading
 import uuid
-from collections import Counter, deque
+from collections import Counter
+from collections.abc import Callable
 from contextvars import ContextVar
 from datetime import datetime, timezone
 from typing import Any
@@ -15,12 +16,15 @@ from sqlalchemy import event
 from sqlalchemy.orm import Session as OrmSession
 
 from app.core.config import settings
+from app.trace_ring import TraceRing, default_ring_path
 
 logger = logging.getLogger("shlapabank.dev_trace")
 
-MAX_ENTRIES = 200
-_buffer: deque[dict[str, Any]] = deque(maxlen=MAX_ENTRIES)
-_lock = threading.Lock()
+# Буфер общий для всех воркеров (mmap-файл, см. app/trace_ring.py); создаётся при первом обращении
+_ring: TraceRing | None = None
+_ring_lock = threading.Lock()
+# Кого будить после новой записи (поток SSE, см. app/trace_stream.py)
+_record_listeners: tuple[Callable[[], None], ...] = ()
 
 _CORRELATION_HEADER_RE = re.compile(r"^[A-Za-z0-9._-]{1,80}$")
 
@@ -40,6 +44,16 @@ _db_notes_var: ContextVar[list[str] | None] = ContextVar("db_notes", default=Non
 _db_hooks_installed = False
 
 
+def _get_ring() -> TraceRing:
+    global _ring
+    if _ring is None:
+        with _ring_lock:
+            if _ring is None:
+                capacity, writers = settings.dev_trace_capacity, settings.dev_trace_max_writers
+                _ring = TraceRing(capacity, writers, settings.dev_trace_ring_file or default_ring_path(capacity, writers))
+    return _ring
+
+
 def _utc_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
 
@@ -134,20 +148,31 @@ def record_http_event(
     }
     if correlation_id:
         entry["correlation_id"] = correlation_id
-    with _lock:
-        _buffer.append(entry)
+    _get_ring().append(entry)
+    for listener in _record_listeners:
+        listener()
 
     q = f"?{query}" if query else ""
     extra = f" | {db_summary}" if db_summary else ""
     logger.info("%s %s%s -> %s (%.1f ms)%s", method, path, q, status_code, duration_ms, extra)
 
 
-def get_recent_entries() -> list[dict[str, Any]]:
-    with _lock:
-        return list(_buffer)
+def get_recent_entries(since: int = 0) -> tuple[list[dict[str, Any]], int]:
+    """Записи всех воркеров с seq > since (по возрастанию seq) и курсор для следующего запроса."""
+    return _get_ring().read(since)
+
+
+def ring_state() -> tuple[int, ...]:
+    """Дешёвый отпечаток буфера: меняется при любой новой записи или очистке (без чтения слотов)."""
+    return _get_ring().state()
+
+
+def add_record_listener(listener: Callable[[], None]) -> None:
+    global _record_listeners
+    if listener not in _record_listeners:
+        _record_listeners = (*_record_listeners, listener)
 
 
 def clear_trace_buffer() -> None:
     """Сбросить учебный журнал на сервере (кнопка «Очистить» в UI)."""
-    with _lock:
-        _buffer.clear()
+    _get_ring().clear()
@@ -0,0 +1,94 @@
+"""
+Быстрый путь сериализации списков (включается FAST_JSON_RESPONSES=true).
+
+Обычный путь: ORM-объекты (identity map) → валидация каждой строки через response_model
+(для операций — ещё и Python-валидатор money) → JSON. Быстрый путь: Core select колонок,
+уже приведённых в SQL к виду ответа (суммы — текстом numeric(14,2), перечисления — строками),
+строки → dict → orjson. Формат ответа тот же, что у TransactionPublic / AccountPublic / UserPublic;
+совпадение проверяют precomputed TypeAdapter'ы схем в bench/bench_serialization.py и tests/test_fast_json.py
+(сравнение с обычным путём для операций, счетов и пользователей; режим API_TEST_MODE=inprocess).
+"""
+
+from collections.abc import Iterable, Mapping
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import String, case, cast, func
+from starlette.responses import JSONResponse
+
+from app.models import Account, Transaction, User
+from app.schemas import AccountPublic, TransactionPublic, UserPublic
+
+# TypeAdapter строит валидатор/сериализатор один раз при импорте, а не на каждый вызов
+transaction_list_adapter = TypeAdapter(list[TransactionPublic])
+account_list_adapter = TypeAdapter(list[AccountPublic])
+user_list_adapter = TypeAdapter(list[UserPublic])
+
+_fee = func.coalesce(Transaction.fee, 0)
+
+TRANSACTION_COLUMNS = (
+    Transaction.id,
+    cast(Transaction.type, String).label("type"),
+    cast(Transaction.amount, String).label("amount"),
+    cast(cast(_fee, Transaction.amount.type), String).label("fee"),
+    cast(cast(Transaction.amount + _fee, Transaction.amount.type), String).label("total"),
+    cast(Transaction.currency, String).label("currency"),
+    Transaction.description,
+    Transaction.created_at,
+    Transaction.from_account_id,
+    Transaction.to_account_id,
+    cast(Transaction.status, String).label("status"),
+    Transaction.rate_snapshot_id,
+)
+ACCOUNT_COLUMNS = (
+    Account.id,
+    Account.account_number,
+    cast(Account.account_type, String).label("account_type"),
+    cast(Account.currency, String).label("currency"),
+    cast(Account.balance, String).label("balance"),
+    Account.is_primary,
+)
+USER_COLUMNS = (
+    User.id,
+    User.login,
+    case((func.trim(User.email) == "", None), else_=User.email).label("email"),
+    cast(User.role, String).label("role"),
+    cast(User.status, String).label("status"),
+    func.coalesce(User.first_name, "").label("first_name"),
+    func.coalesce(User.last_name, "").label("last_name"),
+    User.phone,
+)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, кодируемый orjson (datetime — ISO 8601, как у Pydantic)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def transaction_rows(rows: Iterable) -> list[dict]:
+    """Строки TRANSACTION_COLUMNS → вид TransactionPublic (money — вложенный объект)."""
+    return [
+        {
+            "id": row.id,
+            "type": row.type,
+            "money": {"amount": row.amount, "fee": row.fee, "total": row.total, "currency": row.currency},
+            "description": row.description,
+            "created_at": row.created_at,
+            "from_account_id": row.from_account_id,
+            "to_account_id": row.to_account_id,
+            "status": row.status,
+            "rate_snapshot_id": row.rate_snapshot_id,
+        }
+        for row in rows
+    ]
+
+
+def plain_rows(rows: Iterable) -> list[dict]:
+    """Строки ACCOUNT_COLUMNS / USER_COLUMNS: ключи уже совпадают с полями схемы ответа."""
+    return [dict(row._mapping) for row in rows]
+
+
+def rows_response(items: list[dict], *, headers: Mapping[str, str] | None = None) -> FastJSONResponse:
+    return FastJSONResponse(items, headers=headers)
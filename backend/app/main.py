@@ -5,12 +5,30 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 
 from fastapi import FastAPI
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
 
+from app.compression import CompressionMiddleware
 from app.core.config import settings
 from app.dev_trace import clear_request_context, record_http_event, reset_request_context, sanitize_correlation_id
+from app.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    ERROR_DETAIL_SCOPE_KEY,
+    MetricsMiddleware,
+    collect_all,
+    error_detail_label,
+    init_metrics,
+    render,
+    shutdown_metrics,
+)
+from app.password_pool import shutdown_pool
+from app.query_budget import QueryBudgetMiddleware, init_query_budget
+from app.rates import refresh_rates
 from app.routes.accounts import router as accounts_router
 from app.routes.admin import router as admin_router
 from app.routes.auth import router as auth_router
@@ -21,7 +39,10 @@ from app.routes.payments import router as payments_router
 from app.routes.profile import router as profile_router
 from app.routes.transactions import router as transactions_router
 from app.routes.transfers import router as transfers_router
+from app.slow_queries import init_slow_query_log, shutdown_slow_query_log
 from app.startup import init_db
+from app.tracing import TracingMiddleware, init_tracing, shutdown_tracing
+from app.ui_assets import asset_response, init_ui_assets, ui_page
 
 openapi_tags = [
     {"name": "dev", "description": "Учебная трассировка (только dev / ENABLE_DEV_TRACE)."},
@@ -51,11 +72,14 @@ app.add_middleware(
 
 
 class NoCacheStaticMiddleware(BaseHTTPMiddleware):
-    """Отключает кеш для UI — чтобы при обновлениях не показывались старые CSS/JS."""
+    """Отключает кеш для UI — чтобы при обновлениях не показывались старые CSS/JS.
+
+    Файлы с хешем в имени (/ui/assets/…, см. app/ui_assets.py) сами задают Cache-Control immutable — их не трогаем.
+    """
 
     async def dispatch(self, request: Request, call_next):
         response = await call_next(request)
-        if request.url.path.startswith("/ui"):
+        if request.url.path.startswith("/ui") and "cache-control" not in response.headers:
             response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
             response.headers["Pragma"] = "no-cache"
             response.headers["Expires"] = "0"
@@ -63,11 +87,14 @@ class NoCacheStaticMiddleware(BaseHTTPMiddleware):
 
 
 class NoCacheApiMiddleware(BaseHTTPMiddleware):
-    """Отключает кеш для API — чтобы браузер не кешировал ответы и не показывал устаревшие данные при переключении вкладок."""
+    """Отключает кеш для API — чтобы браузер не кешировал ответы и не показывал устаревшие данные при переключении вкладок.
+
+    Ответы, где обработчик сам задал Cache-Control (справочники с ETag, см. app/reference_data.py), не трогаем.
+    """
 
     async def dispatch(self, request: Request, call_next):
         response = await call_next(request)
-        if request.url.path.startswith("/api"):
+        if request.url.path.startswith("/api") and "cache-control" not in response.headers:
             response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
             response.headers["Pragma"] = "no-cache"
             response.headers["Expires"] = "0"
@@ -115,6 +142,19 @@ class DevTraceMiddleware(BaseHTTPMiddleware):
 
 
 app.add_middleware(DevTraceMiddleware)
+if settings.query_budget_enabled:
+    app.add_middleware(QueryBudgetMiddleware)
+# Добавлен последним — внешний слой: сжимает уже готовые ответы (с заголовками no-cache и т.п.)
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        level=settings.compression_level,
+    )
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+# Самый внешний слой: корневой спан покрывает весь запрос, включая сжатие (работает только при TRACING_ENABLED)
+app.add_middleware(TracingMiddleware)
 
 # Путь к UI (работает и в Docker, и при локальном запуске)
 _ui_candidates = [
@@ -131,16 +171,28 @@ _NO_CACHE_HEADERS = {
 }
 
 
+def _serve_page(name: str):
+    page = ui_page(name)
+    if page is not None:
+        return HTMLResponse(page, headers=_NO_CACHE_HEADERS)
+    p = UI_DIR / name
+    return FileResponse(p, headers=_NO_CACHE_HEADERS) if p.exists() else RedirectResponse(url="/ui/")
+
+
 def _serve_index():
     """Страница входа/регистрации."""
-    p = UI_DIR / "index.html"
-    return FileResponse(p, headers=_NO_CACHE_HEADERS) if p.exists() else RedirectResponse(url="/ui/")
+    return _serve_page("index.html")
 
 
 def _serve_dashboard():
     """Дашборд (главная, профиль, платежи и т.д.)."""
-    p = UI_DIR / "dashboard.html"
-    return FileResponse(p, headers=_NO_CACHE_HEADERS) if p.exists() else RedirectResponse(url="/ui/")
+    return _serve_page("dashboard.html")
+
+
+@app.api_route("/ui/assets/{name:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def ui_asset(name: str, request: Request):
+    """Файл UI с хешем в имени (кеш на год, gzip/brotli по Accept-Encoding)."""
+    return asset_response(request, name)
 
 
 @app.get("/", include_in_schema=False)
@@ -196,6 +248,42 @@ def startup() -> None:
     from app.dev_trace import install_db_hooks
 
     install_db_hooks()
+    refresh_rates()
+    init_tracing()
+    init_metrics()
+    init_query_budget()
+    init_slow_query_log()
+    if settings.ui_fingerprint_assets:
+        init_ui_assets(UI_DIR)
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    shutdown_pool()
+    shutdown_tracing()
+    shutdown_metrics()
+    shutdown_slow_query_log()
+
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_with_metrics(request: Request, exc: StarletteHTTPException):
+    """Стандартный ответ FastAPI; detail запоминается для метрики ошибок."""
+    request.scope[ERROR_DETAIL_SCOPE_KEY] = error_detail_label(exc.detail)
+    return await http_exception_handler(request, exc)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_with_metrics(request: Request, exc: RequestValidationError):
+    request.scope[ERROR_DETAIL_SCOPE_KEY] = "request_validation_error"
+    return await request_validation_exception_handler(request, exc)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Метрики в текстовом формате Prometheus (при METRICS_MULTIPROC_DIR — сумма по всем воркерам)."""
+    if not settings.metrics_enabled:
+        return Response(status_code=404)
+    return Response(render(collect_all()), media_type=METRICS_CONTENT_TYPE)
 
 
 app.include_router(health_router)
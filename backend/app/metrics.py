@@ -0,0 +1,309 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Запись без блокировок: у каждого потока свой «шард» счётчиков (threading.local), поток
+пишет только в свой словарь; при сборке шарды копируются (dict() под GIL — атомарно) и
+суммируются. Гистограммы задержек — HDR-подобные: границы идут геометрически, две на
+удвоение (шаг ≈ √2, точность квантиля ~40% в любом диапазоне от 0.5 мс до 32 с).
+
+Что собирается:
+- запросы по шаблону маршрута, методу и статусу; гистограмма длительности по маршруту;
+- число SQL-запросов на HTTP-запрос (гистограмма) и всего; COMMIT/ROLLBACK соединений;
+- ошибки по коду `detail` (HTTPException) и 422 валидации.
+
+Несколько воркеров (METRICS_MULTIPROC_DIR): каждый воркер раз в METRICS_FLUSH_SECONDS
+(и при каждом /metrics) атомарно пишет свой снимок в <каталог>/metrics-<pid>.json,
+а /metrics в любом воркере суммирует все файлы каталога. Каталог очищают перед стартом сервера.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.sql_events import add_statement_observer, add_transaction_observer
+
+logger = logging.getLogger("shlapabank.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Ключ в scope запроса, куда обработчики ошибок кладут detail
+ERROR_DETAIL_SCOPE_KEY = "shlapabank.error_detail"
+
+LATENCY_BOUNDS = tuple(0.0005 * 2 ** (i / 2) for i in range(33))  # 0.5 мс … 32 с
+QUERY_COUNT_BOUNDS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128)
+
+# имя → (тип, описание, границы гистограммы)
+_METRICS: dict[str, tuple[str, str, tuple[float, ...] | None]] = {
+    "shlapabank_http_requests_total": ("counter", "HTTP-запросы по маршруту, методу и статусу.", None),
+    "shlapabank_http_request_duration_seconds": ("histogram", "Длительность HTTP-запроса.", LATENCY_BOUNDS),
+    "shlapabank_http_errors_total": ("counter", "Ответы с ошибкой по коду detail.", None),
+    "shlapabank_db_queries_per_request": ("histogram", "SQL-запросов на один HTTP-запрос.", QUERY_COUNT_BOUNDS),
+    "shlapabank_db_queries_total": ("counter", "Выполненные SQL-запросы.", None),
+    "shlapabank_db_query_errors_total": ("counter", "SQL-запросы, завершившиеся ошибкой.", None),
+    "shlapabank_db_transactions_total": ("counter", "Завершённые транзакции соединений (commit/rollback) и SAVEPOINT (release_savepoint/rollback_savepoint).", None),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self) -> None:
+        self.counters: dict[tuple[str, Labels], float] = {}
+        # [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self.histograms: dict[tuple[str, Labels], list] = {}
+
+
+_local = threading.local()
+_shards: list[_Shard] = []
+_shards_lock = threading.Lock()  # только для регистрации нового потока
+
+
+def _shard() -> _Shard:
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def inc(name: str, labels: Labels = (), value: float = 1) -> None:
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name: str, labels: Labels, value: float) -> None:
+    bounds = _METRICS[name][2]
+    histograms = _shard().histograms
+    key = (name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        entry = histograms[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+    entry[0][bisect.bisect_left(bounds, value)] += 1
+    entry[1] += value
+    entry[2] += 1
+
+
+def snapshot() -> dict:
+    """Сумма шардов процесса: {"counters": [[имя, метки, значение]], "histograms": [[имя, метки, корзины, сумма, n]]}."""
+    counters: dict[tuple[str, Labels], float] = {}
+    histograms: dict[tuple[str, Labels], list] = {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        for key, value in dict(shard.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, (buckets, total, count) in dict(shard.histograms).items():
+            _merge_histogram(histograms, key, list(buckets), total, count)
+    return {
+        "counters": [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        "histograms": [
+            [name, list(map(list, labels)), buckets, total, count]
+            for (name, labels), (buckets, total, count) in histograms.items()
+        ],
+    }
+
+
+def _merge_histogram(into: dict, key: tuple[str, Labels], buckets: list[int], total: float, count: int) -> None:
+    entry = into.get(key)
+    if entry is None:
+        into[key] = [buckets, total, count]
+        return
+    entry[0] = [a + b for a, b in zip(entry[0], buckets)]
+    entry[1] += total
+    entry[2] += count
+
+
+def _merge_snapshots(snapshots: list[dict]) -> tuple[dict, dict]:
+    counters: dict[tuple[str, Labels], float] = {}
+    histograms: dict[tuple[str, Labels], list] = {}
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snap["histograms"]:
+            _merge_histogram(histograms, (name, tuple(map(tuple, labels))), buckets, total, count)
+    return counters, histograms
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshots: list[dict]) -> str:
+    """Текстовый формат Prometheus 0.0.4."""
+    counters, histograms = _merge_snapshots(snapshots)
+    lines: list[str] = []
+    for name, (kind, help_text, bounds) in _METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels_text(labels)} {_number(value)}")
+            continue
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(bounds, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels_text(labels, ('le', f'{bound:.6g}'))} {cumulative}")
+            # +Inf и _count — из тех же корзин: observe обновляет корзину и счётчик без блокировки,
+            # и отдельный count мог бы оказаться меньше последней конечной корзины
+            cumulative += buckets[-1]
+            lines.append(f"{name}_bucket{_labels_text(labels, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{name}_sum{_labels_text(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels_text(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Несколько воркеров: снимки в общем каталоге ---
+
+def _snapshot_path() -> Path:
+    return Path(settings.metrics_multiproc_dir) / f"metrics-{os.getpid()}.json"
+
+
+def write_snapshot() -> None:
+    """Атомарно записать снимок процесса (rename поверх прежнего файла)."""
+    path = _snapshot_path()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot()), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def collect_all() -> list[dict]:
+    if not settings.metrics_multiproc_dir:
+        return [snapshot()]
+    write_snapshot()
+    snapshots = []
+    for path in sorted(Path(settings.metrics_multiproc_dir).glob("metrics-*.json")):
+        try:
+            snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            # Файл другого воркера заменяется прямо сейчас или повреждён — пропускаем до следующего опроса
+            logger.warning("metrics snapshot %s unreadable", path.name)
+    return snapshots
+
+
+_flusher_stop = threading.Event()
+_flusher: threading.Thread | None = None
+
+
+def _flush_loop() -> None:
+    while not _flusher_stop.wait(settings.metrics_flush_seconds):
+        try:
+            write_snapshot()
+        except OSError:
+            logger.warning("metrics snapshot write failed", exc_info=True)
+
+
+# --- Источники данных ---
+
+def error_detail_label(detail: object) -> str:
+    """detail ошибки → значение метки (коды вида snake_case; длинные и нестроковые — обрезаются/обобщаются)."""
+    if not isinstance(detail, str):
+        return "structured"
+    return detail[:64]
+
+
+_query_count: ContextVar[list[int] | None] = ContextVar("sb_metrics_query_count", default=None)
+
+
+def _on_statement(statement, parameters, executemany, duration, failed) -> None:  # noqa: ARG001
+    inc("shlapabank_db_queries_total")
+    if failed:
+        inc("shlapabank_db_query_errors_total")
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _on_transaction(outcome: str) -> None:
+    inc("shlapabank_db_transactions_total", (("outcome", outcome),))
+
+
+def init_metrics() -> None:
+    """Хук старта: подписка на SQL и, в режиме нескольких воркеров, периодическая запись снимка."""
+    global _flusher
+    if not settings.metrics_enabled:
+        return
+    add_statement_observer(_on_statement)
+    add_transaction_observer(_on_transaction)
+    if settings.metrics_multiproc_dir and _flusher is None:
+        Path(settings.metrics_multiproc_dir).mkdir(parents=True, exist_ok=True)
+        _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+        _flusher.start()
+
+
+def shutdown_metrics() -> None:
+    global _flusher
+    if _flusher is None:
+        return
+    _flusher_stop.set()
+    _flusher.join(timeout=5)
+    _flusher = None
+    try:
+        write_snapshot()
+    except OSError:
+        logger.warning("metrics snapshot write failed", exc_info=True)
+
+
+class MetricsMiddleware:
+    """Длительность, статус и число SQL-запросов каждого HTTP-запроса (по шаблону маршрута)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _query_count.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_count.reset(token)
+            duration = time.perf_counter() - started
+            # Неизвестные пути не плодят метки: все 404 без маршрута — одна строка
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            inc("shlapabank_http_requests_total", (("method", method), ("route", route), ("status", str(status))))
+            observe("shlapabank_http_request_duration_seconds", (("method", method), ("route", route)), duration)
+            observe("shlapabank_db_queries_per_request", (("route", route),), counter[0])
+            detail = scope.get(ERROR_DETAIL_SCOPE_KEY)
+            if detail is not None:
+                inc("shlapabank_http_errors_total", (("route", route), ("status", str(status)), ("detail", detail)))
@@ -0,0 +1,115 @@
+"""
+Проверка старых bcrypt-паролей ($2...) в отдельном пуле процессов.
+
+bcrypt — ~100 мс CPU на проверку; в потоке запроса пачка входов старых аккаунтов занимает
+весь threadpool Starlette. Здесь проверка уходит в ProcessPoolExecutor (spawn), а число
+ожидающих задач ограничено: при переполнении вход сразу получает 503, а не очередь на минуты.
+Если процесс пула умер (BrokenProcessPool), пул пересоздаётся и проверка повторяется один раз.
+Пароли в текущем режиме (открытый текст) сравниваются на месте, без пула.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings
+
+
+class PasswordPoolOverloaded(Exception):
+    """Очередь проверки паролей заполнена."""
+
+
+def is_legacy_hash(stored: str) -> bool:
+    return stored.startswith("$2")
+
+
+def _bcrypt_verify(plain_password: str, stored: str) -> bool:
+    # Выполняется в процессе пула: passlib импортируется там же
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto").verify(plain_password, stored)
+
+
+_lock = threading.Lock()
+_executor: ProcessPoolExecutor | None = None
+_stats = {
+    "submitted": 0, "completed": 0, "rejected": 0, "failed": 0, "restarts": 0, "in_flight": 0, "busy_seconds": 0.0,
+}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.password_pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Сломанный пул больше не выдаётся: следующий _get_executor создаст новый."""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+            _stats["restarts"] += 1
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _verify_in_pool(plain_password: str, stored: str) -> bool:
+    executor = _get_executor()
+    try:
+        return await asyncio.wrap_future(executor.submit(_bcrypt_verify, plain_password, stored))
+    except BrokenProcessPool:
+        _discard_executor(executor)
+    return await asyncio.wrap_future(_get_executor().submit(_bcrypt_verify, plain_password, stored))
+
+
+async def verify_password_async(plain_password: str, stored: str) -> bool:
+    """Проверка пароля без блокировки event loop и threadpool. PasswordPoolOverloaded — очередь полна."""
+    if not is_legacy_hash(stored):
+        return plain_password == stored
+    with _lock:
+        if _stats["in_flight"] >= settings.password_pool_max_pending:
+            _stats["rejected"] += 1
+            raise PasswordPoolOverloaded
+        _stats["in_flight"] += 1
+        _stats["submitted"] += 1
+    t0 = time.perf_counter()
+    try:
+        result = await _verify_in_pool(plain_password, stored)
+    except Exception:
+        with _lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        with _lock:
+            _stats["in_flight"] -= 1
+            _stats["busy_seconds"] += time.perf_counter() - t0
+    with _lock:
+        _stats["completed"] += 1
+    return result
+
+
+def pool_stats() -> dict:
+    """Счётчики пула (в пределах процесса воркера uvicorn)."""
+    with _lock:
+        stats = dict(_stats)
+    stats["busy_seconds"] = round(stats["busy_seconds"], 3)
+    stats["workers"] = settings.password_pool_workers
+    stats["max_pending"] = settings.password_pool_max_pending
+    stats["started"] = _executor is not None
+    return stats
+
+
+def shutdown_pool() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
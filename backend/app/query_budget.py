@@ -0,0 +1,94 @@
+"""
+Бюджет SQL-запросов на HTTP-запрос и поиск N+1 (QUERY_BUDGET_ENABLED, по умолчанию — вне production).
+
+Каждый выполненный запрос (app/sql_events.py) считается в контексте HTTP-запроса, а его форма
+без параметров (normalize_statement) — отдельно. В ответ добавляются заголовки:
+- X-DB-Query-Count — сколько SQL-запросов выполнено до отправки заголовков ответа;
+- X-DB-Query-Budget — бюджет маршрута (ROUTE_QUERY_BUDGETS или QUERY_BUDGET_DEFAULT);
+- X-DB-Repeated-Query — сколько раз повторился самый частый запрос, если не меньше
+  QUERY_N_PLUS_ONE_THRESHOLD (типичный N+1: один и тот же SELECT в цикле).
+Превышение бюджета и N+1 пишутся в лог; тесты (backend/tests/query_budget.py) по этим
+заголовкам падают. Запросы потокового тела (StreamingResponse) в заголовок не попадают.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.sql_events import add_statement_observer, is_savepoint_statement, normalize_statement
+
+logger = logging.getLogger("shlapabank.query_budget")
+
+# Маршруты, которым по делу нужно больше запросов, чем QUERY_BUDGET_DEFAULT: «МЕТОД шаблон» → бюджет
+# (например, "GET /api/v1/admin/users": 20)
+ROUTE_QUERY_BUDGETS: dict[str, int] = {}
+
+
+@dataclass
+class RequestQueries:
+    count: int = 0
+    shapes: Counter = field(default_factory=Counter)
+
+
+_current: ContextVar[RequestQueries | None] = ContextVar("sb_request_queries", default=None)
+
+
+def _on_statement(statement, parameters, executemany, duration, failed) -> None:  # noqa: ARG001
+    queries = _current.get()
+    if queries is None or is_savepoint_statement(statement):
+        return
+    queries.count += 1
+    queries.shapes[normalize_statement(statement)] += 1
+
+
+def route_budget(method: str, route: str) -> int:
+    return ROUTE_QUERY_BUDGETS.get(f"{method} {route}", settings.query_budget_default)
+
+
+def init_query_budget() -> None:
+    if settings.query_budget_enabled:
+        add_statement_observer(_on_statement)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                self._check(scope, queries, MutableHeaders(raw=message["headers"]))
+            await send(message)
+
+        token = _current.set(queries)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def _check(scope: Scope, queries: RequestQueries, headers: MutableHeaders) -> None:
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        method = scope["method"]
+        budget = route_budget(method, route)
+        headers["X-DB-Query-Count"] = str(queries.count)
+        headers["X-DB-Query-Budget"] = str(budget)
+        if queries.count > budget:
+            logger.warning("%s %s: %d SQL queries, budget %d", method, route, queries.count, budget)
+        if queries.shapes:
+            shape, repeats = queries.shapes.most_common(1)[0]
+            if repeats >= settings.query_n_plus_one_threshold:
+                headers["X-DB-Repeated-Query"] = str(repeats)
+                logger.warning("%s %s: possible N+1, %d× %s", method, route, repeats, shape[:300])
@@ -0,0 +1,112 @@
+"""
+Котировки обмена валют: курс и сумма зачисления фиксируются на EXCHANGE_QUOTE_TTL_SECONDS.
+
+Хранилище — в памяти процесса (как OTP), ограничено EXCHANGE_QUOTE_MAX_ENTRIES: при переполнении
+вытесняются самые старые котировки. Котировка одноразовая и привязана к пользователю.
+Обмен сначала только читает котировку (find_quote) и проверяет счета, баланс и лимит. Котировку он
+забирает (claim_quote) непосредственно перед записью операции. Поэтому отказ по исправимой причине
+(quote_mismatch, insufficient_funds, лимит) котировку не сжигает. Если запись не удалась, котировка
+возвращается (restore_quote).
+"""
+
+from __future__ import annotations
+
+import secrets
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from app.core.config import settings
+from app.models import Currency
+from app.rates import RateSnapshot
+
+
+@dataclass(frozen=True)
+class ExchangeQuote:
+    quote_id: str
+    user_id: int
+    from_account_id: int
+    to_account_id: int
+    source_currency: Currency
+    target_currency: Currency
+    amount: Decimal
+    rate: Decimal
+    target_amount: Decimal
+    rate_snapshot_id: str
+    expires_at: datetime
+
+
+_lock = threading.Lock()
+# Порядок вставки совпадает с порядком истечения (TTL у всех одинаковый)
+_quotes: OrderedDict[str, ExchangeQuote] = OrderedDict()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _purge_expired(now: datetime) -> None:
+    while _quotes:
+        oldest = next(iter(_quotes.values()))
+        if oldest.expires_at > now:
+            break
+        _quotes.popitem(last=False)
+
+
+def issue_quote(
+    *,
+    user_id: int,
+    from_account_id: int,
+    to_account_id: int,
+    source_currency: Currency,
+    target_currency: Currency,
+    amount: Decimal,
+    rates: RateSnapshot,
+) -> ExchangeQuote:
+    """Зафиксировать курс снимка rates для суммы amount."""
+    now = _now()
+    quote = ExchangeQuote(
+        quote_id=secrets.token_urlsafe(12),
+        user_id=user_id,
+        from_account_id=from_account_id,
+        to_account_id=to_account_id,
+        source_currency=source_currency,
+        target_currency=target_currency,
+        amount=amount,
+        rate=rates.cross[(source_currency, target_currency)],
+        target_amount=rates.convert(amount, source_currency, target_currency),
+        rate_snapshot_id=rates.version,
+        expires_at=now + timedelta(seconds=settings.exchange_quote_ttl_seconds),
+    )
+    with _lock:
+        _purge_expired(now)
+        while len(_quotes) >= settings.exchange_quote_max_entries:
+            _quotes.popitem(last=False)
+        _quotes[quote.quote_id] = quote
+    return quote
+
+
+def find_quote(quote_id: str, user_id: int) -> ExchangeQuote | None:
+    """Котировка пользователя без изъятия. None — нет, истекла или чужая."""
+    with _lock:
+        quote = _quotes.get(quote_id)
+    if quote is None or quote.user_id != user_id or quote.expires_at <= _now():
+        return None
+    return quote
+
+
+def claim_quote(quote: ExchangeQuote) -> bool:
+    """Изъять котировку перед записью обмена. False — её уже забрал параллельный обмен или она истекла."""
+    with _lock:
+        if _quotes.get(quote.quote_id) is not quote:
+            return False
+        del _quotes[quote.quote_id]
+    return quote.expires_at > _now()
+
+
+def restore_quote(quote: ExchangeQuote) -> None:
+    """Вернуть изъятую котировку, если обмен не записался (срок действия прежний)."""
+    with _lock:
+        _quotes.setdefault(quote.quote_id, quote)
@@ -0,0 +1,173 @@
+"""
+Курсы валют: провайдер → неизменяемый снимок в памяти.
+
+Провайдер (встроенные курсы или JSON-файл RATES_FILE) отдаёт курсы к RUB. Из них один раз
+собирается RateSnapshot: версия (хеш содержимого — одинаковая во всех воркерах для одних и тех
+же курсов), курсы к RUB, матрица кросс-курсов и готовое тело ответа GET /transfers/rates.
+Обновление собирает новый снимок и подменяет ссылку целиком — читатели видят либо старый,
+либо новый снимок, без блокировок. Обмен записывает версию снимка в транзакцию.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Protocol
+
+from app.core.config import settings
+from app.models import Currency
+
+logger = logging.getLogger("shlapabank.rates")
+
+# Встроенные ориентировочные курсы к RUB (когда RATES_FILE не задан)
+DEFAULT_RATES_TO_RUB: dict[Currency, Decimal] = {
+    Currency.RUB: Decimal("1"),
+    Currency.USD: Decimal("95"),  # 1 USD ≈ 95 RUB
+    Currency.EUR: Decimal("105"),  # 1 EUR ≈ 105 RUB
+    Currency.CNY: Decimal("13.5"),  # 1 CNY ≈ 13.5 RUB
+}
+
+
+class RatesProvider(Protocol):
+    name: str
+
+    def fetch(self) -> dict[Currency, Decimal]:
+        """Курсы к RUB для всех валют."""
+        ...
+
+    def changed(self) -> bool:
+        """Есть ли смысл перечитать курсы (дешёвая проверка, без чтения данных)."""
+        ...
+
+
+class StaticRatesProvider:
+    name = "static"
+
+    def fetch(self) -> dict[Currency, Decimal]:
+        return dict(DEFAULT_RATES_TO_RUB)
+
+    def changed(self) -> bool:
+        return False
+
+
+class FileRatesProvider:
+    """JSON-файл вида {"RUB": "1", "USD": "95.10", ...}; перечитывается при смене mtime."""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._mtime: float | None = None
+
+    def fetch(self) -> dict[Currency, Decimal]:
+        mtime = self.path.stat().st_mtime
+        raw = json.loads(self.path.read_text(encoding="utf-8"))
+        rates = {Currency(code): Decimal(str(value)) for code, value in raw.items()}
+        self._mtime = mtime
+        return rates
+
+    def changed(self) -> bool:
+        try:
+            return self.path.stat().st_mtime != self._mtime
+        except OSError:
+            return False
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    version: str
+    source: str
+    loaded_at: datetime
+    to_rub: Mapping[Currency, Decimal]
+    # cross[(from, to)]: сколько единиц `to` за одну единицу `from`
+    cross: Mapping[tuple[Currency, Currency], Decimal]
+    public: Mapping[str, object] = field(repr=False)
+
+    def convert(self, amount: Decimal, source: Currency, target: Currency) -> Decimal:
+        """Сумма в валюте target, округлённая до копеек."""
+        return (amount * self.cross[(source, target)]).quantize(Decimal("0.01"))
+
+
+def _validate(rates: dict[Currency, Decimal]) -> None:
+    missing = [c.value for c in Currency if c not in rates]
+    if missing:
+        raise ValueError(f"rates missing for {missing}")
+    if rates[Currency.RUB] != 1:
+        raise ValueError("RUB rate must be 1")
+    if any(not rate.is_finite() or rate <= 0 for rate in rates.values()):
+        raise ValueError("rates must be positive")
+
+
+def build_snapshot(rates: dict[Currency, Decimal], source: str) -> RateSnapshot:
+    _validate(rates)
+    ordered = {currency: rates[currency] for currency in Currency}
+    canonical = json.dumps({c.value: str(r) for c, r in ordered.items()}, sort_keys=True)
+    version = hashlib.sha256(canonical.encode()).hexdigest()[:12]
+    loaded_at = datetime.now(timezone.utc)
+    cross = {(src, dst): ordered[src] / ordered[dst] for src in ordered for dst in ordered}
+    public = {
+        "base": "RUB",
+        "version": version,
+        "updatedAt": loaded_at.isoformat(),
+        "toRub": {currency.value: str(rate) for currency, rate in ordered.items()},
+    }
+    return RateSnapshot(
+        version=version,
+        source=source,
+        loaded_at=loaded_at,
+        to_rub=MappingProxyType(ordered),
+        cross=MappingProxyType(cross),
+        public=MappingProxyType(public),
+    )
+
+
+def _make_provider() -> RatesProvider:
+    if settings.rates_file:
+        return FileRatesProvider(settings.rates_file)
+    return StaticRatesProvider()
+
+
+_provider: RatesProvider = _make_provider()
+_snapshot: RateSnapshot | None = None
+_checked_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def refresh_rates() -> RateSnapshot:
+    """Перечитать курсы у провайдера и атомарно подменить снимок. При ошибке остаётся прежний снимок."""
+    global _snapshot, _checked_at
+    with _refresh_lock:
+        _checked_at = time.monotonic()
+        try:
+            snapshot = build_snapshot(_provider.fetch(), _provider.name)
+        except (OSError, ValueError, InvalidOperation) as exc:
+            if _snapshot is None:
+                logger.error("rates provider %s failed, using built-in rates: %s", _provider.name, exc)
+                snapshot = build_snapshot(dict(DEFAULT_RATES_TO_RUB), StaticRatesProvider.name)
+            else:
+                logger.error("rates provider %s failed, keeping snapshot %s: %s", _provider.name, _snapshot.version, exc)
+                return _snapshot
+        if _snapshot is None or snapshot.version != _snapshot.version:
+            logger.info("rates snapshot %s loaded from %s", snapshot.version, snapshot.source)
+            _snapshot = snapshot
+        return _snapshot
+
+
+def current_rates() -> RateSnapshot:
+    """Текущий снимок. Провайдер опрашивается не чаще RATES_REFRESH_SECONDS (и только если данные сменились)."""
+    global _checked_at
+    snapshot = _snapshot
+    if snapshot is None:
+        return refresh_rates()
+    interval = settings.rates_refresh_seconds
+    if interval > 0 and time.monotonic() - _checked_at >= interval:
+        if _provider.changed():
+            return refresh_rates()
+        _checked_at = time.monotonic()
+    return snapshot
@@ -0,0 +1,90 @@
+"""
+Справочники (операторы связи, поставщики услуг, внешние банки, курсы валют): тело ответа
+сериализуется один раз, отдаётся с сильным ETag и Cache-Control, на If-None-Match — 304.
+
+Справочники меняются только с деплоем (курсы — со сменой снимка), поэтому байты ответа
+собираются при первом обращении и переиспользуются. В ответах операторов, поставщиков
+и курсов есть userId, поэтому к готовым байтам дописывается только он, а ETag включает
+id пользователя. Свой Cache-Control ответа NoCacheApiMiddleware не перезаписывает.
+
+ETag курсов — версия снимка, а не хеш тела: в теле есть updatedAt (время загрузки снимка в этом
+процессе), и хеш тела различался бы между воркерами и после перезапуска при тех же курсах.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+from fastapi import Request
+from starlette.responses import Response
+
+from app.banks import BANKS_CATALOG, OUR_BANK_CODE
+from app.rates import RateSnapshot
+
+# Каталоги меняются только с деплоем; курсы — в любой момент, их клиент всегда перепроверяет по ETag
+CATALOG_CACHE_CONTROL = "private, max-age=300, must-revalidate"
+RATES_CACHE_CONTROL = "private, no-cache"
+
+
+@dataclass(frozen=True)
+class ReferencePayload:
+    # JSON-объект без открывающей скобки: перед ним дописывается "userId" (или просто "{")
+    tail: bytes
+    digest: str
+    cache_control: str
+
+
+def build_payload(data: dict, cache_control: str, digest: str | None = None) -> ReferencePayload:
+    """digest — основа ETag; по умолчанию хеш тела."""
+    # Тот же формат, что у JSONResponse Starlette
+    encoded = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return ReferencePayload(
+        tail=encoded[1:],
+        digest=digest or hashlib.sha256(encoded).hexdigest()[:16],
+        cache_control=cache_control,
+    )
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Слабое сравнение, как требует RFC 9110 для If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def reference_response(request: Request, payload: ReferencePayload, user_id: int | None = None) -> Response:
+    """Ответ справочника: 304, если клиент прислал актуальный ETag, иначе готовые байты."""
+    if user_id is None:
+        etag = f'"{payload.digest}"'
+    else:
+        etag = f'"{payload.digest}-{user_id}"'
+    headers = {"ETag": etag, "Cache-Control": payload.cache_control, "Vary": "Authorization"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if user_id is None:
+        body = b"{" + payload.tail
+    else:
+        body = b'{"userId":%d,' % user_id + payload.tail
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Внешние банки: и для GET /transfers/banks, и для ответа by-phone/check, когда получатель не наш
+EXTERNAL_BANKS: tuple[dict, ...] = tuple(
+    {"id": code, "label": label} for code, label in BANKS_CATALOG if code != OUR_BANK_CODE
+)
+EXTERNAL_BANKS_PAYLOAD = build_payload({"banks": list(EXTERNAL_BANKS)}, CATALOG_CACHE_CONTROL)
+
+_rates_payload: tuple[str, ReferencePayload] | None = None
+
+
+def rates_payload(snapshot: RateSnapshot) -> ReferencePayload:
+    """Готовое тело GET /transfers/rates для снимка; пересобирается только при смене версии."""
+    global _rates_payload
+    cached = _rates_payload
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    payload = build_payload(dict(snapshot.public), RATES_CACHE_CONTROL, digest=snapshot.version)
+    _rates_payload = (snapshot.version, payload)
+    return payload
@@ -1,12 +1,15 @@
 from decimal import Decimal
-import random
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.account_numbers import allocate_account_number
+from app.core.config import settings
 from app.dependencies import get_own_account, get_own_active_account
 from app.db import get_db
+from app.fast_json import ACCOUNT_COLUMNS, plain_rows, rows_response
 from app.models import Account, Currency, Transaction, TransactionStatus, TransactionType, User
 from app.otp import validate_otp_for_user
 from app.schemas import (
@@ -25,43 +28,24 @@ _MAX_BALANCE = Decimal("999999999999.99")
 
 MAX_BY_RUB = 3
 MAX_BY_FOREIGN = 3
+# Номер из последовательности уникален, но может совпасть со старым случайным номером (или выданным при другом
+# ACCOUNT_NUMBER_KEY): тогда берётся следующее значение последовательности, один раз
+_ACCOUNT_NUMBER_ATTEMPTS = 2
 
 
 def _foreign_currencies():
     return [Currency.USD, Currency.EUR, Currency.CNY]
 
 
-def _generate_account_number(currency: Currency) -> str:
-    """
-    Генерация цифрового номера счета с маской по валюте.
-
-    RUB  -> 2202XXXXXXXXXXXX
-    USD  -> 3202XXXXXXXXXXXX
-    EUR  -> 4202XXXXXXXXXXXX
-    CNY  -> 5202XXXXXXXXXXXX
-    """
-    prefixes: dict[Currency, str] = {
-        Currency.RUB: "2202",
-        Currency.USD: "3202",
-        Currency.EUR: "4202",
-        Currency.CNY: "5202",
-    }
-    prefix = prefixes.get(currency, "9999")
-    suffix_length = 16 - len(prefix)
-    if suffix_length < 4:
-        suffix_length = 4
-    suffix = "".join(random.choices("0123456789", k=suffix_length))
-    return f"{prefix}{suffix}"
-
-
 @router.get("", response_model=list[AccountPublic], summary="Получить список счетов")
 def list_accounts(
     current_user: User = Depends(require_active_user),
     db: Session = Depends(get_db),
 ):
-    return db.scalars(
-        select(Account).where(Account.user_id == current_user.id, Account.is_active.is_(True))
-    ).all()
+    conditions = (Account.user_id == current_user.id, Account.is_active.is_(True))
+    if settings.fast_json_responses:
+        return rows_response(plain_rows(db.execute(select(*ACCOUNT_COLUMNS).where(*conditions))))
+    return db.scalars(select(Account).where(*conditions)).all()
 
 
 @router.post(
@@ -87,14 +71,23 @@ def create_account(
     if payload.currency in _foreign_currencies() and foreign_count >= MAX_BY_FOREIGN:
         raise HTTPException(status_code=400, detail="account_limit_exceeded")
 
-    account = Account(
-        account_number=_generate_account_number(payload.currency),
-        user_id=current_user.id,
-        account_type=payload.account_type,
-        currency=payload.currency,
-    )
-    db.add(account)
-    db.commit()
+    user_id = current_user.id
+    for attempt in range(1, _ACCOUNT_NUMBER_ATTEMPTS + 1):
+        account = Account(
+            account_number=allocate_account_number(db, payload.currency),
+            user_id=user_id,
+            account_type=payload.account_type,
+            currency=payload.currency,
+        )
+        db.add(account)
+        try:
+            db.commit()
+        except IntegrityError as exc:
+            db.rollback()
+            if attempt == _ACCOUNT_NUMBER_ATTEMPTS or "account_number" not in str(exc.orig):
+                raise
+            continue
+        break
     db.refresh(account)
     return account
 
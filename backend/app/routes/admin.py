@@ -1,18 +1,39 @@
-"""Admin API: список пользователей, блокировка, удаление, банки, транзакции, сброс БД."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import delete, or_, select
+"""Admin API: список пользователей, блокировка, удаление (в т.ч. массовые), выгрузка счетов, банки, транзакции, сброс БД."""
+from collections import Counter
+from collections.abc import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, delete, exists, func, or_, select, text, update
 from sqlalchemy.orm import Session, joinedload
 
+from app.account_export import ExportFormat, accounts_with_owner_query, stream_accounts
 from app.banks import OUR_BANK_CODE, get_external_bank_codes
 from app.core.config import settings
-from app.db import get_db
+from app.db import current_read_engine, get_db, get_read_db
+from app.fast_json import TRANSACTION_COLUMNS, USER_COLUMNS, plain_rows, rows_response, transaction_rows
 from app.models import Account, Transaction, User, UserBank, UserStatus
 from app.models import UserRole
-from app.schemas import TransactionPublic, UserBanksUpdateRequest, UserPublic
+from app.password_pool import pool_stats
+from app.phone_utils import normalize_phone
+from app.rates import refresh_rates
+from app.schemas import (
+    AdminBulkUserResult,
+    AdminBulkUsersRequest,
+    AdminBulkUsersResponse,
+    AdminUserFilter,
+    TransactionPublic,
+    UserBanksUpdateRequest,
+    UserPublic,
+)
 from app.security import require_admin
+from app.tracing import tracing_stats
 
 router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
 
+# Размер пачки id для массовых операций: один UPDATE/DELETE ... WHERE id IN (...) и коммит на пачку
+BULK_CHUNK_SIZE = 1000
+
 
 def _user_is_default_admin(user: User) -> bool:
     return (
@@ -21,19 +42,218 @@ def _user_is_default_admin(user: User) -> bool:
     )
 
 
+def _not_default_admin():
+    """SQL-условие «не дефолтный админ» (NULL в email не должен выключать условие)."""
+    return and_(
+        User.login != settings.default_admin_login,
+        or_(User.email.is_(None), User.email != settings.default_admin_email),
+    )
+
+
+def _user_filter_conditions(filters: AdminUserFilter) -> list:
+    """Условия WHERE для фильтров списка пользователей (префиксы — через индексы *_pattern_ops)."""
+    conditions = []
+    if filters.status is not None:
+        conditions.append(User.status == filters.status)
+    if filters.role is not None:
+        conditions.append(User.role == filters.role)
+    if filters.login_prefix:
+        conditions.append(User.login.startswith(filters.login_prefix, autoescape=True))
+    if filters.email_prefix:
+        conditions.append(func.lower(User.email).startswith(filters.email_prefix.lower(), autoescape=True))
+    if filters.phone:
+        conditions.append(User.phone == (normalize_phone(filters.phone) or filters.phone))
+    return conditions
+
+
+def _user_filter_params(
+    status: UserStatus | None = Query(None, description="ACTIVE или BLOCKED"),
+    role: UserRole | None = Query(None, description="CLIENT или ADMIN"),
+    login_prefix: str | None = Query(None, min_length=1, max_length=20, description="Начало логина"),
+    email_prefix: str | None = Query(
+        None, min_length=1, max_length=255, description="Начало email (без учёта регистра)"
+    ),
+    phone: str | None = Query(None, min_length=1, max_length=20, description="Телефон (точное совпадение)"),
+) -> AdminUserFilter:
+    return AdminUserFilter(
+        status=status,
+        role=role,
+        login_prefix=login_prefix,
+        email_prefix=email_prefix,
+        phone=phone,
+    )
+
+
+def _estimate_user_count(db: Session) -> int | None:
+    """Оценка числа пользователей из статистики планировщика (pg_class.reltuples) вместо COUNT(*).
+    None, если таблица ещё ни разу не анализировалась."""
+    estimate = db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"))
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
 @router.get(
     "/users",
     response_model=list[UserPublic],
     summary="Список пользователей",
+    description="Keyset-пагинация по id: следующая страница — `after_id` из заголовка `X-Next-Cursor` "
+    "(заголовка нет — страница последняя). Без фильтров в `X-Total-Estimate` — оценка общего числа пользователей.",
 )
 def list_users(
+    response: Response,
+    filters: AdminUserFilter = Depends(_user_filter_params),
+    after_id: int | None = Query(None, ge=0, description="id последнего пользователя предыдущей страницы"),
+    limit: int = Query(100, ge=1, le=1000, description="Размер страницы"),
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    users = list(db.scalars(select(User).order_by(User.id)))
+    conditions = _user_filter_conditions(filters)
+    fast = settings.fast_json_responses
+    q = select(*USER_COLUMNS) if fast else select(User)
+    q = q.where(*conditions).order_by(User.id).limit(limit + 1)
+    if after_id is not None:
+        q = q.where(User.id > after_id)
+    users = list(db.execute(q) if fast else db.scalars(q))
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
+    if not conditions:
+        estimate = _estimate_user_count(db)
+        if estimate is not None:
+            response.headers["X-Total-Estimate"] = str(estimate)
+    if fast:
+        # Заголовки из response применяются только к ответу по response_model — переносим явно
+        return rows_response(plain_rows(users), headers=dict(response.headers))
     return users
 
 
+def _bulk_target_chunks(db: Session, payload: AdminBulkUsersRequest) -> Iterator[list[int]]:
+    """Пачки id для массовой операции: из списка (без дублей, в исходном порядке) или по фильтру (keyset по id)."""
+    if payload.user_ids is not None:
+        ids = list(dict.fromkeys(payload.user_ids))
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            yield ids[start:start + BULK_CHUNK_SIZE]
+        return
+    conditions = _user_filter_conditions(payload.filter)
+    last_id = 0
+    while True:
+        ids = list(
+            db.scalars(
+                select(User.id).where(*conditions, User.id > last_id).order_by(User.id).limit(BULK_CHUNK_SIZE)
+            )
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+        if len(ids) < BULK_CHUNK_SIZE:
+            return
+
+
+def _bulk_response(outcomes: list[tuple[int, str]]) -> AdminBulkUsersResponse:
+    return AdminBulkUsersResponse(
+        results=[AdminBulkUserResult(id=user_id, outcome=outcome) for user_id, outcome in outcomes],
+        summary=dict(Counter(outcome for _, outcome in outcomes)),
+    )
+
+
+def _bulk_set_status(
+    db: Session, payload: AdminBulkUsersRequest, status: UserStatus, done: str, skip_default_admin: bool
+) -> AdminBulkUsersResponse:
+    """UPDATE ... WHERE id IN (пачка) RETURNING id по пачкам; для непопавших id — один SELECT, чтобы назвать причину."""
+    values = {"status": status}
+    if status == UserStatus.ACTIVE:
+        values["failed_login_attempts"] = 0
+    outcomes: list[tuple[int, str]] = []
+    for chunk in _bulk_target_chunks(db, payload):
+        stmt = update(User).where(User.id.in_(chunk)).values(**values).returning(User.id)
+        if skip_default_admin:
+            stmt = stmt.where(_not_default_admin())
+        updated = set(db.scalars(stmt.execution_options(synchronize_session=False)))
+        db.commit()
+        rest = [user_id for user_id in chunk if user_id not in updated]
+        existing = set(db.scalars(select(User.id).where(User.id.in_(rest)))) if rest else set()
+        for user_id in chunk:
+            if user_id in updated:
+                outcomes.append((user_id, done))
+            elif user_id in existing:
+                outcomes.append((user_id, "cannot_block_admin"))
+            else:
+                outcomes.append((user_id, "not_found"))
+    return _bulk_response(outcomes)
+
+
+@router.post(
+    "/users/bulk/block",
+    response_model=AdminBulkUsersResponse,
+    summary="Заблокировать пользователей (массово)",
+    description="Тело — `user_ids` (до 10000) или `filter` (как у списка пользователей). "
+    "Дефолтный админ пропускается. В ответе — итог по каждому id и сводка по исходам.",
+)
+def bulk_block_users(
+    payload: AdminBulkUsersRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    return _bulk_set_status(db, payload, UserStatus.BLOCKED, "blocked", skip_default_admin=True)
+
+
+@router.post(
+    "/users/bulk/unblock",
+    response_model=AdminBulkUsersResponse,
+    summary="Разблокировать пользователей (массово)",
+    description="Тело — `user_ids` или `filter`. Счётчик неудачных входов сбрасывается.",
+)
+def bulk_unblock_users(
+    payload: AdminBulkUsersRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    return _bulk_set_status(db, payload, UserStatus.ACTIVE, "unblocked", skip_default_admin=False)
+
+
+@router.post(
+    "/users/bulk/delete",
+    response_model=AdminBulkUsersResponse,
+    summary="Удалить пользователей (массово)",
+    description="Тело — `user_ids` или `filter`. Удаляются только пользователи без счетов и транзакций; "
+    "дефолтный админ пропускается.",
+)
+def bulk_delete_users(
+    payload: AdminBulkUsersRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    has_accounts = exists().where(Account.user_id == User.id)
+    has_transactions = exists().where(Transaction.initiated_by == User.id)
+    outcomes: list[tuple[int, str]] = []
+    for chunk in _bulk_target_chunks(db, payload):
+        # user_banks удаляются каскадом (ON DELETE CASCADE)
+        deleted = set(
+            db.scalars(
+                delete(User)
+                .where(User.id.in_(chunk), _not_default_admin(), ~has_accounts, ~has_transactions)
+                .returning(User.id)
+                .execution_options(synchronize_session=False)
+            )
+        )
+        db.commit()
+        rest = [user_id for user_id in chunk if user_id not in deleted]
+        # Оставшиеся существующие — либо дефолтный админ, либо есть счета/транзакции
+        kept = {}
+        if rest:
+            kept = {
+                user_id: "user_has_accounts" if is_not_admin else "cannot_delete_admin"
+                for user_id, is_not_admin in db.execute(
+                    select(User.id, _not_default_admin()).where(User.id.in_(rest))
+                )
+            }
+        for user_id in chunk:
+            outcomes.append((user_id, "deleted" if user_id in deleted else kept.get(user_id, "not_found")))
+    return _bulk_response(outcomes)
+
+
 @router.post(
     "/users/{user_id}/block",
     response_model=UserPublic,
@@ -97,6 +317,55 @@ def delete_user(
     return {"detail": "user_deleted"}
 
 
+@router.get(
+    "/accounts",
+    summary="Выгрузка счетов с владельцами (потоком)",
+    description="Активные счета по возрастанию id с `user_id` и `owner_login`, `format=json` (массив) или `ndjson` "
+    "(строка на счёт). Ответ отдаётся кусками по мере чтения из БД. Keyset: следующая страница — `after_id` = id "
+    "последней полученной строки; строк меньше `limit` — выгрузка окончена. Без `limit` — все счета после `after_id`.",
+)
+def export_accounts(
+    format: ExportFormat = Query("json", description="json или ndjson"),
+    after_id: int | None = Query(None, ge=0, description="id последнего счёта предыдущей страницы"),
+    limit: int | None = Query(None, ge=1, description="Размер страницы"),
+    current_user: User = Depends(require_admin),
+):
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    query = accounts_with_owner_query(after_id=after_id, limit=limit)
+    return StreamingResponse(stream_accounts(current_read_engine(), query, format), media_type=media_type)
+
+
+@router.get(
+    "/password-pool",
+    summary="Состояние пула проверки паролей",
+    description="Счётчики пула процессов для старых bcrypt-паролей в текущем воркере: отправлено, выполнено, "
+    "отклонено из-за переполнения очереди (503), в работе, суммарное время.",
+)
+def password_pool_status(current_user: User = Depends(require_admin)):
+    return pool_stats()
+
+
+@router.get(
+    "/tracing",
+    summary="Состояние трассировки",
+    description="Счётчики трассировки в текущем воркере: запросов, сохранено по выборке (head) и как медленные или "
+    "5xx (tail), отброшено из-за переполнения очереди экспорта, экспортировано, ошибок экспорта.",
+)
+def tracing_status(current_user: User = Depends(require_admin)):
+    return tracing_stats()
+
+
+@router.post(
+    "/rates/refresh",
+    summary="Перечитать курсы валют",
+    description="Перечитывает курсы у провайдера (RATES_FILE или встроенные) и подменяет снимок в текущем воркере. "
+    "Остальные воркеры подхватят изменения файла сами (не реже RATES_REFRESH_SECONDS).",
+)
+def refresh_exchange_rates(current_user: User = Depends(require_admin)):
+    snapshot = refresh_rates()
+    return {"version": snapshot.version, "source": snapshot.source, "toRub": snapshot.public["toRub"]}
+
+
 @router.post(
     "/restore-initial-state",
     status_code=200,
@@ -132,7 +401,7 @@ def restore_initial_state(
 def get_user_banks(
     user_id: int,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     user = db.scalar(select(User).where(User.id == user_id))
     if not user:
@@ -168,12 +437,8 @@ def update_user_banks(
         if code not in external:
             raise HTTPException(status_code=400, detail="invalid_bank_codes")
 
-    # Удаляем старые, добавляем новые
-    existing = list(
-        db.scalars(select(UserBank).where(UserBank.user_id == user_id))
-    )
-    for ub in existing:
-        db.delete(ub)
+    # Удаляем старые, добавляем новые (DELETE отдельным запросом: при flush ORM вставляет раньше, чем удаляет)
+    db.execute(delete(UserBank).where(UserBank.user_id == user_id))
     for code in payload.bank_codes:
         db.add(UserBank(user_id=user_id, bank_code=code))
     db.commit()
@@ -188,7 +453,7 @@ def update_user_banks(
 def get_user_transactions(
     user_id: int,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     user = db.scalar(select(User).where(User.id == user_id))
     if not user:
@@ -197,15 +462,13 @@ def get_user_transactions(
     owned_account_ids = db.scalars(
         select(Account.id).where(Account.user_id == user_id)
     ).all()
-    txs = db.scalars(
-        select(Transaction)
-        .where(
-            or_(
-                Transaction.initiated_by == user_id,
-                Transaction.from_account_id.in_(owned_account_ids),
-                Transaction.to_account_id.in_(owned_account_ids),
-            )
-        )
-        .order_by(Transaction.created_at.desc())
-    ).all()
+    condition = or_(
+        Transaction.initiated_by == user_id,
+        Transaction.from_account_id.in_(owned_account_ids),
+        Transaction.to_account_id.in_(owned_account_ids),
+    )
+    if settings.fast_json_responses:
+        q = select(*TRANSACTION_COLUMNS).where(condition).order_by(Transaction.created_at.desc())
+        return rows_response(transaction_rows(db.execute(q)))
+    txs = db.scalars(select(Transaction).where(condition).order_by(Transaction.created_at.desc())).all()
     return list(txs)
@@ -1,10 +1,14 @@
+import logging
 import random
 import time
 from collections import defaultdict, deque
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from starlette.requests import Request
-from sqlalchemy import select
+from sqlalchemy import case, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.banks import get_external_bank_codes
@@ -13,11 +17,25 @@ from app.core.config import settings
 from app.db import get_db
 from app.models import User, UserBank, UserStatus
 from app.schemas import LoginRequest, RegisterRequest, TokenResponse, UserPublic
-from app.security import create_access_token, validate_password_rules, verify_password
+from app.password_pool import PasswordPoolOverloaded, is_legacy_hash, verify_password_async
+from app.security import create_access_token, validate_password_rules
+
+logger = logging.getLogger("shlapabank.auth")
 
 router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 
 _REGISTER_RATE_WINDOW_SECONDS = 60
+# Колонки нового пользователя для ответа регистрации (UserPublic) прямо из INSERT ... RETURNING
+_REGISTER_RETURNING = (
+    User.id,
+    User.login,
+    User.email,
+    User.role,
+    User.status,
+    User.first_name,
+    User.last_name,
+    User.phone,
+)
 _register_hits_by_key: dict[str, deque[float]] = defaultdict(deque)
 
 
@@ -43,24 +61,66 @@ def _enforce_register_rate_limit(request: Request) -> None:
     q.append(now)
 
 
-def _issue_token_for_credentials(login: str, password: str, db: Session) -> TokenResponse:
-    user = db.scalar(select(User).where(User.login == login))
+def _load_login_user(login: str, db: Session):
+    # Только нужные колонки, без загрузки ORM-объекта
+    user = db.execute(
+        select(User.id, User.role, User.status, User.password_hash, User.failed_login_attempts).where(
+            User.login == login
+        )
+    ).one_or_none()
     if not user:
         raise HTTPException(status_code=401, detail="invalid_credentials")
     if user.status == UserStatus.BLOCKED:
         raise HTTPException(status_code=403, detail="user_blocked")
+    return user
+
 
-    if not verify_password(password, user.password_hash):
-        user.failed_login_attempts += 1
-        if user.failed_login_attempts >= FAILED_LOGIN_THRESHOLD:
-            user.status = UserStatus.BLOCKED
-        db.add(user)
+def _record_failed_login(user, db: Session) -> None:
+    # Счётчик и блокировка — одним UPDATE в БД: параллельные неудачные попытки не теряют инкременты
+    attempts = User.failed_login_attempts + 1
+    failed = db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(
+            failed_login_attempts=attempts,
+            status=case((attempts >= FAILED_LOGIN_THRESHOLD, UserStatus.BLOCKED), else_=User.status),
+        )
+        .returning(User.failed_login_attempts, User.status)
+    ).one()
+    db.commit()
+    if failed.status == UserStatus.BLOCKED and failed.failed_login_attempts == FAILED_LOGIN_THRESHOLD:
+        logger.warning("user %s blocked after %d failed login attempts", user.id, failed.failed_login_attempts)
+
+
+def _record_successful_login(user, password: str, db: Session) -> None:
+    """Сброс счётчика неудач и перевод старого bcrypt-пароля в текущий формат — одним UPDATE, только если нужно."""
+    values = {}
+    conditions = [User.id == user.id]
+    if user.failed_login_attempts:
+        values["failed_login_attempts"] = 0
+    if is_legacy_hash(user.password_hash):
+        # compare-and-set: пароль не успели сменить параллельно
+        values["password_hash"] = password
+        conditions.append(User.password_hash == user.password_hash)
+    if values:
+        db.execute(update(User).where(*conditions).values(**values))
         db.commit()
+
+
+async def _issue_token_for_credentials(login: str, password: str, db: Session) -> TokenResponse:
+    user = await run_in_threadpool(_load_login_user, login, db)
+    try:
+        # bcrypt ($2...) — в пуле процессов, текущий формат — сравнение на месте
+        valid = await verify_password_async(password, user.password_hash)
+    except PasswordPoolOverloaded:
+        raise HTTPException(status_code=503, detail="password_verification_overloaded", headers={"Retry-After": "1"})
+
+    if not valid:
+        await run_in_threadpool(_record_failed_login, user, db)
         raise HTTPException(status_code=401, detail="invalid_credentials")
 
-    user.failed_login_attempts = 0
-    db.add(user)
-    db.commit()
+    if user.failed_login_attempts or is_legacy_hash(user.password_hash):
+        await run_in_threadpool(_record_successful_login, user, password, db)
     token = create_access_token(str(user.id))
     return TokenResponse(access_token=token, role=user.role.value)
 
@@ -74,25 +134,34 @@ def _issue_token_for_credentials(login: str, password: str, db: Session) -> Toke
 def register(request: Request, payload: RegisterRequest, db: Session = Depends(get_db)):
     _enforce_register_rate_limit(request)
     validate_password_rules(payload.login, payload.password)
-    existing = db.scalar(select(User).where(User.login == payload.login))
-    if existing:
-        raise HTTPException(status_code=409, detail="validation_error: login_not_unique")
-
-    user = User(
-        login=payload.login,
-        password_hash=payload.password,
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
 
     external = get_external_bank_codes()
     n = random.randint(0, min(5, len(external)))
     chosen = random.sample(external, n)
-    for bank_code in chosen:
-        db.add(UserBank(user_id=user.id, bank_code=bank_code))
-    db.commit()
 
+    # Один запрос: WITH new_user AS (INSERT ... RETURNING), links AS (INSERT user_banks ... FROM new_user) SELECT new_user.
+    # Уникальность логина проверяет ограничение в БД (без предварительного SELECT и без гонки между запросами).
+    new_user = (
+        insert(User)
+        .values(login=payload.login, password_hash=payload.password)
+        .returning(*_REGISTER_RETURNING)
+        .cte("new_user")
+    )
+    links = (
+        insert(UserBank)
+        .from_select(
+            ["user_id", "bank_code"],
+            select(new_user.c.id, func.unnest(literal(chosen, ARRAY(UserBank.bank_code.type)))),
+        )
+        .cte("links")
+    )
+    try:
+        row = db.execute(select(new_user).add_cte(links)).one()
+        user = UserPublic.model_validate(row)
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="validation_error: login_not_unique") from exc
     return user
 
 
@@ -101,5 +170,5 @@ def register(request: Request, payload: RegisterRequest, db: Session = Depends(g
     response_model=TokenResponse,
     summary="Войти",
 )
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    return _issue_token_for_credentials(payload.login, payload.password, db)
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+    return await _issue_token_for_credentials(payload.login, payload.password, db)
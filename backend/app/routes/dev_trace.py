@@ -1,16 +1,49 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 from app.core.config import settings
 from app.dev_trace import clear_trace_buffer, get_recent_entries
+from app.models import User
+from app.security import require_admin
+from app.slow_queries import clear_slow_queries, slow_query_report
+from app.trace_stream import stream_clients, trace_events
 
 router = APIRouter(prefix="/api/v1/dev", tags=["dev"])
 
 
-@router.get("/trace/recent", summary="Последние записи учебной трассировки (HTTP + ORM)")
-def trace_recent():
+@router.get(
+    "/trace/recent",
+    summary="Последние записи учебной трассировки (HTTP + ORM)",
+    description="Записи всех воркеров по возрастанию seq. С `since` — только новее курсора; "
+    "`next` из ответа передаётся в следующий запрос.",
+)
+def trace_recent(since: int = Query(0, ge=0)):
     if not settings.enable_dev_trace:
         raise HTTPException(status_code=404, detail="not_found")
-    return {"entries": get_recent_entries()}
+    entries, cursor = get_recent_entries(since)
+    return {"entries": entries, "next": cursor}
+
+
+@router.get(
+    "/trace/stream",
+    summary="Поток учебной трассировки (Server-Sent Events)",
+    description="События `message` с записью трассировки (`id` — её seq) по мере появления. Начинает с записей "
+    "новее `since` или заголовка Last-Event-ID (при переподключении EventSource). Медленный клиент теряет самые "
+    "старые записи и получает событие `dropped` с их числом.",
+)
+async def trace_stream(request: Request, since: int = Query(0, ge=0)):
+    if not settings.enable_dev_trace:
+        raise HTTPException(status_code=404, detail="not_found")
+    if stream_clients() >= settings.dev_trace_stream_max_clients:
+        raise HTTPException(status_code=503, detail="too_many_trace_streams")
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+    return StreamingResponse(
+        trace_events(since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/trace/clear", summary="Очистить буфер учебной трассировки на сервере")
@@ -19,3 +52,27 @@ def trace_clear():
         raise HTTPException(status_code=404, detail="not_found")
     clear_trace_buffer()
     return {"detail": "trace_buffer_cleared"}
+
+
+@router.get(
+    "/slow-queries",
+    summary="Медленные SQL-запросы",
+    description="Запросы дольше SLOW_QUERY_THRESHOLD_MS по отпечаткам (текст без значений), самые дорогие по "
+    "суммарному времени — первыми: вызовы, p50/p99/максимум, формы параметров и план первого медленного вызова. "
+    "Только администратор; 404, если журнал выключен (SLOW_QUERY_LOG_ENABLED).",
+)
+def slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin),
+):
+    if not settings.slow_query_log_enabled:
+        raise HTTPException(status_code=404, detail="not_found")
+    return slow_query_report(limit)
+
+
+@router.post("/slow-queries/clear", summary="Очистить журнал медленных SQL-запросов")
+def slow_queries_clear(current_user: User = Depends(require_admin)):
+    if not settings.slow_query_log_enabled:
+        raise HTTPException(status_code=404, detail="not_found")
+    clear_slow_queries()
+    return {"detail": "slow_queries_cleared"}
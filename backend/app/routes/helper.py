@@ -3,9 +3,10 @@ from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.exc import OperationalError, ProgrammingError
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.account_export import accounts_with_owner_query
+from app.db import get_db, get_read_db
 from app.models import Account, Transaction, TransactionStatus, TransactionType, User, UserRole
 from app.otp import OTP_TTL_MINUTES, issue_otp_preview
 from app.schemas import AccountPublic
@@ -46,23 +47,21 @@ def _get_account_for_helper(account_id: int, current_user: User, db: Session) ->
 )
 def helper_list_accounts(
     current_user: User = Depends(require_active_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     if current_user.role == UserRole.ADMIN:
-        accounts = list(
-            db.scalars(
-                select(Account)
-                .options(joinedload(Account.owner))
-                .where(Account.is_active.is_(True))
-                .order_by(Account.id)
-            )
-        )
+        # Кортежи колонок вместо ORM-объектов с joinedload; для больших выгрузок — GET /admin/accounts (поток)
         return [
             {
-                **AccountPublic.model_validate(a).model_dump(),
-                "owner_login": a.owner.login if a.owner else None,
+                "id": row.id,
+                "account_number": row.account_number,
+                "account_type": row.account_type,
+                "currency": row.currency,
+                "balance": row.balance,
+                "is_primary": row.is_primary,
+                "owner_login": row.owner_login,
             }
-            for a in accounts
+            for row in db.execute(accounts_with_owner_query())
         ]
     accounts = list(
         db.scalars(
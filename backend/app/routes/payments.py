@@ -1,12 +1,13 @@
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_own_active_account
 from app.db import get_db
 from app.models import Account, Currency, Transaction, TransactionStatus, TransactionType, User
 from app.otp import validate_otp_for_user
+from app.reference_data import CATALOG_CACHE_CONTROL, build_payload, reference_response
 from app.schemas import MobilePaymentRequest, TransactionPublic, VendorPaymentRequest
 from app.security import require_active_user
 
@@ -37,17 +38,28 @@ VENDOR_PROVIDERS = {
 VENDOR_MIN = Decimal("100.00")
 VENDOR_MAX = Decimal("500000.00")
 
+MOBILE_OPERATORS_PAYLOAD = build_payload(
+    {
+        "operators": MOBILE_OPERATORS,
+        "amountRangeRub": {"min": int(MOBILE_MIN), "max": int(MOBILE_MAX)},
+    },
+    CATALOG_CACHE_CONTROL,
+)
+VENDOR_PROVIDERS_PAYLOAD = build_payload(
+    {
+        "providers": [{"name": name, "accountLength": length} for name, length in VENDOR_PROVIDERS.items()],
+        "amountRangeRub": {"min": int(VENDOR_MIN), "max": int(VENDOR_MAX)},
+    },
+    CATALOG_CACHE_CONTROL,
+)
+
 
 @router.get(
     "/mobile/operators",
     summary="Получить операторов",
 )
-def mobile_operators(current_user: User = Depends(require_active_user)):
-    return {
-        "userId": current_user.id,
-        "operators": MOBILE_OPERATORS,
-        "amountRangeRub": {"min": int(MOBILE_MIN), "max": int(MOBILE_MAX)},
-    }
+def mobile_operators(request: Request, current_user: User = Depends(require_active_user)):
+    return reference_response(request, MOBILE_OPERATORS_PAYLOAD, current_user.id)
 
 
 @router.post(
@@ -98,12 +110,8 @@ def pay_mobile(
     "/vendor/providers",
     summary="Получить поставщиков",
 )
-def vendor_providers(current_user: User = Depends(require_active_user)):
-    return {
-        "userId": current_user.id,
-        "providers": [{"name": name, "accountLength": length} for name, length in VENDOR_PROVIDERS.items()],
-        "amountRangeRub": {"min": int(VENDOR_MIN), "max": int(VENDOR_MAX)},
-    }
+def vendor_providers(request: Request, current_user: User = Depends(require_active_user)):
+    return reference_response(request, VENDOR_PROVIDERS_PAYLOAD, current_user.id)
 
 
 def _execute_vendor_payment(
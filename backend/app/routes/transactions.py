@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from sqlalchemy import or_, select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 
-from app.db import get_db
+from app.core.config import settings
+from app.db import get_db, get_read_db
+from app.fast_json import TRANSACTION_COLUMNS, rows_response, transaction_rows
 from app.models import Account, Transaction, User
 from app.schemas import TransactionPublic
 from app.security import require_active_user
@@ -13,18 +15,6 @@ router = APIRouter(prefix="/api/v1/transactions", tags=["transactions"])
 BANK_LABEL = "ShlapaBank"
 
 
-def _user_can_access_transaction(tx: Transaction, current_user: User, db: Session) -> bool:
-    """Проверка: транзакция принадлежит пользователю (инициатор или счета свои)."""
-    if tx.initiated_by == current_user.id:
-        return True
-    owned = set(db.scalars(select(Account.id).where(Account.user_id == current_user.id)).all())
-    if tx.from_account_id and tx.from_account_id in owned:
-        return True
-    if tx.to_account_id and tx.to_account_id in owned:
-        return True
-    return False
-
-
 def _fee_from_tx(tx: Transaction) -> "Decimal":
     """Комиссия: из колонки fee или из description для старых записей."""
     from decimal import Decimal
@@ -147,20 +137,18 @@ def _build_receipt_html(tx: Transaction, from_num: str | None, to_num: str | Non
 )
 def list_transactions(
     current_user: User = Depends(require_active_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     owned_account_ids = db.scalars(select(Account.id).where(Account.user_id == current_user.id)).all()
-    return db.scalars(
-        select(Transaction)
-        .where(
-            or_(
-                Transaction.initiated_by == current_user.id,
-                Transaction.from_account_id.in_(owned_account_ids),
-                Transaction.to_account_id.in_(owned_account_ids),
-            )
-        )
-        .order_by(Transaction.created_at.desc())
-    ).all()
+    condition = or_(
+        Transaction.initiated_by == current_user.id,
+        Transaction.from_account_id.in_(owned_account_ids),
+        Transaction.to_account_id.in_(owned_account_ids),
+    )
+    if settings.fast_json_responses:
+        q = select(*TRANSACTION_COLUMNS).where(condition).order_by(Transaction.created_at.desc())
+        return rows_response(transaction_rows(db.execute(q)))
+    return db.scalars(select(Transaction).where(condition).order_by(Transaction.created_at.desc())).all()
 
 
 @router.get(
@@ -174,22 +162,25 @@ def get_receipt(
     current_user: User = Depends(require_active_user),
     db: Session = Depends(get_db),
 ):
-    tx = db.scalar(select(Transaction).where(Transaction.id == transaction_id))
-    if not tx:
-        raise HTTPException(status_code=404, detail="not_found")
-    if not _user_can_access_transaction(tx, current_user, db):
+    # Одним запросом: операция, номера обоих счетов и проверка доступа (инициатор или один из счетов свой)
+    from_acc = aliased(Account)
+    to_acc = aliased(Account)
+    row = db.execute(
+        select(Transaction, from_acc.account_number, to_acc.account_number)
+        .outerjoin(from_acc, from_acc.id == Transaction.from_account_id)
+        .outerjoin(to_acc, to_acc.id == Transaction.to_account_id)
+        .where(
+            Transaction.id == transaction_id,
+            or_(
+                Transaction.initiated_by == current_user.id,
+                from_acc.user_id == current_user.id,
+                to_acc.user_id == current_user.id,
+            ),
+        )
+    ).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="not_found")
-
-    from_num = None
-    to_num = None
-    if tx.from_account_id:
-        acc = db.scalar(select(Account).where(Account.id == tx.from_account_id))
-        if acc:
-            from_num = acc.account_number
-    if tx.to_account_id:
-        acc = db.scalar(select(Account).where(Account.id == tx.to_account_id))
-        if acc:
-            to_num = acc.account_number
+    tx, from_num, to_num = row
 
     html = _build_receipt_html(tx, from_num, to_num)
     return HTMLResponse(html, headers={"Content-Disposition": f'attachment; filename="chek-operacii-{tx.id}.html"'})
@@ -1,17 +1,22 @@
 from datetime import datetime, timezone
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, or_, select
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session, aliased
 
 from app.banks import OUR_BANK_CODE, BANKS_CATALOG
 from app.constants import DAILY_TRANSFER_LIMIT, MAX_TRANSFER_AMOUNT, MIN_TRANSFER_AMOUNT
 from app.db import get_db
 from app.phone_utils import normalize_phone
+from app.quotes import claim_quote, find_quote, issue_quote, restore_quote
+from app.rates import current_rates
+from app.reference_data import EXTERNAL_BANKS, EXTERNAL_BANKS_PAYLOAD, rates_payload, reference_response
 from app.models import Account, AccountType, Bank, Currency, Transaction, TransactionStatus, TransactionType, User, UserBank
 from app.otp import validate_otp_for_user
 from app.schemas import (
+    ExchangeQuoteRequest,
+    ExchangeQuoteResponse,
     ExchangeRequest,
     TransferByAccountCheckResponse,
     TransferByAccountRequest,
@@ -24,13 +29,6 @@ from app.security import require_active_user
 
 router = APIRouter(prefix="/api/v1/transfers", tags=["transfers"])
 
-RATES_TO_RUB: dict[Currency, Decimal] = {
-    # Захардкоженные ориентировочные курсы к RUB
-    Currency.RUB: Decimal("1"),
-    Currency.USD: Decimal("95"),   # 1 USD ≈ 95 RUB
-    Currency.EUR: Decimal("105"),  # 1 EUR ≈ 105 RUB
-    Currency.CNY: Decimal("13.5"), # 1 CNY ≈ 13.5 RUB
-}
 
 
 def _calc_today_transfers_per_currency(current_user: User, db: Session) -> dict[Currency, Decimal]:
@@ -57,6 +55,22 @@ def _calc_today_transfers_per_currency(current_user: User, db: Session) -> dict[
     return per_currency
 
 
+def _lock_accounts(db: Session, account_ids: list[int]) -> dict[int, Account]:
+    """
+    SELECT … FOR UPDATE по возрастанию id: любые два перевода берут блокировки в одном порядке,
+    поэтому встречные переводы A→B и B→A ждут друг друга, а не попадают в deadlock.
+    Уже загруженные в сессию счета перечитываются (баланс — на момент блокировки).
+    """
+    locked = db.scalars(
+        select(Account)
+        .where(Account.id.in_(account_ids))
+        .order_by(Account.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).all()
+    return {acc.id: acc for acc in locked}
+
+
 def _mask_account(account_number: str) -> str:
     """Маскирует номер счёта: ••••1234."""
     if not account_number:
@@ -98,9 +112,7 @@ def create_transfer(
     if payload.amount > MAX_TRANSFER_AMOUNT:
         raise HTTPException(status_code=400, detail="transfer_amount_exceeds_single_limit")
 
-    account_ids = sorted([payload.from_account_id, payload.to_account_id])
-    locked = db.scalars(select(Account).where(Account.id.in_(account_ids)).with_for_update()).all()
-    by_id = {acc.id: acc for acc in locked}
+    by_id = _lock_accounts(db, [payload.from_account_id, payload.to_account_id])
     source = by_id.get(payload.from_account_id)
     target = by_id.get(payload.to_account_id)
 
@@ -159,17 +171,13 @@ def create_transfer_by_account(
     if payload.amount > MAX_TRANSFER_AMOUNT:
         raise HTTPException(status_code=400, detail="transfer_amount_exceeds_single_limit")
 
-    source = db.scalar(
-        select(Account)
-        .where(Account.id == payload.from_account_id, Account.user_id == current_user.id)
-        .with_for_update()
-    )
-    if not source:
+    # Счёт получателя сначала ищется без блокировки: оба счёта блокируются вместе в порядке id
+    target_id = db.scalar(select(Account.id).where(Account.account_number == payload.target_account_number))
+    by_id = _lock_accounts(db, [payload.from_account_id] if target_id is None else [payload.from_account_id, target_id])
+    source = by_id.get(payload.from_account_id)
+    if not source or source.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="account_not_found")
-
-    target = db.scalar(
-        select(Account).where(Account.account_number == payload.target_account_number).with_for_update()
-    )
+    target = by_id.get(target_id)
     if not target:
         raise HTTPException(status_code=404, detail="account_not_found")
 
@@ -312,13 +320,9 @@ def create_transfer_external_by_account(
     return tx
 
 
-def _external_banks_list() -> list[dict]:
-    """Список внешних банков для ответа (когда получатель не найден — показываем все)."""
-    return [
-        {"id": code, "label": label}
-        for code, label in BANKS_CATALOG
-        if code != OUR_BANK_CODE
-    ]
+@router.get("/banks", summary="Получить список внешних банков")
+def external_banks(request: Request, current_user: User = Depends(require_active_user)):
+    return reference_response(request, EXTERNAL_BANKS_PAYLOAD)
 
 
 @router.get(
@@ -334,18 +338,22 @@ def by_phone_check(
     """Если получатель в нашем банке — возвращаем название нашего банка (ShlapaBank) + его 0–5 назначенных банков. Иначе — все внешние банки."""
     normalized = normalize_phone(phone)
     if not normalized:
-        return TransferByPhoneCheckResponse(inOurBank=False, availableBanks=_external_banks_list())
-    recipient = db.scalar(select(User).where(User.phone == normalized))
-    if recipient:
+        return TransferByPhoneCheckResponse(inOurBank=False, availableBanks=list(EXTERNAL_BANKS))
+    # Получатель и его назначенные банки одним запросом (LEFT JOIN: у получателя может не быть банков)
+    rows = db.execute(
+        select(User.id, Bank.code, Bank.label)
+        .outerjoin(UserBank, UserBank.user_id == User.id)
+        .outerjoin(Bank, Bank.code == UserBank.bank_code)
+        .where(User.phone == normalized)
+    ).all()
+    if rows:
         our_bank = next((b for b in BANKS_CATALOG if b[0] == OUR_BANK_CODE), None)
         options = [{"id": our_bank[0], "label": our_bank[1]}] if our_bank else []
-        user_banks = db.scalars(
-            select(Bank).join(UserBank, UserBank.bank_code == Bank.code).where(UserBank.user_id == recipient.id)
-        ).all()
-        for b in user_banks:
-            options.append({"id": b.code, "label": b.label})
+        for _, code, label in rows:
+            if code is not None:
+                options.append({"id": code, "label": label})
         return TransferByPhoneCheckResponse(inOurBank=True, availableBanks=options)
-    return TransferByPhoneCheckResponse(inOurBank=False, availableBanks=_external_banks_list())
+    return TransferByPhoneCheckResponse(inOurBank=False, availableBanks=list(EXTERNAL_BANKS))
 
 
 @router.post(
@@ -368,10 +376,9 @@ def create_transfer_by_phone(
     if amount > MAX_TRANSFER_AMOUNT:
         raise HTTPException(status_code=400, detail="transfer_amount_exceeds_single_limit")
 
+    # Блокировка берётся позже, когда известен счёт получателя (см. _lock_accounts)
     source = db.scalar(
-        select(Account)
-        .where(Account.id == payload.from_account_id, Account.user_id == current_user.id)
-        .with_for_update()
+        select(Account).where(Account.id == payload.from_account_id, Account.user_id == current_user.id)
     )
     if not source:
         raise HTTPException(status_code=404, detail="account_not_found")
@@ -380,30 +387,41 @@ def create_transfer_by_phone(
     if source.account_type == AccountType.SAVINGS:
         raise HTTPException(status_code=400, detail="transfer_not_allowed_from_savings")
 
-    used_per_currency = _calc_today_transfers_per_currency(current_user, db)
-    _check_daily_limit(used_per_currency, source.currency, amount)
-
     if payload.recipient_bank_id == OUR_BANK_CODE:
-        if source.balance < amount:
-            raise HTTPException(status_code=400, detail="insufficient_funds")
         normalized_phone = normalize_phone(payload.phone) or payload.phone
-        recipient = db.scalar(select(User).where(User.phone == normalized_phone))
-        if not recipient:
-            raise HTTPException(status_code=404, detail="recipient_not_found_in_our_bank")
-        target = db.scalar(
-            select(Account)
-            .where(
-                Account.user_id == recipient.id,
-                Account.currency == source.currency,
-                Account.account_type == AccountType.DEBIT,
-                Account.is_active.is_(True),
+        found = db.execute(
+            select(User.id, Account.id)
+            .outerjoin(
+                Account,
+                and_(
+                    Account.user_id == User.id,
+                    Account.currency == source.currency,
+                    Account.account_type == AccountType.DEBIT,
+                    Account.is_active.is_(True),
+                ),
             )
-            .with_for_update()
-        )
-        if not target:
+            .where(User.phone == normalized_phone)
+            .order_by(Account.id)
+            .limit(1)
+        ).first()
+        if not found:
+            raise HTTPException(status_code=404, detail="recipient_not_found_in_our_bank")
+        target_id = found[1]
+        if target_id is None:
             raise HTTPException(status_code=400, detail="recipient_has_no_suitable_account")
-        if source.id == target.id:
+        if source.id == target_id:
             raise HTTPException(status_code=400, detail="transfer_same_account")
+        by_id = _lock_accounts(db, [source.id, target_id])
+        source, target = by_id[source.id], by_id.get(target_id)
+        if not target or not target.is_active:
+            raise HTTPException(status_code=400, detail="recipient_has_no_suitable_account")
+        if not source.is_active:
+            raise HTTPException(status_code=400, detail="account_inactive")
+        # Лимит считается под блокировкой счёта списания: параллельные переводы с него не обойдут его вдвоём
+        used_per_currency = _calc_today_transfers_per_currency(current_user, db)
+        _check_daily_limit(used_per_currency, source.currency, amount)
+        if source.balance < amount:
+            raise HTTPException(status_code=400, detail="insufficient_funds")
         source.balance -= amount
         target.balance += amount
         masked = _mask_account(target.account_number)
@@ -428,6 +446,9 @@ def create_transfer_by_phone(
     # Перевод в другой банк: комиссия 2%, списание amount + fee
     fee = (amount * EXTERNAL_PHONE_FEE_RATE).quantize(Decimal("0.01"))
     total_debit = amount + fee
+    source = _lock_accounts(db, [source.id])[source.id]
+    used_per_currency = _calc_today_transfers_per_currency(current_user, db)
+    _check_daily_limit(used_per_currency, source.currency, amount)
     if source.balance < total_debit:
         raise HTTPException(status_code=400, detail="insufficient_funds")
     source.balance -= total_debit
@@ -449,34 +470,16 @@ def create_transfer_by_phone(
     return tx
 
 
-@router.post(
-    "/exchange",
-    response_model=TransactionPublic,
-    status_code=201,
-    summary="Обменять валюту",
-)
-def exchange_currency(
-    payload: ExchangeRequest,
-    current_user: User = Depends(require_active_user),
-    db: Session = Depends(get_db),
-):
-    if not validate_otp_for_user(current_user.id, payload.otp_code):
-        raise HTTPException(status_code=400, detail="invalid_otp_code")
-
-    if payload.from_account_id == payload.to_account_id:
+def _check_exchange_request(from_account_id: int, to_account_id: int, amount: Decimal) -> None:
+    if from_account_id == to_account_id:
         raise HTTPException(status_code=400, detail="transfer_same_account")
-
-    if payload.amount < MIN_TRANSFER_AMOUNT:
+    if amount < MIN_TRANSFER_AMOUNT:
         raise HTTPException(status_code=400, detail="transfer_amount_too_small")
-    if payload.amount > MAX_TRANSFER_AMOUNT:
+    if amount > MAX_TRANSFER_AMOUNT:
         raise HTTPException(status_code=400, detail="transfer_amount_exceeds_single_limit")
 
-    account_ids = sorted([payload.from_account_id, payload.to_account_id])
-    locked = db.scalars(select(Account).where(Account.id.in_(account_ids)).with_for_update()).all()
-    by_id = {acc.id: acc for acc in locked}
-    source = by_id.get(payload.from_account_id)
-    target = by_id.get(payload.to_account_id)
 
+def _check_exchange_accounts(source: Account | None, target: Account | None, current_user: User) -> None:
     if not source or not target:
         raise HTTPException(status_code=404, detail="account_not_found")
     if source.user_id != current_user.id or target.user_id != current_user.id:
@@ -488,10 +491,98 @@ def exchange_currency(
     if source.currency == target.currency:
         raise HTTPException(status_code=400, detail="currency_mismatch")
 
-    source_rate = RATES_TO_RUB.get(source.currency)
-    target_rate = RATES_TO_RUB.get(target.currency)
-    if source_rate is None or target_rate is None:
+
+@router.post(
+    "/exchange/quote",
+    response_model=ExchangeQuoteResponse,
+    status_code=201,
+    summary="Зафиксировать курс обмена",
+    description="Курс и сумма зачисления фиксируются на EXCHANGE_QUOTE_TTL_SECONDS (по умолчанию 30 с). "
+    "Котировка одноразовая: передайте `quote_id` в POST /transfers/exchange с теми же счетами и суммой.",
+)
+def exchange_quote(
+    payload: ExchangeQuoteRequest,
+    current_user: User = Depends(require_active_user),
+    db: Session = Depends(get_db),
+):
+    _check_exchange_request(payload.from_account_id, payload.to_account_id, payload.amount)
+    accounts = db.scalars(
+        select(Account).where(Account.id.in_([payload.from_account_id, payload.to_account_id]))
+    ).all()
+    by_id = {acc.id: acc for acc in accounts}
+    source = by_id.get(payload.from_account_id)
+    target = by_id.get(payload.to_account_id)
+    _check_exchange_accounts(source, target, current_user)
+
+    rates = current_rates()
+    if (source.currency, target.currency) not in rates.cross:
         raise HTTPException(status_code=400, detail="currency_not_supported_for_exchange")
+    quote = issue_quote(
+        user_id=current_user.id,
+        from_account_id=source.id,
+        to_account_id=target.id,
+        source_currency=source.currency,
+        target_currency=target.currency,
+        amount=payload.amount,
+        rates=rates,
+    )
+    return ExchangeQuoteResponse(
+        quote_id=quote.quote_id,
+        from_account_id=quote.from_account_id,
+        to_account_id=quote.to_account_id,
+        source_currency=quote.source_currency,
+        target_currency=quote.target_currency,
+        amount=quote.amount,
+        rate=quote.rate,
+        target_amount=quote.target_amount,
+        rate_snapshot_id=quote.rate_snapshot_id,
+        expires_at=quote.expires_at,
+    )
+
+
+@router.post(
+    "/exchange",
+    response_model=TransactionPublic,
+    status_code=201,
+    summary="Обменять валюту",
+)
+def exchange_currency(
+    payload: ExchangeRequest,
+    current_user: User = Depends(require_active_user),
+    db: Session = Depends(get_db),
+):
+    if not validate_otp_for_user(current_user.id, payload.otp_code):
+        raise HTTPException(status_code=400, detail="invalid_otp_code")
+
+    _check_exchange_request(payload.from_account_id, payload.to_account_id, payload.amount)
+
+    quote = None
+    if payload.quote_id is not None:
+        # Курс и сумма зачисления уже посчитаны; сама котировка изымается только перед записью обмена
+        quote = find_quote(payload.quote_id, current_user.id)
+        if quote is None:
+            raise HTTPException(status_code=400, detail="quote_not_found_or_expired")
+        if (quote.from_account_id, quote.to_account_id, quote.amount) != (
+            payload.from_account_id,
+            payload.to_account_id,
+            payload.amount,
+        ):
+            raise HTTPException(status_code=400, detail="quote_mismatch")
+
+    by_id = _lock_accounts(db, [payload.from_account_id, payload.to_account_id])
+    source = by_id.get(payload.from_account_id)
+    target = by_id.get(payload.to_account_id)
+    _check_exchange_accounts(source, target, current_user)
+
+    if quote is not None:
+        target_amount, rate_snapshot_id = quote.target_amount, quote.rate_snapshot_id
+    else:
+        # Один снимок курсов на всю операцию: курс и его версия в транзакции согласованы
+        rates = current_rates()
+        if (source.currency, target.currency) not in rates.cross:
+            raise HTTPException(status_code=400, detail="currency_not_supported_for_exchange")
+        target_amount = rates.convert(payload.amount, source.currency, target.currency)
+        rate_snapshot_id = rates.version
 
     if source.balance < payload.amount:
         raise HTTPException(status_code=400, detail="insufficient_funds")
@@ -500,9 +591,6 @@ def exchange_currency(
     used_per_currency = _calc_today_transfers_per_currency(current_user, db)
     _check_daily_limit(used_per_currency, source.currency, payload.amount)
 
-    rub_equivalent = payload.amount * source_rate
-    target_amount = (rub_equivalent / target_rate).quantize(Decimal("0.01"))
-
     source.balance -= payload.amount
     target.balance += target_amount
 
@@ -516,11 +604,20 @@ def exchange_currency(
         initiated_by=current_user.id,
         description=f"fx_exchange:{source.currency.value}->{target.currency.value}:{target_amount}",
         fee=Decimal("0"),
+        rate_snapshot_id=rate_snapshot_id,
     )
     db.add(source)
     db.add(target)
     db.add(tx)
-    db.commit()
+    # Котировка одноразовая: из двух параллельных обменов по ней проходит один
+    if quote is not None and not claim_quote(quote):
+        raise HTTPException(status_code=400, detail="quote_not_found_or_expired")
+    try:
+        db.commit()
+    except Exception:
+        if quote is not None:
+            restore_quote(quote)
+        raise
     db.refresh(tx)
     return tx
 
@@ -552,9 +649,5 @@ def daily_usage(
 
 
 @router.get("/rates", summary="Получить курсы валют")
-def exchange_rates(current_user: User = Depends(require_active_user)):
-    return {
-        "userId": current_user.id,
-        "base": "RUB",
-        "toRub": {currency.value: str(rate) for currency, rate in RATES_TO_RUB.items()},
-    }
+def exchange_rates(request: Request, current_user: User = Depends(require_active_user)):
+    return reference_response(request, rates_payload(current_rates()), current_user.id)
@@ -168,6 +168,34 @@ class ExchangeRequest(BaseModel):
     to_account_id: int
     amount: Decimal = Field(gt=0)
     otp_code: OtpCode
+    quote_id: str | None = Field(
+        default=None, max_length=64, description="Котировка из POST /transfers/exchange/quote (курс зафиксирован)"
+    )
+
+
+class ExchangeQuoteRequest(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={"example": {"from_account_id": 1, "to_account_id": 2, "amount": "1000.00"}}
+    )
+
+    from_account_id: int
+    to_account_id: int
+    amount: Decimal = Field(gt=0)
+
+
+class ExchangeQuoteResponse(BaseModel):
+    """Зафиксированный курс обмена: действует до expires_at, используется один раз (quote_id в /exchange)."""
+
+    quote_id: str
+    from_account_id: int
+    to_account_id: int
+    source_currency: Currency
+    target_currency: Currency
+    amount: Decimal
+    rate: Decimal
+    target_amount: Decimal
+    rate_snapshot_id: str
+    expires_at: datetime
 
 
 class TransferByAccountRequest(BaseModel):
@@ -281,6 +309,44 @@ class AccountPublic(BaseModel):
     is_primary: bool = False
 
 
+class AdminUserFilter(BaseModel):
+    """Фильтры списка пользователей в админке (все необязательные, объединяются через AND)."""
+
+    status: UserStatus | None = None
+    role: UserRole | None = None
+    login_prefix: str | None = Field(default=None, min_length=1, max_length=20, description="Начало логина")
+    email_prefix: str | None = Field(
+        default=None, min_length=1, max_length=255, description="Начало email (без учёта регистра)"
+    )
+    phone: str | None = Field(default=None, min_length=1, max_length=20, description="Телефон (точное совпадение)")
+
+
+class AdminBulkUsersRequest(BaseModel):
+    """Массовая операция над пользователями: явный список id или фильтр (ровно одно из двух)."""
+
+    user_ids: list[int] | None = Field(default=None, min_length=1, max_length=10000)
+    filter: AdminUserFilter | None = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError("user_ids_or_filter_required")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            # Пустой фильтр задел бы всех пользователей разом
+            raise ValueError("empty_filter")
+        return self
+
+
+class AdminBulkUserResult(BaseModel):
+    id: int
+    outcome: str  # blocked / unblocked / deleted / not_found / cannot_block_admin / cannot_delete_admin / user_has_accounts
+
+
+class AdminBulkUsersResponse(BaseModel):
+    results: list[AdminBulkUserResult]
+    summary: dict[str, int]  # outcome → количество
+
+
 class UserBanksUpdateRequest(BaseModel):
     """Список кодов банков для перевода (0–5, только внешние из справочника)."""
     bank_codes: list[str] = Field(min_length=0)
@@ -355,6 +421,7 @@ class TransactionPublic(BaseModel):
     from_account_id: int | None
     to_account_id: int | None
     status: TransactionStatus
+    rate_snapshot_id: str | None = Field(default=None, description="Версия курсов, по которым выполнен обмен")
 
     @model_validator(mode="before")
     @classmethod
@@ -382,4 +449,5 @@ class TransactionPublic(BaseModel):
             "from_account_id": orm.from_account_id,
             "to_account_id": orm.to_account_id,
             "status": orm.status,
+            "rate_snapshot_id": getattr(orm, "rate_snapshot_id", None),
         }
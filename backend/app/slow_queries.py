@@ -0,0 +1,236 @@
+"""
+Журнал медленных SQL-запросов (SLOW_QUERY_LOG_ENABLED, по умолчанию выключен).
+
+Запрос дольше SLOW_QUERY_THRESHOLD_MS заводит запись по «отпечатку» — форме запроса без
+значений (normalize_statement). С этого момента по отпечатку считаются все вызовы, не только
+медленные: число вызовов и медленных, p50/p99/максимум по последним _SAMPLES_PER_FINGERPRINT
+замерам, формы параметров (имена и типы, без значений). Быстрые запросы без записи стоят один
+поиск в кеше отпечатков.
+
+При первом медленном вызове фоновый поток снимает план тем же текстом и параметрами:
+для чистого чтения — EXPLAIN (ANALYZE, BUFFERS) в транзакции с откатом и коротким lock_timeout/statement_timeout,
+для остального — EXPLAIN без ANALYZE: ANALYZE выполнил бы запрос. Это изменяющие запросы, а также SELECT
+с побочными эффектами: блокировки строк (FOR UPDATE/SHARE на горячих счетах переводов), nextval/setval
+(номера счетов расходовали бы последовательность), advisory lock. Очередь планов ограничена; при переполнении
+план просто не снимается.
+
+Смотреть: GET /api/v1/dev/slow-queries (только администратор).
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import queue
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.sql_events import add_statement_observer, is_savepoint_statement, normalize_statement
+
+logger = logging.getLogger("shlapabank.slow_queries")
+
+_SAMPLES_PER_FINGERPRINT = 1024
+_MAX_PARAM_SHAPES = 5
+_EXPLAIN_QUEUE_SIZE = 64
+_EXPLAIN_STATEMENT_TIMEOUT_MS = 5000
+_EXPLAIN_LOCK_TIMEOUT_MS = 500
+_STATEMENT_MAX_CHARS = 2000
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+# Что вообще можно передать в EXPLAIN (SAVEPOINT, SET, COMMIT и т.п. — нельзя)
+_EXPLAINABLE = frozenset({"SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "MERGE", "VALUES", "TABLE"})
+# SELECT, который при выполнении что-то меняет: блокирует строки, двигает последовательность, берёт advisory lock
+_SIDE_EFFECT_RE = re.compile(
+    r"\bFOR\s+(UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b"
+    r"|\b(nextval|setval|pg_advisory_\w+|pg_try_advisory_\w+)\s*\(",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    statement: str
+    calls: int = 0
+    slow_calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=_SAMPLES_PER_FINGERPRINT))
+    param_shapes: list[str] = field(default_factory=list)
+    explain: str | None = None
+    explain_error: str | None = None
+
+    def as_dict(self) -> dict:
+        samples = sorted(self.samples)
+        return {
+            "fingerprint": self.fingerprint,
+            "calls": self.calls,
+            "slow_calls": self.slow_calls,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "param_shapes": list(self.param_shapes),
+            "explain": self.explain,
+            "explain_error": self.explain_error,
+        }
+
+
+_lock = threading.Lock()
+_entries: dict[str, SlowQuery] = {}
+_dropped_fingerprints = 0
+_explain_queue: queue.Queue[tuple[SlowQuery, str, Any] | None] = queue.Queue(maxsize=_EXPLAIN_QUEUE_SIZE)
+_explainer: threading.Thread | None = None
+# Поток, снимающий план: его собственные запросы (EXPLAIN, SET LOCAL) не учитываются
+_explaining = threading.local()
+
+
+def _percentile(sorted_samples: list[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+@functools.lru_cache(maxsize=4096)
+def _fingerprint(statement: str) -> str:
+    return normalize_statement(statement)
+
+
+def _shape(value: Any) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def param_shape(parameters: Any, executemany: bool) -> str:
+    """Форма параметров без значений: {"login": str, "id_1": int} или (int, str); у executemany — «×N»."""
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return f"{param_shape(parameters[0], False)} ×{len(parameters)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_shape(value)}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_shape(value) for value in parameters) + ")"
+    return "()"
+
+
+def _on_statement(statement: str, parameters: Any, executemany: bool, duration: float, failed: bool) -> None:  # noqa: ARG001
+    global _dropped_fingerprints
+    if getattr(_explaining, "active", False) or is_savepoint_statement(statement):
+        return
+    fingerprint = _fingerprint(statement)
+    entry = _entries.get(fingerprint)
+    slow = duration * 1000 >= settings.slow_query_threshold_ms
+    if entry is None and not slow:
+        return
+    first = False
+    with _lock:
+        entry = _entries.get(fingerprint)
+        if entry is None:
+            if len(_entries) >= settings.slow_query_max_fingerprints:
+                _dropped_fingerprints += 1
+                return
+            entry = _entries[fingerprint] = SlowQuery(fingerprint, statement[:_STATEMENT_MAX_CHARS])
+            first = True
+        entry.calls += 1
+        entry.total_seconds += duration
+        entry.max_seconds = max(entry.max_seconds, duration)
+        entry.samples.append(duration)
+        if slow:
+            entry.slow_calls += 1
+            shape = param_shape(parameters, executemany)
+            if shape not in entry.param_shapes and len(entry.param_shapes) < _MAX_PARAM_SHAPES:
+                entry.param_shapes.append(shape)
+    if first:
+        logger.warning("slow query %.1f ms: %s", duration * 1000, fingerprint[:300])
+        if settings.slow_query_explain and not executemany and _keyword(statement) in _EXPLAINABLE:
+            try:
+                _explain_queue.put_nowait((entry, statement, parameters))
+            except queue.Full:
+                entry.explain_error = "explain_queue_full"
+
+
+def _keyword(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+
+
+def _is_read_only(statement: str) -> bool:
+    """Можно ли выполнить запрос под EXPLAIN ANALYZE без последствий."""
+    keyword = _keyword(statement)
+    if keyword not in ("SELECT", "WITH") or _SIDE_EFFECT_RE.search(statement) is not None:
+        return False
+    return keyword == "SELECT" or _WRITE_RE.search(statement) is None
+
+
+def _explain(entry: SlowQuery, statement: str, parameters: Any) -> None:
+    from app.db import engine
+
+    explain = "EXPLAIN (ANALYZE, BUFFERS)" if _is_read_only(statement) else "EXPLAIN"
+    _explaining.active = True
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f"SET LOCAL statement_timeout = {_EXPLAIN_STATEMENT_TIMEOUT_MS}"))
+            conn.execute(text(f"SET LOCAL lock_timeout = {_EXPLAIN_LOCK_TIMEOUT_MS}"))
+            rows = conn.exec_driver_sql(f"{explain} {statement}", parameters or {}).all()
+            conn.rollback()
+        entry.explain = "\n".join(row[0] for row in rows)
+    except Exception as exc:
+        entry.explain_error = type(exc).__name__
+        logger.warning("EXPLAIN failed for %s", entry.fingerprint[:300], exc_info=True)
+    finally:
+        _explaining.active = False
+
+
+def _explain_loop() -> None:
+    while True:
+        item = _explain_queue.get()
+        if item is None:
+            return
+        _explain(*item)
+
+
+def init_slow_query_log() -> None:
+    """Хук старта: подписка на SQL и поток снятия планов (только при SLOW_QUERY_LOG_ENABLED)."""
+    global _explainer
+    if not settings.slow_query_log_enabled or _explainer is not None:
+        return
+    add_statement_observer(_on_statement)
+    _explainer = threading.Thread(target=_explain_loop, name="slow-query-explain", daemon=True)
+    _explainer.start()
+
+
+def shutdown_slow_query_log() -> None:
+    global _explainer
+    explainer, _explainer = _explainer, None
+    if explainer is None:
+        return
+    try:
+        _explain_queue.put(None, timeout=1)
+    except queue.Full:
+        return
+    explainer.join(timeout=5)
+
+
+def slow_query_report(limit: int) -> dict:
+    """Отпечатки, отсортированные по суммарному времени (сначала самые дорогие)."""
+    with _lock:
+        entries = sorted(_entries.values(), key=lambda e: e.total_seconds, reverse=True)[:limit]
+        items = [entry.as_dict() for entry in entries]
+        tracked = len(_entries)
+        dropped = _dropped_fingerprints
+    return {
+        "enabled": _explainer is not None,
+        "threshold_ms": settings.slow_query_threshold_ms,
+        "fingerprints": tracked,
+        "dropped_fingerprints": dropped,
+        "items": items,
+    }
+
+
+def clear_slow_queries() -> None:
+    global _dropped_fingerprints
+    with _lock:
+        _entries.clear()
+        _dropped_fingerprints = 0
@@ -0,0 +1,131 @@
+"""
+Общая точка подписки на выполнение SQL: один обработчик before/after_cursor_execute на все движки
+(основной, реплика, временные в бенчмарках) раздаёт время каждого запроса наблюдателям —
+трассировке, метрикам и т.п. Без наблюдателей события не регистрируются и ничего не стоят.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# (statement, parameters, executemany, duration_s, failed)
+StatementObserver = Callable[[str, Any, bool, float, bool], None]
+# "commit", "rollback", "release_savepoint" или "rollback_savepoint"
+TransactionObserver = Callable[[str], None]
+
+_statement_observers: tuple[StatementObserver, ...] = ()
+_transaction_observers: tuple[TransactionObserver, ...] = ()
+_install_lock = threading.Lock()
+_installed = False
+
+_START_KEY = "sb_query_started"
+
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_SAVEPOINT_PREFIXES = ("SAVEPOINT ", "RELEASE SAVEPOINT ", "ROLLBACK TO SAVEPOINT ")
+
+
+def normalize_statement(statement: str) -> str:
+    """Форма запроса без значений: параметры и литералы → ?, списки IN (?, ?, …) → (?…), пробелы схлопнуты.
+    Один и тот же запрос с разными параметрами даёт одну форму (для поиска N+1 и медленных запросов)."""
+    text = _PARAM_RE.sub("?", statement)
+    text = _IN_LIST_RE.sub("(?…)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def is_savepoint_statement(statement: str) -> bool:
+    """Управление вложенной транзакцией, а не запрос к данным (в тестах in-process ими обёрнута каждая сессия)."""
+    return statement.startswith(_SAVEPOINT_PREFIXES)
+
+
+def _notify_statement(statement: str, parameters: Any, executemany: bool, duration: float, failed: bool) -> None:
+    for observer in _statement_observers:
+        observer(statement, parameters, executemany, duration, failed)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ARG001
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa: ARG001
+    started = conn.info[_START_KEY].pop()
+    _notify_statement(statement, parameters, executemany, time.perf_counter() - started, False)
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    stack = conn.info.get(_START_KEY) if conn is not None else None
+    if not stack:
+        return
+    duration = time.perf_counter() - stack.pop()
+    _notify_statement(
+        exception_context.statement or "",
+        exception_context.parameters,
+        bool(exception_context.execution_context and exception_context.execution_context.executemany),
+        duration,
+        True,
+    )
+
+
+def _commit(conn) -> None:  # noqa: ARG001
+    for observer in _transaction_observers:
+        observer("commit")
+
+
+def _rollback(conn) -> None:  # noqa: ARG001
+    for observer in _transaction_observers:
+        observer("rollback")
+
+
+def _release_savepoint(conn, name, context) -> None:  # noqa: ARG001
+    for observer in _transaction_observers:
+        observer("release_savepoint")
+
+
+def _rollback_savepoint(conn, name, context) -> None:  # noqa: ARG001
+    for observer in _transaction_observers:
+        observer("rollback_savepoint")
+
+
+def _install() -> None:
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+        event.listen(Engine, "commit", _commit)
+        event.listen(Engine, "rollback", _rollback)
+        # Вложенные транзакции — отдельными исходами, не как COMMIT/ROLLBACK соединения: в миграциях
+        # каждый запрос в своём SAVEPOINT, а в тестах in-process (tests/inprocess.py) commit сессии — RELEASE
+        event.listen(Engine, "release_savepoint", _release_savepoint)
+        event.listen(Engine, "rollback_savepoint", _rollback_savepoint)
+        _installed = True
+
+
+def add_statement_observer(observer: StatementObserver) -> None:
+    """Подписать наблюдателя на каждый выполненный SQL-запрос (вызывается в потоке запроса)."""
+    global _statement_observers
+    _install()
+    if observer not in _statement_observers:
+        _statement_observers = (*_statement_observers, observer)
+
+
+def add_transaction_observer(observer: TransactionObserver) -> None:
+    """Подписать наблюдателя на COMMIT/ROLLBACK соединений.
+
+    Исход: commit, rollback, а также release_savepoint / rollback_savepoint для вложенных транзакций.
+    """
+    global _transaction_observers
+    _install()
+    if observer not in _transaction_observers:
+        _transaction_observers = (*_transaction_observers, observer)
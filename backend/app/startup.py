@@ -4,12 +4,14 @@ import random
 from collections import Counter
 from decimal import Decimal
 
-from sqlalchemy import select, text
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import case, exists, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
 
+from app.account_numbers import allocate_account_numbers
 from app.banks import BANKS_CATALOG, get_external_bank_codes
 from app.core.config import settings
-from app.db import Base, SessionLocal, engine
+from app.db import Base, engine
 from app.models import Account, AccountType, Bank, Currency, User, UserBank, UserRole, UserStatus
 
 
@@ -18,181 +20,167 @@ FULL_CLIENT_LOGIN = "fullclient"
 FULL_CLIENT_PASSWORD = "FullClient1!"
 FULL_CLIENT_PHONE = "+79991234567"
 
+# Ключ advisory lock для сидирования: при нескольких воркерах uvicorn сидирует только один,
+# остальные дожидаются окончания его транзакции и пропускают сидирование.
+SEED_ADVISORY_LOCK_KEY = 0x53484C50  # "SHLP"
+
+# Миграции: добавить колонки (is_primary, fee, rate_snapshot_id) и индексы, если их нет
+MIGRATIONS: tuple[str, ...] = (
+    "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS is_primary BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fee NUMERIC(14, 2) DEFAULT 0",
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS rate_snapshot_id VARCHAR(16)",
+    # Поиск пользователей в админке: префиксы логина/email (LIKE 'abc%'), телефон, статус и роль с keyset по id
+    "CREATE INDEX IF NOT EXISTS ix_users_login_pattern ON users (login varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_lower_pattern ON users (lower(email) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_phone ON users (phone)",
+    "CREATE INDEX IF NOT EXISTS ix_users_status_id ON users (status, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_role_id ON users (role, id)",
+)
+
 
 def init_db() -> None:
-    """Создание таблиц, применение миграций (ALTER при необходимости), сидирование банков и админа."""
-    Base.metadata.create_all(bind=engine)
-
-    # Миграции: добавить колонки, если их нет (is_primary, fee)
-    with engine.connect() as conn:
-        for stmt in (
-            "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS is_primary BOOLEAN NOT NULL DEFAULT FALSE",
-            "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fee NUMERIC(14, 2) DEFAULT 0",
-        ):
-            try:
-                conn.execute(text(stmt))
-                conn.commit()
-            except Exception:
-                conn.rollback()
-
-    _seed_banks()
-    _seed_admin()
-    _seed_full_client()
-
-
-def _seed_banks() -> None:
-    db = SessionLocal()
-    try:
-        for code, label in BANKS_CATALOG:
-            bank = db.scalar(select(Bank).where(Bank.code == code))
-            if not bank:
-                db.add(Bank(code=code, label=label))
-            else:
-                bank.label = label
-        db.commit()
-    except Exception:
-        db.rollback()
-    finally:
-        db.close()
-
-
-def _seed_admin() -> None:
-    from sqlalchemy import or_
-
-    db = SessionLocal()
-    try:
-        admin = db.scalar(
-            select(User).where(
-                or_(
-                    User.login == settings.default_admin_login,
-                    User.email == settings.default_admin_email,
-                )
-            )
+    """Создание таблиц, применение миграций (ALTER при необходимости), сидирование банков и админа.
+
+    Всё выполняется в одной транзакции под транзакционным advisory lock, поэтому воркеры не гоняются
+    друг с другом. Воркер, заставший блокировку занятой, ждёт коммита первого и ничего не повторяет.
+    Воркер, стартовавший уже после коммита, берёт свободную блокировку и выполняет шаги заново.
+    Все шаги идемпотентны (create_all, IF NOT EXISTS, upsert), так что повтор ничего не меняет.
+    """
+    with engine.begin() as conn:
+        acquired = conn.scalar(select(func.pg_try_advisory_xact_lock(SEED_ADVISORY_LOCK_KEY)))
+        if not acquired:
+            # Другой воркер уже сидирует: дожидаемся его коммита, схема и данные будут готовы
+            conn.execute(select(func.pg_advisory_xact_lock(SEED_ADVISORY_LOCK_KEY)))
+            return
+
+        Base.metadata.create_all(bind=conn)
+        _apply_migrations(conn)
+        _seed_banks(conn)
+        _seed_admin(conn)
+        _seed_full_client(conn)
+
+
+def _apply_migrations(conn: Connection) -> None:
+    for stmt in MIGRATIONS:
+        savepoint = conn.begin_nested()
+        try:
+            conn.execute(text(stmt))
+            savepoint.commit()
+        except Exception:
+            savepoint.rollback()
+
+
+def _seed_banks(conn: Connection) -> None:
+    """Справочник банков одним INSERT ... ON CONFLICT DO UPDATE (обновляет названия)."""
+    stmt = pg_insert(Bank).values([{"code": code, "label": label} for code, label in BANKS_CATALOG])
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Bank.code],
+            set_={"label": stmt.excluded.label},
+        )
+    )
+
+
+def _seed_admin(conn: Connection) -> None:
+    """Дефолтный админ одним upsert по логину.
+
+    Email проставляется, только если он не занят другим пользователем (иначе остаётся прежний / NULL).
+    """
+    users = User.__table__
+    email_taken = exists().where(
+        users.c.email == settings.default_admin_email,
+        users.c.login != settings.default_admin_login,
+    )
+    stmt = pg_insert(User).values(
+        login=settings.default_admin_login,
+        email=case((email_taken, None), else_=settings.default_admin_email),
+        password_hash=settings.default_admin_password,
+        role=UserRole.ADMIN,
+        status=UserStatus.ACTIVE,
+        failed_login_attempts=0,
+    )
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[User.login],
+            set_={
+                "role": UserRole.ADMIN,
+                "password_hash": stmt.excluded.password_hash,
+                "email": func.coalesce(stmt.excluded.email, users.c.email),
+            },
+        )
+    )
+
+
+def _seed_full_client(conn: Connection) -> None:
+    """Создать тестового клиента fullclient с полным набором счетов и балансами.
+
+    Пользователь — upsert с RETURNING id, недостающие банки и счета — по одному
+    многострочному INSERT; номера счетов выдаёт аллокатор (app.account_numbers).
+    """
+    users = User.__table__
+    stmt = pg_insert(User).values(
+        login=FULL_CLIENT_LOGIN,
+        password_hash=FULL_CLIENT_PASSWORD,
+        role=UserRole.CLIENT,
+        status=UserStatus.ACTIVE,
+        failed_login_attempts=0,
+        phone=FULL_CLIENT_PHONE,
+    )
+    user_id = conn.scalar(
+        stmt.on_conflict_do_update(
+            index_elements=[User.login],
+            set_={"phone": func.coalesce(users.c.phone, stmt.excluded.phone)},
+        ).returning(User.id)
+    )
+
+    # Случайные внешние банки для переводов (если ещё нет)
+    has_banks = conn.scalar(select(exists().where(UserBank.user_id == user_id)))
+    if not has_banks:
+        external = get_external_bank_codes()
+        n = random.randint(3, min(5, len(external)))
+        conn.execute(
+            pg_insert(UserBank)
+            .values([{"user_id": user_id, "bank_code": code} for code in random.sample(external, n)])
+            .on_conflict_do_nothing()
         )
-        if not admin:
-            admin = User(
-                login=settings.default_admin_login,
-                email=settings.default_admin_email,
-                password_hash=settings.default_admin_password,
-                role=UserRole.ADMIN,
-            )
-            db.add(admin)
-        else:
-            admin.role = UserRole.ADMIN
-            admin.login = settings.default_admin_login
-            email_conflict = db.scalar(
-                select(User).where(
-                    User.email == settings.default_admin_email,
-                    User.id != admin.id,
-                )
-            )
-            if not email_conflict:
-                admin.email = settings.default_admin_email
-            admin.password_hash = settings.default_admin_password
-            db.add(admin)
 
-        try:
-            db.commit()
-        except IntegrityError:
-            db.rollback()
-            fallback_admin = db.scalar(
-                select(User).where(
-                    or_(
-                        User.login == settings.default_admin_login,
-                        User.email == settings.default_admin_email,
-                    )
-                )
+    # Сколько уже есть по (валюта, тип)
+    existing_counts = Counter(
+        {
+            (currency, acc_type): count
+            for currency, acc_type, count in conn.execute(
+                select(Account.currency, Account.account_type, func.count())
+                .where(Account.user_id == user_id, Account.is_active.is_(True))
+                .group_by(Account.currency, Account.account_type)
             )
-            if fallback_admin:
-                fallback_admin.role = UserRole.ADMIN
-                fallback_admin.password_hash = settings.default_admin_password
-                db.add(fallback_admin)
-                db.commit()
-    finally:
-        db.close()
-
-
-def _account_number_for_currency(currency: Currency) -> str:
-    """Генерация номера счёта по валюте (префикс + случайный суффикс)."""
-    prefixes = {
-        Currency.RUB: "2202",
-        Currency.USD: "3202",
-        Currency.EUR: "4202",
-        Currency.CNY: "5202",
-    }
-    prefix = prefixes.get(currency, "9999")
-    suffix_len = 16 - len(prefix)
-    suffix = "".join(random.choices("0123456789", k=suffix_len))
-    return f"{prefix}{suffix}"
-
-
-def _seed_full_client() -> None:
-    """Создать тестового клиента fullclient с полным набором счетов и балансами."""
-    db = SessionLocal()
-    try:
-        user = db.scalar(select(User).where(User.login == FULL_CLIENT_LOGIN))
-        if not user:
-            user = User(
-                login=FULL_CLIENT_LOGIN,
-                password_hash=FULL_CLIENT_PASSWORD,
-                role=UserRole.CLIENT,
-                status=UserStatus.ACTIVE,
-                phone=FULL_CLIENT_PHONE,
+        }
+    )
+
+    # 3 RUB (2 DEBIT + 1 SAVINGS), 1 USD, 1 EUR, 1 CNY (DEBIT)
+    wanted = [
+        (Currency.RUB, AccountType.DEBIT, 2),
+        (Currency.RUB, AccountType.SAVINGS, 1),
+        (Currency.USD, AccountType.DEBIT, 1),
+        (Currency.EUR, AccountType.DEBIT, 1),
+        (Currency.CNY, AccountType.DEBIT, 1),
+    ]
+    rows = []
+    for currency, acc_type, need_count in wanted:
+        balance = Decimal("50000.00") if currency == Currency.RUB else Decimal("1000.00")
+        missing = need_count - existing_counts.get((currency, acc_type), 0)
+        for number in allocate_account_numbers(conn, currency, missing):
+            rows.append(
+                {
+                    "account_number": number,
+                    "user_id": user_id,
+                    "account_type": acc_type,
+                    "currency": currency,
+                    "balance": balance,
+                    "is_active": True,
+                    "is_primary": False,
+                }
             )
-            db.add(user)
-            db.flush()
-        elif not user.phone:
-            user.phone = FULL_CLIENT_PHONE
-            db.add(user)
-
-        # Случайные внешние банки для переводов (если ещё нет)
-        existing_banks = list(
-            db.scalars(select(UserBank).where(UserBank.user_id == user.id))
-        )
-        if not existing_banks:
-            external = get_external_bank_codes()
-            n = random.randint(3, min(5, len(external)))
-            for bank_code in random.sample(external, n):
-                db.add(UserBank(user_id=user.id, bank_code=bank_code))
-
-        existing_list = list(
-            db.scalars(
-                select(Account).where(Account.user_id == user.id, Account.is_active.is_(True))
-            ).all()
+    if rows:
+        conn.execute(
+            pg_insert(Account).values(rows).on_conflict_do_nothing(index_elements=[Account.account_number])
         )
-        # Сколько уже есть по (валюта, тип)
-        existing_counts = Counter((a.currency, a.account_type) for a in existing_list)
-
-        # 3 RUB (2 DEBIT + 1 SAVINGS), 1 USD, 1 EUR, 1 CNY (DEBIT)
-        wanted = [
-            (Currency.RUB, AccountType.DEBIT, 2),
-            (Currency.RUB, AccountType.SAVINGS, 1),
-            (Currency.USD, AccountType.DEBIT, 1),
-            (Currency.EUR, AccountType.DEBIT, 1),
-            (Currency.CNY, AccountType.DEBIT, 1),
-        ]
-        for currency, acc_type, need_count in wanted:
-            have = existing_counts.get((currency, acc_type), 0)
-            to_add = need_count - have
-            for _ in range(to_add):
-                for attempt in range(10):
-                    num = _account_number_for_currency(currency)
-                    if db.scalar(select(Account).where(Account.account_number == num)):
-                        continue
-                    balance = Decimal("50000.00") if currency == Currency.RUB else Decimal("1000.00")
-                    db.add(
-                        Account(
-                            account_number=num,
-                            user_id=user.id,
-                            account_type=acc_type,
-                            currency=currency,
-                            balance=balance,
-                        )
-                    )
-                    existing_counts[(currency, acc_type)] = existing_counts.get((currency, acc_type), 0) + 1
-                    break
-        db.commit()
-    except Exception:
-        db.rollback()
-    finally:
-        db.close()
@@ -0,0 +1,213 @@
+"""
+Кольцевой буфер учебной трассировки в общей памяти (mmap-файл), общий для всех воркеров uvicorn.
+
+Раскладка файла:
+- заголовок: магия, геометрия, базовое время (мкс эпохи), порог очистки (seq);
+- max_writers областей; каждую занимает один процесс-писатель через блокировку диапазона байт
+  (fcntl.lockf) — блокировка снимается ядром при смерти процесса, область переходит следующему;
+- в области: счётчик записей, seq записи «в работе» и capacity слотов фиксированного размера.
+
+Запись без межпроцессных блокировок: процесс пишет только в свою область. Слот защищён
+seqlock-версией (нечётная — идёт запись): читатель, увидевший нечётную или изменившуюся версию,
+слот пропускает. seq записи — микросекунды от базового времени × max_writers + номер области:
+уникален во всех процессах, растёт со временем и помещается в Number JS.
+
+Курсор (since): читатель отдаёт только записи старше «горизонта» — минимума из seq, которые
+писатели сейчас записывают, и времени начала чтения минус _PUBLISH_GRACE_US. Поэтому запись,
+опубликованная позже с меньшим seq, не проскакивает мимо курсора.
+
+Без fcntl (Windows) буфер живёт в анонимной памяти процесса — как раньше, один воркер.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("shlapabank.dev_trace")
+
+_MAGIC = b"SBTRACE1"
+SLOT_BYTES = 2048
+_PUBLISH_GRACE_US = 20_000
+
+# магия, capacity, slot_bytes, max_writers, base_us, cleared_seq
+_HEADER = struct.Struct("<8sIIIqq")
+_HEADER_SIZE = 64
+_CLEARED_OFFSET = 8 + 4 * 3 + 8
+# число записей, seq «в работе» (0 — писатель свободен)
+_REGION = struct.Struct("<qq")
+_REGION_HEADER_SIZE = 64
+# версия seqlock, seq, длина JSON
+_SLOT = struct.Struct("<qqI")
+_PAYLOAD_BYTES = SLOT_BYTES - _SLOT.size
+
+
+class TraceRing:
+    def __init__(self, capacity: int, max_writers: int, path: str | None):
+        self.capacity = capacity
+        self.max_writers = max_writers
+        self.region_size = _REGION_HEADER_SIZE + capacity * SLOT_BYTES
+        self.size = _HEADER_SIZE + max_writers * self.region_size
+        self.path = path
+        self._lock = threading.Lock()  # только потоки своего процесса; другие процессы пишут в свои области
+        self._fd: int | None = None
+        self._writer: int | None = None
+        self._writer_pid: int | None = None
+        self._last_us = 0
+        self.dropped = 0
+        if path is None or fcntl is None:
+            self.path = None
+            self._mm = mmap.mmap(-1, self.size)
+            _HEADER.pack_into(self._mm, 0, _MAGIC, capacity, SLOT_BYTES, max_writers, time.time_ns() // 1000, 0)
+        else:
+            self._mm = self._open_shared(path)
+
+    def _open_shared(self, path: str) -> mmap.mmap:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Разметку делает первый процесс; остальные ждут её на блокировке заголовка
+        fcntl.lockf(fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+        try:
+            if os.fstat(fd).st_size != self.size or os.pread(fd, len(_MAGIC), 0) != _MAGIC:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(
+                    fd,
+                    _HEADER.pack(_MAGIC, self.capacity, SLOT_BYTES, self.max_writers, time.time_ns() // 1000, 0),
+                    0,
+                )
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+        self._fd = fd
+        return mmap.mmap(fd, self.size)
+
+    def _region_offset(self, writer: int) -> int:
+        return _HEADER_SIZE + writer * self.region_size
+
+    def _claim_writer(self) -> int | None:
+        pid = os.getpid()
+        if self._writer is not None and self._writer_pid == pid:
+            return self._writer
+        self._writer = None
+        if self._fd is None:
+            self._writer, self._writer_pid = 0, pid
+            return 0
+        for writer in range(self.max_writers):
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.region_size, self._region_offset(writer))
+            except OSError:
+                continue
+            # Прежний владелец мог умереть посреди записи
+            struct.pack_into("<q", self._mm, self._region_offset(writer) + 8, 0)
+            self._writer, self._writer_pid = writer, pid
+            return writer
+        return None
+
+    @property
+    def _base_us(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[4]
+
+    def _now_seq_us(self) -> int:
+        return time.time_ns() // 1000 - self._base_us
+
+    def append(self, entry: dict[str, Any]) -> int | None:
+        """Записать запись; вернуть её seq (None — свободной области нет, запись отброшена)."""
+        with self._lock:
+            writer = self._claim_writer()
+            if writer is None:
+                self.dropped += 1
+                if self.dropped == 1:
+                    logger.warning("dev trace ring: all %d writer regions are taken", self.max_writers)
+                return None
+            us = max(self._now_seq_us(), self._last_us + 1)
+            self._last_us = us
+            seq = us * self.max_writers + writer + 1
+            payload = _encode(entry)
+            region = self._region_offset(writer)
+            count, _ = _REGION.unpack_from(self._mm, region)
+            slot = region + _REGION_HEADER_SIZE + (count % self.capacity) * SLOT_BYTES
+            version = struct.unpack_from("<q", self._mm, slot)[0]
+            struct.pack_into("<q", self._mm, region + 8, seq)  # «в работе»: горизонт читателей не пройдёт seq
+            struct.pack_into("<q", self._mm, slot, version + 1)  # нечётная версия — слот пишется
+            struct.pack_into("<qI", self._mm, slot + 8, seq, len(payload))
+            self._mm[slot + _SLOT.size: slot + _SLOT.size + len(payload)] = payload
+            struct.pack_into("<q", self._mm, slot, version + 2)
+            _REGION.pack_into(self._mm, region, count + 1, 0)
+            return seq
+
+    def _horizon(self, started_us: int) -> int:
+        horizon = (started_us - _PUBLISH_GRACE_US) * self.max_writers
+        for writer in range(self.max_writers):
+            pending = struct.unpack_from("<q", self._mm, self._region_offset(writer) + 8)[0]
+            if pending:
+                horizon = min(horizon, pending - 1)
+        return horizon
+
+    def read(self, since: int = 0) -> tuple[list[dict[str, Any]], int]:
+        """Записи с seq > since (не больше capacity самых новых) и курсор для следующего чтения."""
+        horizon = self._horizon(self._now_seq_us())
+        cleared = struct.unpack_from("<q", self._mm, _CLEARED_OFFSET)[0]
+        floor = max(since, cleared)
+        found: list[tuple[int, bytes]] = []
+        for writer in range(self.max_writers):
+            region = self._region_offset(writer)
+            count = struct.unpack_from("<q", self._mm, region)[0]
+            for index in range(max(0, count - self.capacity), count):
+                slot = region + _REGION_HEADER_SIZE + (index % self.capacity) * SLOT_BYTES
+                version, seq, length = _SLOT.unpack_from(self._mm, slot)
+                if version & 1 or seq <= floor or seq > horizon or length > _PAYLOAD_BYTES:
+                    continue
+                payload = self._mm[slot + _SLOT.size: slot + _SLOT.size + length]
+                if struct.unpack_from("<q", self._mm, slot)[0] != version:
+                    continue  # слот перезаписали во время чтения
+                found.append((seq, payload))
+        found.sort()
+        found = found[-self.capacity:]
+        entries = []
+        for seq, payload in found:
+            entry = json.loads(payload)
+            entry["seq"] = seq
+            entries.append(entry)
+        return entries, found[-1][0] if found else floor
+
+    def state(self) -> tuple[int, ...]:
+        """Счётчики записей всех областей и порог очистки — меняются при любой записи или очистке."""
+        counts = tuple(struct.unpack_from("<q", self._mm, self._region_offset(w))[0] for w in range(self.max_writers))
+        return (*counts, struct.unpack_from("<q", self._mm, _CLEARED_OFFSET)[0])
+
+    def clear(self) -> None:
+        """Скрыть все записи, записанные до этого момента (во всех процессах)."""
+        seq = (self._now_seq_us() + 1) * self.max_writers
+        struct.pack_into("<q", self._mm, _CLEARED_OFFSET, seq)
+
+
+def _encode(entry: dict[str, Any]) -> bytes:
+    payload = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(payload) <= _PAYLOAD_BYTES:
+        return payload
+    # Длинные поля (сводка ORM, строка запроса) обрезаются, чтобы запись поместилась в слот
+    trimmed = dict(entry)
+    for key in ("db", "query", "path"):
+        if isinstance(trimmed.get(key), str):
+            trimmed[key] = trimmed[key][:200] + "…"
+        payload = json.dumps(trimmed, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(payload) <= _PAYLOAD_BYTES:
+            return payload
+    return json.dumps({k: trimmed.get(k) for k in ("ts", "source", "trace_id", "method", "status")}).encode("utf-8")
+
+
+def default_ring_path(capacity: int, max_writers: int) -> str:
+    """Файл по умолчанию: во временном каталоге, геометрия в имени (смена настроек — новый файл)."""
+    return str(Path(tempfile.gettempdir()) / f"shlapabank-dev-trace-{capacity}x{max_writers}.ring")
@@ -0,0 +1,142 @@
+"""
+Поток учебной трассировки по Server-Sent Events (GET /api/v1/dev/trace/stream).
+
+Один рассыльщик (asyncio-задача) на процесс читает общий буфер (app/trace_ring.py) и раздаёт новые
+записи всем подписчикам. Буфер читается только когда в нём что-то изменилось: своя запись будит
+рассыльщика сразу, записи других воркеров замечаются по счётчикам областей раз в _POLL_SECONDS.
+Пока подписчиков нет, задача не работает.
+
+У каждого клиента своя очередь на DEV_TRACE_STREAM_QUEUE записей. Медленный клиент не тормозит
+остальных: при переполнении выбрасываются его самые старые записи, а клиент получает событие
+`dropped` с их числом. Переподключение EventSource (заголовок Last-Event-ID) продолжает с того же seq.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+from app.core.config import settings
+from app.dev_trace import add_record_listener, get_recent_entries, ring_state
+
+_POLL_SECONDS = 0.25
+# Запись видна читателям спустя небольшую задержку публикации (см. горизонт в app/trace_ring.py)
+_PUBLISH_DELAY_SECONDS = 0.03
+_HEARTBEAT_SECONDS = 15.0
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def offer(self, entry: dict[str, Any]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(entry)
+
+
+class TraceBroadcaster:
+    def __init__(self) -> None:
+        self.subscribers: set[_Subscriber] = set()
+        self.cursor = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def notify(self) -> None:
+        """Своя запись в буфере: разбудить рассыльщика (из любого потока)."""
+        loop = self._loop
+        if loop is None or self._task is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # цикл уже закрыт
+
+    def subscribe(self, since: int) -> _Subscriber:
+        """Новый подписчик; записи новее since, уже прочитанные рассыльщиком, сразу кладутся в его очередь."""
+        subscriber = _Subscriber(settings.dev_trace_stream_queue)
+        if self._task is None:
+            self.cursor = get_recent_entries(0)[1]
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(), name="dev-trace-broadcast")
+        for entry in get_recent_entries(since)[0]:
+            if entry["seq"] <= self.cursor:
+                subscriber.offer(entry)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    async def _run(self) -> None:
+        seen_state = None
+        changed_at = last_read_at = 0.0
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=_POLL_SECONDS)
+                await asyncio.sleep(_PUBLISH_DELAY_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            state = ring_state()
+            now = time.monotonic()
+            if state != seen_state:
+                seen_state, changed_at = state, now
+            elif last_read_at - changed_at > _PUBLISH_DELAY_SECONDS:
+                # Буфер не менялся, и прошлое чтение было уже после задержки публикации — читать нечего
+                continue
+            last_read_at = now
+            entries, self.cursor = get_recent_entries(self.cursor)
+            for entry in entries:
+                for subscriber in list(self.subscribers):
+                    subscriber.offer(entry)
+        self._task = None
+
+
+_broadcaster: TraceBroadcaster | None = None
+
+
+def _get_broadcaster() -> TraceBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = TraceBroadcaster()
+        add_record_listener(_broadcaster.notify)
+    return _broadcaster
+
+
+def stream_clients() -> int:
+    return len(_broadcaster.subscribers) if _broadcaster is not None else 0
+
+
+def _sse(entry: dict[str, Any]) -> str:
+    return f"id: {entry['seq']}\ndata: {json.dumps(entry, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+async def trace_events(since: int, is_disconnected) -> AsyncIterator[str]:
+    """Тело ответа text/event-stream: записи новее since, затем новые по мере появления."""
+    broadcaster = _get_broadcaster()
+    subscriber = broadcaster.subscribe(since)
+    try:
+        yield "retry: 2000\n\n"
+        while True:
+            try:
+                entry = await asyncio.wait_for(subscriber.queue.get(), timeout=_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if subscriber.dropped:
+                yield f"event: dropped\ndata: {subscriber.dropped}\n\n"
+                subscriber.dropped = 0
+            yield _sse(entry)
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,328 @@
+"""
+Трассировка для прода (TRACING_ENABLED=true): спан на HTTP-запрос и дочерние спаны SQL.
+
+В отличие от учебного журнала (app/dev_trace.py) трассы выборочные и уходят из процесса:
+- head sampling: доля TRACING_SAMPLE_RATE решается в начале запроса (или берётся флаг
+  sampled из входящего W3C traceparent);
+- tail sampling: запрос, не попавший в выборку, всё равно сохраняется, если он дольше
+  TRACING_SLOW_MS или закончился 5xx — поэтому спаны пишутся для всех запросов, но дёшево
+  (кортеж в список, не больше TRACING_MAX_SQL_SPANS на запрос);
+- SQL-спаны: время каждого запроса через app/sql_events.py, текст без параметров;
+  SELECT … FOR UPDATE помечается, его время суммируется в db.lock_wait_ms (верхняя оценка
+  ожидания блокировки строк: при конкуренции за счёт запрос почти всё время ждёт);
+- экспорт: фоновый поток пачками пишет трассы в формате OTLP/JSON (resourceSpans) —
+  строкой в файл TRACING_EXPORT_FILE и/или POST в коллектор TRACING_OTLP_ENDPOINT
+  (…/v1/traces). Очередь ограничена: при переполнении трассы отбрасываются и считаются.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.sql_events import add_statement_observer
+
+logger = logging.getLogger("shlapabank.tracing")
+
+SERVICE_NAME = "shlapabank-api"
+_EXPORT_QUEUE_SIZE = 2048
+_EXPORT_BATCH = 256
+_EXPORT_INTERVAL_SECONDS = 1.0
+_STATEMENT_MAX_CHARS = 500
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_FOR_UPDATE_RE = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?UPDATE\b", re.IGNORECASE)
+
+# Пары (unix-время, perf_counter) для перевода perf_counter в наносекунды эпохи
+_UNIX_BASE_NS = time.time_ns()
+_PERF_BASE = time.perf_counter()
+
+
+def _unix_ns(perf: float) -> int:
+    return _UNIX_BASE_NS + int((perf - _PERF_BASE) * 1e9)
+
+
+@dataclass
+class RequestTrace:
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    sampled: bool
+    started: float
+    # (начало perf_counter, длительность с, текст, FOR UPDATE, ошибка)
+    sql: list[tuple[float, float, str, bool, bool]] = field(default_factory=list)
+    sql_total: float = 0.0
+    sql_count: int = 0
+    lock_wait: float = 0.0
+
+
+_current: ContextVar[RequestTrace | None] = ContextVar("sb_request_trace", default=None)
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "kept_head": 0, "kept_tail": 0, "dropped_queue_full": 0, "exported": 0, "export_errors": 0}
+
+
+def _bump(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def current_trace_id() -> str | None:
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+def _on_statement(statement: str, parameters: Any, executemany: bool, duration: float, failed: bool) -> None:  # noqa: ARG001
+    trace = _current.get()
+    if trace is None:
+        return
+    for_update = _FOR_UPDATE_RE.search(statement) is not None
+    trace.sql_count += 1
+    trace.sql_total += duration
+    if for_update:
+        trace.lock_wait += duration
+    if len(trace.sql) < settings.tracing_max_sql_spans:
+        trace.sql.append((time.perf_counter() - duration, duration, statement, for_update, failed))
+
+
+def _parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def _attr(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_spans(trace: RequestTrace, *, method: str, route: str, target: str, status: int, ended: float) -> list[dict]:
+    root = {
+        "traceId": trace.trace_id,
+        "spanId": trace.span_id,
+        "name": f"{method} {route}",
+        "kind": 2,  # SERVER
+        "startTimeUnixNano": str(_unix_ns(trace.started)),
+        "endTimeUnixNano": str(_unix_ns(ended)),
+        "attributes": [
+            _attr("http.request.method", method),
+            _attr("http.route", route),
+            _attr("url.path", target),
+            _attr("http.response.status_code", status),
+            _attr("db.query_count", trace.sql_count),
+            _attr("db.duration_ms", round(trace.sql_total * 1000, 3)),
+            _attr("db.lock_wait_ms", round(trace.lock_wait * 1000, 3)),
+        ],
+        "status": {"code": 2 if status >= 500 else 0},
+    }
+    if trace.parent_span_id:
+        root["parentSpanId"] = trace.parent_span_id
+    if trace.sql_count > len(trace.sql):
+        root["attributes"].append(_attr("db.spans_dropped", trace.sql_count - len(trace.sql)))
+    spans = [root]
+    for started, duration, statement, for_update, failed in trace.sql:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        attributes = [
+            _attr("db.system", "postgresql"),
+            _attr("db.operation.name", operation),
+            _attr("db.query.text", statement[:_STATEMENT_MAX_CHARS]),
+        ]
+        if for_update:
+            attributes.append(_attr("db.for_update", True))
+            attributes.append(_attr("db.lock_wait_ms", round(duration * 1000, 3)))
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": secrets.token_hex(8),
+            "parentSpanId": trace.span_id,
+            "name": f"SQL {operation}",
+            "kind": 3,  # CLIENT
+            "startTimeUnixNano": str(_unix_ns(started)),
+            "endTimeUnixNano": str(_unix_ns(started + duration)),
+            "attributes": attributes,
+            "status": {"code": 2 if failed else 0},
+        })
+    return spans
+
+
+def _otlp_payload(spans: list[dict]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", SERVICE_NAME), _attr("process.pid", os.getpid())]},
+            "scopeSpans": [{"scope": {"name": "shlapabank.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class _Exporter:
+    """Фоновый поток: забирает трассы из очереди и пачками отдаёт в файл и/или коллектор."""
+
+    def __init__(self, export_file: str, endpoint: str):
+        self.export_file = export_file
+        self.endpoint = endpoint
+        self.queue: queue.Queue[list[dict] | None] = queue.Queue(maxsize=_EXPORT_QUEUE_SIZE)
+        self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.thread.start()
+
+    def submit(self, spans: list[dict]) -> None:
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            _bump("dropped_queue_full")
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: list[dict] = []
+            traces = 0
+            deadline = time.monotonic() + _EXPORT_INTERVAL_SECONDS
+            while traces < _EXPORT_BATCH:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+                traces += 1
+            if batch:
+                self._export(batch, traces)
+
+    def _export(self, spans: list[dict], traces: int) -> None:
+        payload = _otlp_payload(spans)
+        try:
+            if self.export_file:
+                with open(self.export_file, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=json.dumps(payload).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+        except Exception:
+            _bump("export_errors")
+            logger.warning("trace export failed", exc_info=True)
+            return
+        _bump("exported", traces)
+
+    def close(self) -> None:
+        try:
+            self.queue.put(None, timeout=1)
+        except queue.Full:
+            return
+        self.thread.join(timeout=5)
+
+
+_exporter: _Exporter | None = None
+
+
+def init_tracing() -> None:
+    """Хук старта: подписка на SQL и запуск экспортёра (только при TRACING_ENABLED)."""
+    global _exporter
+    if not settings.tracing_enabled or _exporter is not None:
+        return
+    if not settings.tracing_export_file and not settings.tracing_otlp_endpoint:
+        logger.warning("tracing enabled, but neither TRACING_EXPORT_FILE nor TRACING_OTLP_ENDPOINT is set")
+    add_statement_observer(_on_statement)
+    _exporter = _Exporter(settings.tracing_export_file, settings.tracing_otlp_endpoint)
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.close()
+
+
+def tracing_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["enabled"] = _exporter is not None
+    stats["sample_rate"] = settings.tracing_sample_rate
+    stats["slow_ms"] = settings.tracing_slow_ms
+    stats["queued"] = _exporter.queue.qsize() if _exporter is not None else 0
+    return stats
+
+
+class TracingMiddleware:
+    """Корневой спан запроса. Чистый ASGI — без лишних задач и копирования тела."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+        incoming = _parse_traceparent(Headers(scope=scope).get("traceparent"))
+        if incoming is not None:
+            trace_id, parent_span_id, sampled = incoming
+        else:
+            trace_id, parent_span_id = secrets.token_hex(16), None
+            sampled = random.random() < settings.tracing_sample_rate
+        trace = RequestTrace(
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent_span_id,
+            sampled=sampled,
+            started=time.perf_counter(),
+        )
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                flags = "01" if trace.sampled else "00"
+                MutableHeaders(raw=message["headers"])["traceparent"] = f"00-{trace.trace_id}-{trace.span_id}-{flags}"
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._finish(trace, scope, status)
+
+    def _finish(self, trace: RequestTrace, scope: Scope, status: int) -> None:
+        ended = time.perf_counter()
+        _bump("requests")
+        if trace.sampled:
+            _bump("kept_head")
+        elif status >= 500 or (ended - trace.started) * 1000 >= settings.tracing_slow_ms:
+            _bump("kept_tail")
+        else:
+            return
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        exporter = _exporter
+        if exporter is not None:
+            exporter.submit(
+                _otlp_spans(trace, method=scope["method"], route=route, target=scope["path"], status=status, ended=ended)
+            )
@@ -0,0 +1,151 @@
+"""
+Статика UI с отпечатками содержимого (включается UI_FINGERPRINT_ASSETS=true, по умолчанию включено).
+
+При старте каждый файл ui-mockup (кроме HTML) получает имя с хешем содержимого
+(dashboard.js → dashboard.3f2a9c1b0d.js) и заранее сжатые варианты gzip/brotli. Ссылки
+/ui/<файл> в index.html и dashboard.html переписываются на /ui/assets/<имя с хешем>, такие
+файлы отдаются с Cache-Control immutable на год: новый файл — новое имя. Сами HTML-страницы
+по-прежнему no-cache, поэтому после деплоя браузер сразу получает ссылки на новые файлы.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.compression import accepts_encoding
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаются только gzip и исходный файл
+    brotli = None
+
+logger = logging.getLogger("shlapabank.ui_assets")
+
+ASSET_URL_PREFIX = "/ui/assets/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+HTML_PAGES = ("index.html", "dashboard.html")
+
+# Сжимать имеет смысл только текст; woff2 и png уже сжаты
+_COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".txt"}
+# /ui/<путь> с необязательным ?v=… / ?_=… (старые способы сбросить кеш)
+_UI_REF = re.compile(r"/ui/([A-Za-z0-9_\-./]+)(\?[^\"'\s)]*)?")
+
+
+@dataclass(frozen=True)
+class UiAsset:
+    hashed_name: str
+    media_type: str
+    digest: str
+    identity: bytes
+    gzip: bytes | None
+    br: bytes | None
+
+
+@dataclass(frozen=True)
+class UiAssetManifest:
+    # исходное имя относительно ui-mockup → ассет
+    by_source: dict[str, UiAsset]
+    # имя с хешем → ассет
+    by_hashed: dict[str, UiAsset]
+    # переписанные HTML-страницы
+    pages: dict[str, bytes]
+
+
+def _hashed_name(relative: str, digest: str) -> str:
+    path = Path(relative)
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _build_asset(relative: str, data: bytes) -> UiAsset:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    suffix = Path(relative).suffix
+    compress = suffix in _COMPRESSIBLE_SUFFIXES
+    return UiAsset(
+        hashed_name=_hashed_name(relative, digest),
+        media_type=mimetypes.guess_type(relative)[0] or "application/octet-stream",
+        digest=digest,
+        identity=data,
+        # mtime=0 — одинаковые байты при каждой сборке
+        gzip=gzip.compress(data, compresslevel=9, mtime=0) if compress else None,
+        br=brotli.compress(data, quality=11) if compress and brotli is not None else None,
+    )
+
+
+def rewrite_html(html: str, by_source: dict[str, UiAsset]) -> str:
+    """Ссылки на известные файлы → /ui/assets/<имя с хешем> (query-строка отбрасывается)."""
+
+    def replace(match: re.Match) -> str:
+        asset = by_source.get(match.group(1))
+        if asset is None:
+            return match.group(0)
+        return ASSET_URL_PREFIX + asset.hashed_name
+
+    return _UI_REF.sub(replace, html)
+
+
+def build_manifest(ui_dir: Path) -> UiAssetManifest:
+    by_source: dict[str, UiAsset] = {}
+    for path in sorted(ui_dir.rglob("*")):
+        if not path.is_file() or path.suffix == ".html":
+            continue
+        relative = path.relative_to(ui_dir).as_posix()
+        by_source[relative] = _build_asset(relative, path.read_bytes())
+    pages = {}
+    for name in HTML_PAGES:
+        page = ui_dir / name
+        if page.exists():
+            pages[name] = rewrite_html(page.read_text(encoding="utf-8"), by_source).encode("utf-8")
+    logger.info(
+        "ui assets fingerprinted: %d files, %d pages (brotli %s)",
+        len(by_source),
+        len(pages),
+        "on" if brotli is not None else "off",
+    )
+    return UiAssetManifest(
+        by_source=by_source,
+        by_hashed={asset.hashed_name: asset for asset in by_source.values()},
+        pages=pages,
+    )
+
+
+_manifest: UiAssetManifest | None = None
+
+
+def init_ui_assets(ui_dir: Path) -> None:
+    """Хук старта: посчитать отпечатки и переписать HTML."""
+    global _manifest
+    _manifest = build_manifest(ui_dir) if ui_dir.exists() else None
+
+
+def ui_page(name: str) -> bytes | None:
+    """Переписанная HTML-страница или None (отпечатки выключены или страницы нет)."""
+    if _manifest is None:
+        return None
+    return _manifest.pages.get(name)
+
+
+def asset_response(request: Request, hashed_name: str) -> Response:
+    asset = _manifest.by_hashed.get(hashed_name) if _manifest is not None else None
+    if asset is None:
+        return Response(status_code=404)
+    accept_encoding = request.headers.get("accept-encoding", "")
+    body, coding = asset.identity, None
+    if asset.br is not None and accepts_encoding(accept_encoding, "br"):
+        body, coding = asset.br, "br"
+    elif asset.gzip is not None and accepts_encoding(accept_encoding, "gzip"):
+        body, coding = asset.gzip, "gzip"
+    # У каждого варианта сжатия свой сильный ETag
+    etag = f'"{asset.digest}-{coding}"' if coding else f'"{asset.digest}"'
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag, "Vary": "Accept-Encoding"}
+    if coding:
+        headers["Content-Encoding"] = coding
+    if etag in (tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1 @@
+"""Бенчмарки и нагрузочные сценарии (запуск из каталога backend: python -m bench.<модуль>)."""
@@ -0,0 +1,350 @@
+"""
+Нагрузочный набор для API: реалистичные смеси запросов, перебор параллельности, сравнение с базовой линией.
+
+1. Сервер: без --base-url поднимается uvicorn (--workers) на свободном порту с фиксированным
+   OPERATION_OTP_CODE, чтобы операции не тратили запрос на /helper/otp/preview.
+2. Данные: пулом вставок Core (insert … executemany) создаются --users пользователей с телефоном,
+   RUB-счётом и --history операциями каждому; после прогона удаляются (--keep — оставить).
+3. Смеси (--mix): browse — вход, счета, история; mixed — добавлены переводы по счёту и телефону,
+   оплата связи; write — только денежные операции. Пользователь каждой операции выбирается случайно.
+4. Для каждой параллельности из --concurrency прогон длится --duration секунд; печатаются rps,
+   p50/p95/p99, ошибки и среднее число SQL-запросов (заголовок X-DB-Query-Count, если сервер его отдаёт).
+5. --save-baseline сохраняет результаты в JSON, --baseline сравнивает с ним: рост p95 или падение
+   rps больше --tolerance считается регрессией (код выхода 1).
+
+Только PostgreSQL: блокировки строк (FOR UPDATE), последовательности номеров счетов и enum-типы
+в SQLite не воспроизводятся, поэтому «подмены» SQLite нет.
+
+    python -m bench.bench_api --users 200 --mix mixed --concurrency 1 4 16 --duration 10
+    python -m bench.bench_api --base-url http://localhost:8000/api/v1 --otp "" --mix browse --save-baseline base.json
+    python -m bench.bench_api --mix mixed --baseline base.json --tolerance 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from app.account_numbers import allocate_account_numbers
+from app.db import engine
+from app.models import Account, AccountType, Currency, Transaction, TransactionStatus, TransactionType, User
+from bench.bench_login import _percentile
+from bench.bench_startup import _wait_healthy
+
+PASSWORD = "BenchPass123!"
+BENCH_OTP = "0000"
+INITIAL_BALANCE = Decimal("1000000.00")
+
+MIXES: dict[str, dict[str, int]] = {
+    "browse": {"login": 15, "accounts": 50, "history": 35},
+    "mixed": {
+        "login": 10,
+        "accounts": 30,
+        "history": 20,
+        "transfer_account": 15,
+        "transfer_phone": 10,
+        "payment_mobile": 15,
+    },
+    "write": {"transfer_account": 40, "transfer_phone": 30, "payment_mobile": 30},
+}
+
+
+# --- Данные ---
+
+def seed_users(prefix: str, count: int, history: int) -> list[dict]:
+    """count пользователей (логин prefix+номер, телефон, RUB-счёт) и history операций на каждого."""
+    phone_base = 9_000_000_000 + (int(prefix[-4:]) % 1000) * 1_000_000
+    with engine.begin() as conn:
+        user_ids = conn.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {"login": f"{prefix}{i:06d}", "password_hash": PASSWORD, "phone": f"+7{phone_base + i}"}
+                for i in range(count)
+            ],
+        ).all()
+        numbers = allocate_account_numbers(conn, Currency.RUB, count)
+        account_ids = conn.scalars(
+            insert(Account).returning(Account.id, sort_by_parameter_order=True),
+            [
+                {
+                    "account_number": number,
+                    "user_id": user_id,
+                    "account_type": AccountType.DEBIT,
+                    "currency": Currency.RUB,
+                    "balance": INITIAL_BALANCE,
+                    "is_primary": True,
+                }
+                for user_id, number in zip(user_ids, numbers)
+            ],
+        ).all()
+        start = datetime.utcnow() - timedelta(days=30)
+        rows = [
+            {
+                "type": TransactionType.TOPUP,
+                "amount": Decimal(100 + k),
+                "fee": Decimal("0.00"),
+                "currency": Currency.RUB,
+                "status": TransactionStatus.COMPLETED,
+                "initiated_by": user_id,
+                "from_account_id": None,
+                "to_account_id": account_id,
+                "description": "topup",
+                "created_at": start + timedelta(minutes=k),
+            }
+            for user_id, account_id in zip(user_ids, account_ids)
+            for k in range(history)
+        ]
+        if rows:
+            conn.execute(insert(Transaction), rows)
+    return [
+        {"user_id": u, "login": f"{prefix}{i:06d}", "account_id": a, "account_number": n, "phone": f"+7{phone_base + i}"}
+        for i, (u, a, n) in enumerate(zip(user_ids, account_ids, numbers))
+    ]
+
+
+def drop_users(prefix: str) -> None:
+    """Удалить пользователей с логином «prefix + цифры», их счета и операции."""
+    generated = User.login.regexp_match(f"^{prefix}[0-9]+$")
+    with engine.begin() as conn:
+        user_ids = select(User.id).where(generated).scalar_subquery()
+        account_ids = select(Account.id).where(Account.user_id.in_(user_ids)).scalar_subquery()
+        # Три DELETE вместо одного с OR: каждый идёт по своему индексу (на миллионах строк — в разы быстрее)
+        conn.execute(delete(Transaction).where(Transaction.initiated_by.in_(user_ids)))
+        conn.execute(delete(Transaction).where(Transaction.from_account_id.in_(account_ids)))
+        conn.execute(delete(Transaction).where(Transaction.to_account_id.in_(account_ids)))
+        conn.execute(delete(Account).where(Account.user_id.in_(user_ids)))
+        conn.execute(delete(User).where(generated))
+
+
+# --- Сервер ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {**os.environ, "OPERATION_OTP_CODE": BENCH_OTP, "REGISTER_RATE_LIMIT_PER_MINUTE": "0"}
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env)
+    if not _wait_healthy(f"http://127.0.0.1:{port}/health", 60):
+        proc.kill()
+        raise SystemExit("server did not become healthy in time")
+    return proc, f"http://127.0.0.1:{port}/api/v1"
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# --- Операции ---
+
+class Session:
+    """Клиент одного потока: свои соединения и кеш токенов пользователей."""
+
+    def __init__(self, base_url: str, users: list[dict], otp: str, seed: int):
+        self.client = httpx.Client(base_url=base_url, timeout=30.0)
+        self.users = users
+        self.otp = otp
+        self.rnd = random.Random(seed)
+        self.tokens: dict[str, str] = {}
+
+    def _login(self, user: dict) -> httpx.Response:
+        r = self.client.post("/auth/login", json={"login": user["login"], "password": PASSWORD})
+        if r.status_code == 200:
+            self.tokens[user["login"]] = r.json()["access_token"]
+        return r
+
+    def _auth(self, user: dict) -> dict:
+        if user["login"] not in self.tokens:
+            self._login(user)
+        return {"Authorization": f"Bearer {self.tokens.get(user['login'], '')}"}
+
+    def _otp(self, headers: dict) -> str:
+        if self.otp:
+            return self.otp
+        return self.client.get("/helper/otp/preview", headers=headers).json().get("otp", "")
+
+    def run(self, op: str) -> httpx.Response:
+        user = self.rnd.choice(self.users)
+        if op == "login":
+            return self._login(user)
+        headers = self._auth(user)
+        if op == "accounts":
+            return self.client.get("/accounts", headers=headers)
+        if op == "history":
+            return self.client.get("/transactions", headers=headers)
+        other = self.rnd.choice(self.users)
+        while other is user and len(self.users) > 1:
+            other = self.rnd.choice(self.users)
+        otp = self._otp(headers)
+        if op == "transfer_account":
+            body = {"from_account_id": user["account_id"], "target_account_number": other["account_number"],
+                    "amount": "10.00", "otp_code": otp}
+            return self.client.post("/transfers/by-account", headers=headers, json=body)
+        if op == "transfer_phone":
+            body = {"from_account_id": user["account_id"], "phone": other["phone"], "amount": "10.00",
+                    "recipient_bank_id": "shlapabank", "otp_code": otp}
+            return self.client.post("/transfers/by-phone", headers=headers, json=body)
+        if op == "payment_mobile":
+            body = {"account_id": user["account_id"], "operator": "MTSha", "phone": other["phone"],
+                    "amount": "100.00", "otp_code": otp}
+            return self.client.post("/payments/mobile", headers=headers, json=body)
+        raise ValueError(op)
+
+
+def run_level(base_url: str, users: list[dict], otp: str, mix: dict[str, int], concurrency: int, duration: float) -> dict:
+    """Прогон одной смеси при заданной параллельности: метрики по операциям."""
+    ops, weights = zip(*mix.items())
+    samples: dict[str, list[tuple[float, int, int | None]]] = {op: [] for op in ops}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(n: int) -> None:
+        session = Session(base_url, users, otp, seed=n)
+        local: dict[str, list] = {op: [] for op in ops}
+        try:
+            while time.perf_counter() < deadline:
+                op = session.rnd.choices(ops, weights)[0]
+                t0 = time.perf_counter()
+                r = session.run(op)
+                elapsed = time.perf_counter() - t0
+                queries = r.headers.get("x-db-query-count")
+                local[op].append((elapsed, r.status_code, int(queries) if queries is not None else None))
+        finally:
+            session.client.close()
+            with lock:
+                for op, values in local.items():
+                    samples[op].extend(values)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    result = {}
+    for op, values in samples.items():
+        if not values:
+            continue
+        latencies = [v[0] * 1000 for v in values]
+        queries = [v[2] for v in values if v[2] is not None]
+        result[op] = {
+            "count": len(values),
+            "rps": len(values) / elapsed,
+            "p50_ms": _percentile(latencies, 0.50),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+            "errors": sum(1 for v in values if v[1] >= 400),
+            "queries": sum(queries) / len(queries) if queries else None,
+        }
+    total = sum(r["count"] for r in result.values())
+    result["_total"] = {"count": total, "rps": total / elapsed}
+    return result
+
+
+def print_level(mix_name: str, concurrency: int, result: dict) -> None:
+    total = result["_total"]
+    print(f"{mix_name} × {concurrency}: {total['count']} запросов · {total['rps']:.0f} req/s")
+    for op, r in result.items():
+        if op == "_total":
+            continue
+        queries = f"{r['queries']:.1f}" if r["queries"] is not None else "—"
+        print(
+            f"  {op:<17} {r['count']:6d} · {r['rps']:7.1f} req/s · p50 {r['p50_ms']:7.1f} · p95 {r['p95_ms']:7.1f} · "
+            f"p99 {r['p99_ms']:7.1f} ms · ошибок {r['errors']:4d} · SQL {queries}"
+        )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """Регрессии относительно базовой линии: p95 выше или rps ниже больше чем на tolerance."""
+    regressions = 0
+    print(f"сравнение с базовой линией (допуск {tolerance:.0%})")
+    for level, ops in results.items():
+        base_ops = baseline.get("results", {}).get(level)
+        if not base_ops:
+            continue
+        for op, r in ops.items():
+            base = base_ops.get(op)
+            if op == "_total" or not base:
+                continue
+            p95 = r["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+            rps = r["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+            bad = p95 > tolerance or rps < -tolerance
+            regressions += bad
+            print(f"  {'РЕГРЕССИЯ' if bad else 'ок':<9} {level:<12} {op:<17} p95 {p95:+7.1%} · rps {rps:+7.1%}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="", help="Готовый сервер (иначе поднимается свой uvicorn)")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn у своего сервера")
+    parser.add_argument("--otp", default=None, help="Фиксированный OTP сервера; пусто — брать из /helper/otp/preview")
+    parser.add_argument("--users", type=int, default=200, help="Сколько пользователей создать")
+    parser.add_argument("--history", type=int, default=20, help="Операций в истории каждого пользователя")
+    parser.add_argument("--mix", choices=sorted(MIXES), nargs="+", default=["mixed"], help="Смеси запросов")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Уровни параллельности")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность одного уровня (с)")
+    parser.add_argument("--save-baseline", default="", help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", default="", help="Сравнить с сохранённой базовой линией")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение p95/rps (доля)")
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданных пользователей")
+    args = parser.parse_args(argv)
+
+    prefix = f"ba{os.getpid() % 10000:04d}"
+    t0 = time.perf_counter()
+    users = seed_users(prefix, args.users, args.history)
+    print(f"данные: {len(users)} пользователей, {len(users) * args.history} операций за {time.perf_counter() - t0:.1f} с")
+    proc = None
+    if args.base_url:
+        base_url, otp = args.base_url.rstrip("/"), args.otp if args.otp is not None else ""
+    else:
+        proc, base_url = start_server(args.workers)
+        otp = args.otp if args.otp is not None else BENCH_OTP
+    results: dict[str, dict] = {}
+    try:
+        for mix_name in args.mix:
+            for concurrency in args.concurrency:
+                result = run_level(base_url, users, otp, MIXES[mix_name], concurrency, args.duration)
+                results[f"{mix_name}×{concurrency}"] = result
+                print_level(mix_name, concurrency, result)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if not args.keep:
+            drop_users(prefix)
+
+    if args.save_baseline:
+        meta = {"users": args.users, "history": args.history, "duration": args.duration, "workers": args.workers,
+                "created_at": datetime.utcnow().isoformat(timespec="seconds")}
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump({"meta": meta, "results": results}, fh, ensure_ascii=False, indent=2)
+        print(f"базовая линия сохранена в {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Бенчмарк сжатия ответов (app/compression.py) на большой истории операций.
+
+Во временной БД-записи создаётся пользователь со счётом и N операциями (как в bench_serialization),
+GET /api/v1/transactions вызывается через TestClient с разными Accept-Encoding. Для каждой
+кодировки и уровня печатаются байты «на проводе», доля от исходного тела, CPU на сжатие одного
+ответа и задержка всего запроса; распакованное тело обязано совпасть с несжатым.
+
+Запуск (из каталога backend, нужна доступная БД из DATABASE_URL):
+
+    python -m bench.bench_compression --rows 10000 --runs 10 --levels 1 5 9
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app.compression import available_encodings, compress_bytes
+from app.main import app
+from app.security import create_access_token
+from bench.bench_serialization import _fmt, _timed, drop_history, seed_history
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _decompress(coding: str, data: bytes) -> bytes:
+    if coding == "gzip":
+        return gzip.decompress(data)
+    if coding == "br":
+        return brotli.decompress(data)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def _cpu_ms(fn, runs: int) -> float:
+    """Медиана процессорного времени одного вызова (мс)."""
+    samples = []
+    for _ in range(runs):
+        t0 = time.process_time()
+        fn()
+        samples.append((time.process_time() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def bench_codecs(raw: bytes, levels: list[int], runs: int) -> None:
+    """Чистое сжатие готового тела: размер и CPU по кодировкам и уровням."""
+    print(f"сжатие тела {len(raw) / 1024:.0f} КиБ, медиана CPU из {runs} замеров")
+    for coding in available_encodings():
+        for level in levels:
+            compressed = compress_bytes(coding, raw, level)
+            if _decompress(coding, compressed) != raw:
+                raise SystemExit(f"{coding} level {level}: decompressed body differs")
+            cpu = _cpu_ms(lambda: compress_bytes(coding, raw, level), runs)
+            print(
+                f"  {coding:>4} уровень {level}: {len(compressed) / 1024:8.1f} КиБ "
+                f"({len(compressed) / len(raw):6.1%}) · CPU {cpu:7.2f} ms"
+            )
+
+
+def bench_http(n: int, runs: int, levels: list[int]) -> None:
+    user_id, account_id = seed_history(n)
+    try:
+        client = TestClient(app)
+        auth = {"Authorization": f"Bearer {create_access_token(str(user_id))}"}
+
+        def get(coding: str):
+            r = client.get("/api/v1/transactions", headers={**auth, "Accept-Encoding": coding})
+            assert r.status_code == 200, r.text
+            return r
+
+        plain = get("identity")
+        raw = plain.content
+        bench_codecs(raw, levels, runs)
+        print(f"GET /transactions, {n} операций, {runs} замеров (уровень из COMPRESSION_LEVEL)")
+        for coding in ("identity", *available_encodings()):
+            r = get(coding)
+            # TestClient распаковывает сам; размер на проводе — сколько байт пришло до распаковки
+            wire = r.num_bytes_downloaded
+            if r.content != raw:
+                raise SystemExit(f"{coding}: response body differs from uncompressed")
+            print(f"  {coding:>8}: {wire / 1024:8.1f} КиБ · {_fmt(_timed(lambda: get(coding), runs))}")
+    finally:
+        drop_history(user_id, account_id)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Число операций в истории")
+    parser.add_argument("--runs", type=int, default=10, help="Сколько раз повторить замер")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 9], help="Уровни сжатия для сравнения")
+    args = parser.parse_args(argv)
+    bench_http(args.rows, args.runs, args.levels)
+
+
+if __name__ == "__main__":
+    main()
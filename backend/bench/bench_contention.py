@@ -0,0 +1,270 @@
+"""
+Конкуренция за счета: K параллельных клиентов переводят деньги между M «горячими» счетами.
+
+Проверяются пути с SELECT … FOR UPDATE: перевод между своими счетами (POST /transfers),
+по номеру счёта (/transfers/by-account) и по телефону в наш банк (/transfers/by-phone).
+У каждого из M пользователей два RUB-счёта; направление и сумма каждого перевода случайны,
+поэтому встречные переводы A→B и B→A идут одновременно.
+
+Во время прогона раз в --sample-ms опрашивается pg_stat_activity: сколько соединений БД стоят
+в ожидании блокировки (wait_event_type = 'Lock'). Отсюда оценка суммарного и среднего ожидания.
+До и после прогона снимается pg_stat_database: commit/rollback (доля прерванных транзакций)
+и deadlocks.
+
+В конце проверяется:
+- сумма балансов горячих счетов не изменилась (все переводы внутренние, без комиссии);
+- баланс каждого счёта = начальный + входящие − исходящие операции (ничего не потеряно);
+- deadlock-ов в БД не было, ответов 5xx нет.
+Любое нарушение — код выхода 1.
+
+    python -m bench.bench_contention --clients 32 --accounts 4 --duration 15 --op mixed
+    python -m bench.bench_contention --clients 16 --accounts 1 --op own
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import httpx
+from sqlalchemy import func, insert, select, text
+
+from app.account_numbers import allocate_account_numbers
+from app.db import engine
+from app.models import Account, AccountType, Currency, Transaction
+from bench.bench_api import BENCH_OTP, INITIAL_BALANCE, PASSWORD, drop_users, seed_users, start_server, stop_server
+from bench.bench_login import _percentile
+
+OPS = ("own", "account", "phone")
+
+_LOCK_WAITERS_SQL = text(
+    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+)
+_DB_STATS_SQL = text(
+    "SELECT xact_commit, xact_rollback, deadlocks FROM pg_stat_database WHERE datname = current_database()"
+)
+
+
+def seed_hot_accounts(prefix: str, count: int) -> list[dict]:
+    """count пользователей с двумя RUB-счетами каждый (второй — для переводов между своими)."""
+    users = seed_users(prefix, count, history=0)
+    with engine.begin() as conn:
+        numbers = allocate_account_numbers(conn, Currency.RUB, count)
+        second = conn.scalars(
+            insert(Account).returning(Account.id, sort_by_parameter_order=True),
+            [
+                {
+                    "account_number": number,
+                    "user_id": user["user_id"],
+                    "account_type": AccountType.DEBIT,
+                    "currency": Currency.RUB,
+                    "balance": INITIAL_BALANCE,
+                }
+                for user, number in zip(users, numbers)
+            ],
+        ).all()
+    for user, account_id in zip(users, second):
+        user["second_account_id"] = account_id
+    return users
+
+
+def _balances(account_ids: list[int]) -> dict[int, Decimal]:
+    with engine.connect() as conn:
+        return dict(conn.execute(select(Account.id, Account.balance).where(Account.id.in_(account_ids))).all())
+
+
+def _ledger(account_ids: list[int]) -> dict[int, Decimal]:
+    """Сальдо операций по счетам: входящие − исходящие (с комиссией)."""
+    delta = {account_id: Decimal("0") for account_id in account_ids}
+    with engine.connect() as conn:
+        incoming = conn.execute(
+            select(Transaction.to_account_id, func.sum(Transaction.amount))
+            .where(Transaction.to_account_id.in_(account_ids))
+            .group_by(Transaction.to_account_id)
+        ).all()
+        outgoing = conn.execute(
+            select(Transaction.from_account_id, func.sum(Transaction.amount + func.coalesce(Transaction.fee, 0)))
+            .where(Transaction.from_account_id.in_(account_ids))
+            .group_by(Transaction.from_account_id)
+        ).all()
+    for account_id, amount in incoming:
+        delta[account_id] += amount
+    for account_id, amount in outgoing:
+        delta[account_id] -= amount
+    return delta
+
+
+def _db_stats() -> tuple[int, int, int]:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        return tuple(conn.execute(_DB_STATS_SQL).one())
+
+
+class LockSampler(threading.Thread):
+    """Фоновый опрос pg_stat_activity: сколько соединений ждут блокировку в каждый момент."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="lock-sampler", daemon=True)
+        self.interval = interval
+        self.stop = threading.Event()
+        self.samples: list[int] = []
+
+    def run(self) -> None:
+        # autocommit: сам опрос не добавляет rollback в pg_stat_database
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            while not self.stop.is_set():
+                self.samples.append(conn.scalar(_LOCK_WAITERS_SQL))
+                self.stop.wait(self.interval)
+
+
+def _detail(response: httpx.Response) -> str:
+    if response.status_code < 400:
+        return ""
+    try:
+        return str(response.json().get("detail", ""))
+    except ValueError:
+        return response.text[:60]
+
+
+def run_clients(base_url: str, users: list[dict], otp: str, ops: tuple[str, ...], clients: int, duration: float) -> list:
+    deadline = time.perf_counter() + duration
+
+    def worker(n: int) -> list[tuple[str, int, str, float]]:
+        rnd = random.Random(n)
+        results = []
+        with httpx.Client(base_url=base_url, timeout=60.0) as client:
+            tokens = {}
+            while time.perf_counter() < deadline:
+                user = rnd.choice(users)
+                if user["login"] not in tokens:
+                    r = client.post("/auth/login", json={"login": user["login"], "password": PASSWORD})
+                    tokens[user["login"]] = r.json()["access_token"]
+                headers = {"Authorization": f"Bearer {tokens[user['login']]}"}
+                op = rnd.choice(ops)
+                amount = f"{rnd.randint(10, 100)}.00"
+                other = rnd.choice([u for u in users if u is not user] or users)
+                if op == "own":
+                    a, b = user["account_id"], user["second_account_id"]
+                    if rnd.random() < 0.5:
+                        a, b = b, a
+                    path, body = "/transfers", {"from_account_id": a, "to_account_id": b, "amount": amount}
+                elif op == "account":
+                    path = "/transfers/by-account"
+                    body = {"from_account_id": user["account_id"], "target_account_number": other["account_number"],
+                            "amount": amount, "otp_code": otp}
+                else:
+                    path = "/transfers/by-phone"
+                    body = {"from_account_id": user["account_id"], "phone": other["phone"], "amount": amount,
+                            "recipient_bank_id": "shlapabank", "otp_code": otp}
+                t0 = time.perf_counter()
+                try:
+                    r = client.post(path, headers=headers, json=body)
+                except httpx.TransportError as exc:
+                    # Сервер оборвал соединение — считается как ответ 5xx
+                    results.append((op, 599, type(exc).__name__, time.perf_counter() - t0))
+                    continue
+                results.append((op, r.status_code, _detail(r), time.perf_counter() - t0))
+        return results
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return [item for chunk in pool.map(worker, range(clients)) for item in chunk]
+
+
+def _run(args: argparse.Namespace, users: list[dict], ops: tuple[str, ...]) -> list[str]:
+    account_ids = [u["account_id"] for u in users] + [u["second_account_id"] for u in users]
+    proc = None
+    if args.base_url:
+        base_url = args.base_url.rstrip("/")
+    else:
+        proc, base_url = start_server(args.workers)
+    otp = args.otp or BENCH_OTP
+    try:
+        before = _balances(account_ids)
+        stats_before = _db_stats()
+        sampler = LockSampler(args.sample_ms / 1000)
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            results = run_clients(base_url, users, otp, ops, args.clients, args.duration)
+        finally:
+            sampler.stop.set()
+            sampler.join()
+        elapsed = time.perf_counter() - t0
+        time.sleep(1.0)  # статистика pg_stat_database сбрасывается процессами с задержкой
+        stats_after = _db_stats()
+        after = _balances(account_ids)
+        ledger = _ledger(account_ids)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    print(f"{args.clients} клиентов × {len(users)} горячих пользователей ({len(account_ids)} счетов), "
+          f"операции {', '.join(ops)}, {elapsed:.1f} с")
+    latencies = [r[3] * 1000 for r in results]
+    ok = sum(1 for r in results if r[1] < 400)
+    print(f"  запросов {len(results)} · успешных {ok} · {ok / elapsed:.0f} переводов/с · "
+          f"p50 {_percentile(latencies, 0.5):.1f} · p95 {_percentile(latencies, 0.95):.1f} · "
+          f"p99 {_percentile(latencies, 0.99):.1f} ms")
+    outcomes: dict[tuple[str, int, str], int] = {}
+    for op, status, detail, _ in results:
+        outcomes[(op, status, detail)] = outcomes.get((op, status, detail), 0) + 1
+    for (op, status, detail), n in sorted(outcomes.items()):
+        print(f"    {op:<8} {status} {detail}: {n}")
+
+    waiting = sum(sampler.samples) * sampler.interval
+    print(f"  ожидание блокировок: ~{waiting:.2f} с суммарно (~{waiting / max(1, len(results)) * 1000:.1f} мс на запрос), "
+          f"максимум {max(sampler.samples, default=0)} ждущих одновременно, {len(sampler.samples)} замеров")
+    commits, rollbacks, deadlocks = (a - b for a, b in zip(stats_after, stats_before))
+    # rollback включает и откат читающих сессий при возврате соединения в пул — это фон, не ошибки
+    print(f"  транзакции БД: commit {commits} · rollback {rollbacks} "
+          f"({rollbacks / max(1, commits + rollbacks):.1%}) · deadlocks {deadlocks}")
+    aborted = sum(1 for r in results if r[1] >= 400)
+    print(f"  прервано переводов: {aborted} из {len(results)} ({aborted / max(1, len(results)):.1%})")
+
+    failures = []
+    total_before, total_after = sum(before.values()), sum(after.values())
+    if total_before != total_after:
+        failures.append(f"сумма балансов изменилась: {total_before} → {total_after}")
+    drift = [i for i in account_ids if before[i] + ledger[i] != after[i]]
+    if drift:
+        failures.append(f"баланс не сходится с операциями у {len(drift)} счетов")
+    if deadlocks:
+        failures.append(f"deadlock-ов в БД: {deadlocks}")
+    server_errors = sum(1 for r in results if r[1] >= 500)
+    if server_errors:
+        failures.append(f"ответов 5xx: {server_errors}")
+    for failure in failures:
+        print(f"  ОШИБКА: {failure}")
+    if not failures:
+        print(f"  сумма балансов сохранена ({total_after}), операции сходятся с балансами, deadlock-ов нет")
+    return failures
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="", help="Готовый сервер (иначе поднимается свой uvicorn)")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеров uvicorn у своего сервера")
+    parser.add_argument("--otp", default=None, help="Фиксированный OTP сервера (для --base-url нужен OPERATION_OTP_CODE)")
+    parser.add_argument("--clients", type=int, default=16, help="K — параллельных клиентов")
+    parser.add_argument("--accounts", type=int, default=4, help="M — горячих пользователей (по два счёта)")
+    parser.add_argument("--op", choices=(*OPS, "mixed"), default="mixed", help="Какие переводы выполнять")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность прогона (с)")
+    parser.add_argument("--sample-ms", type=float, default=5.0, help="Период опроса ожиданий блокировок (мс)")
+    args = parser.parse_args(argv)
+
+    ops = OPS if args.op == "mixed" else (args.op,)
+    prefix = f"bc{os.getpid() % 10000:04d}"
+    users = seed_hot_accounts(prefix, max(2, args.accounts))
+    try:
+        failures = _run(args, users, ops)
+    finally:
+        drop_users(prefix)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Нагрузочный тест входа («шторм логинов») против поднятого сервера: пул пользователей,
+смесь верных и неверных паролей в несколько потоков; rps, задержки и проверка, что
+счётчик неудачных попыток не теряет инкременты при гонке (ровно FAILED_LOGIN_THRESHOLD
+неудач блокируют пользователя, на одну меньше — нет).
+
+    python -m bench.bench_login --base-url http://localhost:8000/api/v1 --users 50 --requests 5000 --concurrency 16
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app.constants import FAILED_LOGIN_THRESHOLD
+
+PASSWORD = "BenchPass123!"
+WRONG_PASSWORD = "WrongPass123!"
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _register_users(base_url: str, prefix: str, count: int) -> list[str]:
+    logins = [f"{prefix}{i:05d}" for i in range(count)]
+    with httpx.Client(base_url=base_url, timeout=30.0) as c:
+        for login in logins:
+            r = c.post("/auth/register", json={"login": login, "password": PASSWORD})
+            if r.status_code != 201:
+                raise SystemExit(f"register {login}: {r.status_code} {r.text}")
+    return logins
+
+
+def run_storm(base_url: str, logins: list[str], requests: int, concurrency: int, bad_ratio: float) -> None:
+    """Смесь входов. Неверные пароли идут только в «чужие» логины, чтобы не блокировать пул."""
+    local = threading.local()
+    # Первые ~10% пула получают неверные пароли (и со временем блокируются), остальные — верные
+    victims = logins[: max(1, len(logins) // 10)]
+    good = logins[len(victims):] or logins
+
+    def client() -> httpx.Client:
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=base_url, timeout=30.0)
+        return local.client
+
+    def attempt(i: int) -> tuple[int, float]:
+        rnd = random.Random(i)
+        if rnd.random() < bad_ratio:
+            body = {"login": rnd.choice(victims), "password": WRONG_PASSWORD}
+        else:
+            body = {"login": rnd.choice(good), "password": PASSWORD}
+        t0 = time.perf_counter()
+        r = client().post("/auth/login", json=body)
+        return r.status_code, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(attempt, range(requests)))
+    elapsed = time.perf_counter() - t0
+
+    codes: dict[int, int] = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    latencies = [d * 1000 for _, d in results]
+    print(f"входы: {requests} за {elapsed:.2f} с · {requests / elapsed:.0f} req/s · коды {codes}")
+    print(
+        f"  задержка: p50 {statistics.median(latencies):.1f} ms · p95 {_percentile(latencies, 0.95):.1f} ms · "
+        f"p99 {_percentile(latencies, 0.99):.1f} ms"
+    )
+
+
+def check_counter(base_url: str, prefix: str, rounds: int) -> None:
+    """THRESHOLD-1 параллельных неудач не блокируют, ещё одна — блокирует. Иначе счётчик теряет инкременты."""
+    lost = 0
+    for n in range(rounds):
+        (login,) = _register_users(base_url, f"{prefix}r{n:03d}", 1)
+
+        def bad(_):
+            with httpx.Client(base_url=base_url, timeout=30.0) as c:
+                return c.post("/auth/login", json={"login": login, "password": WRONG_PASSWORD}).status_code
+
+        with ThreadPoolExecutor(max_workers=FAILED_LOGIN_THRESHOLD) as pool:
+            list(pool.map(bad, range(FAILED_LOGIN_THRESHOLD - 1)))
+        bad(None)
+        with httpx.Client(base_url=base_url, timeout=30.0) as c:
+            r = c.post("/auth/login", json={"login": login, "password": PASSWORD})
+        if r.status_code != 403:
+            lost += 1
+    print(f"счётчик неудачных попыток: {rounds} раундов · раундов с потерянными инкрементами: {lost}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("API_BASE_URL", "http://localhost:8000/api/v1"))
+    parser.add_argument("--users", type=int, default=50, help="Размер пула пользователей")
+    parser.add_argument("--requests", type=int, default=2000, help="Число попыток входа")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число параллельных клиентов")
+    parser.add_argument("--bad-ratio", type=float, default=0.2, help="Доля попыток с неверным паролем")
+    parser.add_argument("--counter-rounds", type=int, default=10, help="Раундов проверки счётчика (0 — пропустить)")
+    args = parser.parse_args(argv)
+
+    prefix = f"l{os.getpid() % 10000:04d}{int(time.time()) % 10000:04d}"
+    logins = _register_users(args.base_url, prefix, args.users)
+    run_storm(args.base_url, logins, args.requests, args.concurrency, args.bad_ratio)
+    if args.counter_rounds:
+        check_counter(args.base_url, prefix, args.counter_rounds)
+
+
+if __name__ == "__main__":
+    main()
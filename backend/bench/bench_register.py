@@ -0,0 +1,91 @@
+"""
+Бенчмарк пропускной способности регистрации: N регистраций уникальных логинов в несколько
+потоков против поднятого сервера, плюс доля конфликтов при гонке за один логин.
+
+Запуск (сервер уже поднят, rate limit регистрации выключен: REGISTER_RATE_LIMIT_PER_MINUTE=0):
+
+    python -m bench.bench_register --base-url http://localhost:8000/api/v1 --count 2000 --concurrency 16
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+PASSWORD = "BenchPass123!"
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_unique(base_url: str, count: int, concurrency: int) -> None:
+    """count регистраций с уникальными логинами; печатает rps и задержки."""
+    prefix = f"b{os.getpid() % 10000:04d}{int(time.time()) % 100000:05d}"
+    local = threading.local()
+
+    def client() -> httpx.Client:
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=base_url, timeout=30.0)
+        return local.client
+
+    def register(i: int) -> tuple[int, float]:
+        t0 = time.perf_counter()
+        r = client().post("/auth/register", json={"login": f"{prefix}{i:06d}", "password": PASSWORD})
+        return r.status_code, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(register, range(count)))
+    elapsed = time.perf_counter() - t0
+
+    codes: dict[int, int] = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    latencies = [d * 1000 for _, d in results]
+    print(f"регистрации: {count} за {elapsed:.2f} с · {count / elapsed:.0f} req/s · коды {codes}")
+    print(
+        f"  задержка: p50 {statistics.median(latencies):.1f} ms · p95 {_percentile(latencies, 0.95):.1f} ms · "
+        f"p99 {_percentile(latencies, 0.99):.1f} ms"
+    )
+
+
+def run_conflicts(base_url: str, rounds: int, concurrency: int) -> None:
+    """rounds раз concurrency потоков регистрируют один и тот же логин: ожидается ровно один 201 на раунд."""
+    prefix = f"c{os.getpid() % 10000:04d}{int(time.time()) % 100000:05d}"
+    bad_rounds = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for n in range(rounds):
+            login = f"{prefix}{n:06d}"
+
+            def register(_):
+                with httpx.Client(base_url=base_url, timeout=30.0) as c:
+                    return c.post("/auth/register", json={"login": login, "password": PASSWORD}).status_code
+
+            codes = list(pool.map(register, range(concurrency)))
+            if codes.count(201) != 1 or codes.count(409) != concurrency - 1:
+                bad_rounds += 1
+    print(f"гонка за логин: {rounds} раундов по {concurrency} запросов · некорректных раундов: {bad_rounds}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("API_BASE_URL", "http://localhost:8000/api/v1"))
+    parser.add_argument("--count", type=int, default=1000, help="Число регистраций")
+    parser.add_argument("--concurrency", type=int, default=8, help="Число параллельных клиентов")
+    parser.add_argument("--conflict-rounds", type=int, default=20, help="Раундов гонки за один логин (0 — пропустить)")
+    args = parser.parse_args(argv)
+
+    run_unique(args.base_url, args.count, args.concurrency)
+    if args.conflict_rounds:
+        run_conflicts(args.base_url, args.conflict_rounds, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
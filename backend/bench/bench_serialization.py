@@ -0,0 +1,173 @@
+"""
+Бенчмарк сериализации списков: обычный путь (ORM-объекты → response_model) против быстрого
+(FAST_JSON_RESPONSES: Core-кортежи, приведённые в SQL к виду ответа → orjson, app/fast_json.py)
+на истории из 10k операций.
+
+Во временной БД-записи создаётся пользователь со счётом и N операциями, GET /api/v1/transactions
+вызывается через TestClient в обоих режимах (ответы обязаны совпасть), затем данные удаляются.
+Отдельно замеряется чистая сериализация без БД и HTTP.
+
+Запуск (из каталога backend, нужна доступная БД из DATABASE_URL):
+
+    python -m bench.bench_serialization --rows 10000 --runs 10
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import orjson
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+
+from app.core.config import settings
+from app.db import engine
+from app.fast_json import rows_response, transaction_list_adapter, transaction_rows
+from app.main import app
+from app.models import Account, AccountType, Currency, Transaction, TransactionStatus, TransactionType, User
+from app.security import create_access_token
+
+
+def _history_values(n: int, account_id: int, user_id: int) -> list[dict]:
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "type": (TransactionType.TRANSFER, TransactionType.TOPUP, TransactionType.PAYMENT)[i % 3],
+            "amount": Decimal(f"{(i * 37) % 100000}.{i % 100:02d}"),
+            "fee": Decimal("0.00") if i % 4 else Decimal("15.00"),
+            "currency": Currency.RUB,
+            "status": TransactionStatus.COMPLETED,
+            "initiated_by": user_id,
+            "from_account_id": account_id,
+            "to_account_id": None,
+            "description": "p2p_transfer" if i % 3 == 0 else f"mobile:MTS:+7999{i:07d}",
+            "created_at": start + timedelta(seconds=i, microseconds=i % 1000),
+        }
+        for i in range(n)
+    ]
+
+
+def seed_history(n: int) -> tuple[int, int]:
+    """Пользователь со счётом и n операциями; возвращает (user_id, account_id)."""
+    with engine.begin() as conn:
+        user_id = conn.scalar(
+            insert(User).values(login=f"bench_ser_{os.getpid()}", password_hash="Bench1!x").returning(User.id)
+        )
+        account_id = conn.scalar(
+            insert(Account)
+            .values(
+                account_number=f"9{os.getpid():015d}"[-16:],
+                user_id=user_id,
+                account_type=AccountType.DEBIT,
+                currency=Currency.RUB,
+            )
+            .returning(Account.id)
+        )
+        conn.execute(insert(Transaction), _history_values(n, account_id, user_id))
+    return user_id, account_id
+
+
+def drop_history(user_id: int, account_id: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(Transaction).where(Transaction.initiated_by == user_id))
+        conn.execute(delete(Account).where(Account.id == account_id))
+        conn.execute(delete(User).where(User.id == user_id))
+
+
+def _timed(fn, runs: int) -> list[float]:
+    fn()  # прогрев
+    durations = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+    return durations
+
+
+def _fmt(values: list[float]) -> str:
+    ms = [v * 1000 for v in values]
+    return f"min {min(ms):7.1f} ms · median {statistics.median(ms):7.1f} ms · max {max(ms):7.1f} ms"
+
+
+def bench_http(n: int, runs: int) -> None:
+    user_id, account_id = seed_history(n)
+    try:
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {create_access_token(str(user_id))}"}
+
+        def get():
+            r = client.get("/api/v1/transactions", headers=headers)
+            assert r.status_code == 200, r.text
+            return r
+
+        bodies, timings = {}, {}
+        for fast in (False, True):
+            settings.fast_json_responses = fast
+            bodies[fast] = get().json()
+            timings[fast] = _timed(get, runs)
+        if bodies[False] != bodies[True]:
+            raise SystemExit("fast path response differs from response_model response")
+        transaction_list_adapter.validate_python(bodies[True])  # формат ответа соответствует схеме
+        print(f"GET /transactions, {n} операций, {runs} замеров")
+        print(f"  обычный путь (ORM + response_model) : {_fmt(timings[False])}")
+        print(f"  быстрый путь (Core + orjson)        : {_fmt(timings[True])}")
+    finally:
+        drop_history(user_id, account_id)
+
+
+def bench_serialization_only(n: int, runs: int) -> None:
+    """Без БД и HTTP: валидация+дамп через TypeAdapter против готовых строк + orjson."""
+    values = _history_values(n, account_id=1, user_id=1)
+    orm_like = [SimpleNamespace(id=i + 1, **v) for i, v in enumerate(values)]
+    rows = [
+        SimpleNamespace(
+            id=i + 1,
+            type=v["type"].value,
+            amount=str(v["amount"]),
+            fee=str(v["fee"]),
+            total=str(v["amount"] + v["fee"]),
+            currency=v["currency"].value,
+            description=v["description"],
+            created_at=v["created_at"],
+            from_account_id=v["from_account_id"],
+            to_account_id=v["to_account_id"],
+            status=v["status"].value,
+            rate_snapshot_id=None,
+        )
+        for i, v in enumerate(values)
+    ]
+
+    def via_adapter():
+        return transaction_list_adapter.dump_json(
+            transaction_list_adapter.validate_python(orm_like, from_attributes=True)
+        )
+
+    def via_rows():
+        return rows_response(transaction_rows(rows)).body
+
+    if orjson.loads(via_adapter()) != orjson.loads(via_rows()):
+        raise SystemExit("fast path serialization differs from TypeAdapter output")
+    print(f"сериализация без БД, {n} операций")
+    print(f"  TypeAdapter validate + dump_json    : {_fmt(_timed(via_adapter, runs))}")
+    print(f"  строки SQL-формы + orjson           : {_fmt(_timed(via_rows, runs))}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Число операций в истории")
+    parser.add_argument("--runs", type=int, default=10, help="Сколько раз повторить замер")
+    parser.add_argument("--skip-db", action="store_true", help="Только сериализация в памяти, без БД")
+    args = parser.parse_args(argv)
+
+    bench_serialization_only(args.rows, args.runs)
+    if not args.skip_db:
+        bench_http(args.rows, args.runs)
+
+
+if __name__ == "__main__":
+    main()
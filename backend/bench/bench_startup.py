@@ -0,0 +1,113 @@
+"""
+Бенчмарк холодного старта: сколько времени проходит от запуска uvicorn до первого ответа /health,
+и сколько стоит init_db() (время и число SQL-запросов) на уже инициализированной БД.
+
+Запуск (из каталога backend, нужна доступная БД из DATABASE_URL):
+
+    python -m bench.bench_startup --runs 5 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def _wait_healthy(url: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=0.5).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_cold_start(*, port: int, workers: int, timeout: float) -> float:
+    """Запустить uvicorn в отдельном процессе и вернуть время (с) до первого успешного /health."""
+    cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=os.environ.copy())
+    try:
+        if not _wait_healthy(f"http://127.0.0.1:{port}/health", timeout):
+            raise RuntimeError("server did not become healthy in time")
+        return time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def measure_init_db(runs: int) -> tuple[list[float], int]:
+    """Повторный init_db() в текущем процессе: длительности (с) и число SQL-запросов за один вызов."""
+    from sqlalchemy import event
+
+    from app.db import engine
+    from app.startup import init_db
+
+    counter = {"n": 0}
+
+    def _count(*_args, **_kwargs) -> None:
+        counter["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        init_db()  # прогрев: подключение к БД, первая инициализация схемы
+        durations = []
+        for _ in range(runs):
+            counter["n"] = 0
+            t0 = time.perf_counter()
+            init_db()
+            durations.append(time.perf_counter() - t0)
+        return durations, counter["n"]
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+def _fmt(values: list[float]) -> str:
+    ms = [v * 1000 for v in values]
+    return f"min {min(ms):.1f} ms · median {statistics.median(ms):.1f} ms · max {max(ms):.1f} ms"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Сколько раз повторить замер")
+    parser.add_argument("--workers", type=int, default=1, help="Число воркеров uvicorn при холодном старте")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Таймаут ожидания /health, с")
+    parser.add_argument("--skip-cold", action="store_true", help="Только замер init_db() в процессе")
+    args = parser.parse_args(argv)
+
+    durations, queries = measure_init_db(args.runs)
+    print(f"init_db() x{args.runs}: {_fmt(durations)} · SQL-запросов за вызов: {queries}")
+
+    if args.skip_cold:
+        return
+    cold = [measure_cold_start(port=args.port, workers=args.workers, timeout=args.timeout) for _ in range(args.runs)]
+    print(f"cold start ({args.workers} workers) x{args.runs}: {_fmt(cold)}")
+
+
+if __name__ == "__main__":
+    main()
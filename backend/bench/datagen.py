@@ -0,0 +1,358 @@
+"""
+Генератор больших наборов данных: миллионы пользователей, счетов, банков для переводов и операций.
+
+Нужен, чтобы локально получить планы запросов «как в проде»: на десятке строк PostgreSQL выбирает
+Seq Scan там, где на миллионах будет индекс, и наоборот.
+
+Загрузка идёт пачками по --batch строк, каждая пачка — своя транзакция:
+- --method copy (по умолчанию): COPY … FROM STDIN через курсор psycopg2 — самый быстрый путь;
+- --method insert: многострочные INSERT (executemany SQLAlchemy, insertmanyvalues) — для сравнения.
+id пользователей и счетов заранее берутся из их последовательностей (nextval по generate_series),
+поэтому генератор можно запускать рядом с работающим сервером; у user_banks и transactions id
+проставляет сама БД.
+
+Распределения:
+- у каждого RUB-счёт DEBIT (основной); у части — RUB SAVINGS и счёт в USD/EUR/CNY; балансы логнормальные;
+- 0–5 внешних банков для переводов (как у клиентов после регистрации);
+- активность по Ципфу (--zipf): немногие пользователи делают большую часть операций, получатели
+  переводов тоже выбираются по Ципфу;
+- виды операций и описания — как у настоящих маршрутов (self_topup, helper_topup, p2p_transfer,
+  p2p_transfer_by_account, p2p_transfer_by_phone, external_transfer, p2p_by_phone_external,
+  mobile, vendor, fx_exchange), суммы в пределах лимитов маршрутов;
+- created_at операций растёт вместе с id за последние --days дней (как при обычной вставке).
+Балансы со списком операций не сверяются: набор нужен для планов и объёмов, не для бухгалтерии.
+
+В конце — ANALYZE загруженных таблиц (--no-analyze — пропустить). Удалить сгенерированное:
+--drop (по префиксу логинов --prefix).
+
+    python -m bench.datagen --users 1000000 --transactions 20000000
+    python -m bench.datagen --users 100000 --transactions 1000000 --method insert --prefix dgi
+    python -m bench.datagen --prefix dg --drop
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import io
+import itertools
+import math
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Table, column, func, select, text
+from sqlalchemy import table as sa_table
+from sqlalchemy.engine import Connection
+
+from app.account_numbers import allocate_account_numbers
+from app.banks import get_external_bank_codes
+from app.db import engine
+from app.models import Account, AccountType, Currency, Transaction, TransactionType, User, UserBank
+from app.rates import DEFAULT_RATES_TO_RUB, build_snapshot
+from app.routes.payments import MOBILE_OPERATORS, VENDOR_PROVIDERS
+from bench.bench_api import PASSWORD, drop_users
+
+FOREIGN = (Currency.USD, Currency.EUR, Currency.CNY)
+FOREIGN_WEIGHTS = (50, 35, 15)
+SAVINGS_SHARE = 0.3
+FOREIGN_SHARE = 0.35
+NO_BANKS_SHARE = 0.4
+
+# Вид операции и его доля; p2p_transfer и fx_exchange без подходящего второго счёта становятся
+# переводом по номеру счёта и оплатой связи соответственно
+KINDS: dict[str, int] = {
+    "self_topup": 8,
+    "helper_topup": 4,
+    "p2p_transfer": 8,
+    "p2p_transfer_by_account": 20,
+    "p2p_transfer_by_phone": 22,
+    "external_transfer": 3,
+    "p2p_by_phone_external": 5,
+    "mobile": 18,
+    "vendor": 10,
+    "fx_exchange": 2,
+}
+
+FIRST_NAMES = ("Анна", "Иван", "Мария", "Пётр", "Ольга", "Алексей", "Елена", "Дмитрий", "Наталья", "Сергей")
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов")
+
+USER_COLUMNS = ("id", "login", "email", "password_hash", "role", "status", "failed_login_attempts",
+                "first_name", "last_name", "phone", "created_at")
+ACCOUNT_COLUMNS = ("id", "account_number", "user_id", "account_type", "currency", "balance",
+                   "is_active", "is_primary", "created_at")
+USER_BANK_COLUMNS = ("user_id", "bank_code")
+TRANSACTION_COLUMNS = ("from_account_id", "to_account_id", "type", "amount", "currency", "status",
+                       "initiated_by", "description", "fee", "rate_snapshot_id", "created_at")
+
+_NULL = "\\N"
+
+
+# --- Загрузка ---
+
+def load_rows(conn: Connection, method: str, table: Table, columns: tuple[str, ...], rows: list[tuple]) -> None:
+    """
+    Записать строки в таблицу: COPY FROM STDIN или многострочными INSERT.
+
+    Значения — уже текст в формате PostgreSQL (числа, 't'/'f', даты ISO) или None: так COPY не тратит
+    время на форматирование. Табуляций, переводов строк и обратной косой черты генератор не порождает,
+    поэтому экранирования COPY нет.
+    """
+    if not rows:
+        return
+    if method == "insert":
+        # Колонки без типов: строки уходят в БД как есть, приведение типов делает PostgreSQL
+        untyped = sa_table(table.name, *(column(name) for name in columns))
+        conn.execute(untyped.insert(), [dict(zip(columns, row)) for row in rows])
+        return
+    buffer = io.StringIO()
+    buffer.writelines("\t".join([_NULL if value is None else value for value in row]) + "\n" for row in rows)
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def reserve_ids(conn: Connection, table: Table, count: int) -> list[int]:
+    """count значений последовательности id таблицы одним запросом."""
+    sequence = func.pg_get_serial_sequence(table.name, "id")
+    return list(conn.scalars(select(func.nextval(sequence)).select_from(func.generate_series(1, count))))
+
+
+def _money(value: float, low: float, high: float) -> str:
+    return f"{min(max(value, low), high):.2f}"
+
+
+def _mask(last4: int) -> str:
+    return f"••••{last4:04d}"
+
+
+def _phone(user_id: int) -> str:
+    return f"+7{7_000_000_000 + user_id}"
+
+
+# --- Пользователи, счета, банки ---
+
+class Population:
+    """Сгенерированные пользователи в компактных массивах: всё, что нужно для операций."""
+
+    def __init__(self) -> None:
+        self.user_ids = array("q")
+        self.primary = array("q")
+        self.primary_last4 = array("H")
+        self.savings = array("q")  # 0 — нет
+        self.foreign = array("q")  # 0 — нет
+        self.foreign_currency = array("B")  # индекс в FOREIGN
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+def generate_users(conn: Connection, rnd: random.Random, method: str, prefix: str, count: int,
+                   banks: list[str], since: datetime, population: Population) -> tuple[int, int]:
+    """Пачка пользователей со счетами и банками; вернуть число счетов и связей с банками."""
+    user_ids = reserve_ids(conn, User.__table__, count)
+    span = (datetime.utcnow() - since).total_seconds()
+    users, plans = [], []
+    for user_id in user_ids:
+        login = f"{prefix}{user_id}"
+        created = (since + timedelta(seconds=rnd.random() * span)).isoformat(" ")
+        users.append((
+            str(user_id), login, f"{login}@example.test" if rnd.random() < 0.5 else None, PASSWORD, "CLIENT", "ACTIVE",
+            "0", rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), _phone(user_id), created,
+        ))
+        plan = [(Currency.RUB, AccountType.DEBIT, True)]
+        if rnd.random() < SAVINGS_SHARE:
+            plan.append((Currency.RUB, AccountType.SAVINGS, False))
+        if rnd.random() < FOREIGN_SHARE:
+            plan.append((rnd.choices(FOREIGN, FOREIGN_WEIGHTS)[0], AccountType.DEBIT, False))
+        plans.append((user_id, created, plan))
+
+    per_currency = {currency: 0 for currency in Currency}
+    for _, _, plan in plans:
+        for currency, _, _ in plan:
+            per_currency[currency] += 1
+    numbers = {currency: iter(allocate_account_numbers(conn, currency, n)) for currency, n in per_currency.items()}
+    account_ids = iter(reserve_ids(conn, Account.__table__, sum(per_currency.values())))
+
+    accounts, links = [], []
+    for user_id, created, plan in plans:
+        population.user_ids.append(user_id)
+        savings = foreign = foreign_currency = 0
+        for currency, account_type, primary in plan:
+            account_id, number = next(account_ids), next(numbers[currency])
+            if currency == Currency.RUB:
+                balance = _money(rnd.lognormvariate(math.log(30_000), 1.5), 0, 100_000_000)
+            else:
+                balance = _money(rnd.lognormvariate(math.log(500), 1.2), 0, 1_000_000)
+            accounts.append((str(account_id), number, str(user_id), account_type.value, currency.value, balance, "t",
+                             "t" if primary else "f", created))
+            if primary:
+                population.primary.append(account_id)
+                population.primary_last4.append(int(number[-4:]))
+            elif account_type == AccountType.SAVINGS:
+                savings = account_id
+            else:
+                foreign, foreign_currency = account_id, FOREIGN.index(currency)
+        population.savings.append(savings)
+        population.foreign.append(foreign)
+        population.foreign_currency.append(foreign_currency)
+        if rnd.random() >= NO_BANKS_SHARE:
+            links.extend((str(user_id), code) for code in rnd.sample(banks, rnd.randint(1, min(5, len(banks)))))
+
+    load_rows(conn, method, User.__table__, USER_COLUMNS, users)
+    load_rows(conn, method, Account.__table__, ACCOUNT_COLUMNS, accounts)
+    load_rows(conn, method, UserBank.__table__, USER_BANK_COLUMNS, links)
+    return len(accounts), len(links)
+
+
+# --- Операции ---
+
+class ZipfPicker:
+    """Индекс пользователя по закону Ципфа: ранг r выбирается с весом 1/r^s, ранги перемешаны."""
+
+    def __init__(self, rnd: random.Random, size: int, s: float):
+        self.rnd = rnd
+        self.ranked = list(range(size))
+        rnd.shuffle(self.ranked)
+        self.cum = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, size + 1)))
+        self.total = self.cum[-1]
+
+    def pick(self) -> int:
+        return self.ranked[bisect.bisect_left(self.cum, self.rnd.random() * self.total)]
+
+
+def transaction_row(rnd: random.Random, kind: str, population: Population, u: int, zipf: ZipfPicker,
+                    banks: list[str], rates, created: str) -> tuple:
+    user_id, primary = population.user_ids[u], str(population.primary[u])
+    initiator = str(user_id)
+
+    def recipient() -> int:
+        other = zipf.pick()
+        return other if other != u else (u + 1) % len(population)
+
+    if kind == "p2p_transfer" and not population.savings[u]:
+        kind = "p2p_transfer_by_account"
+    if kind == "fx_exchange" and not population.foreign[u]:
+        kind = "mobile"
+    if kind in ("p2p_transfer_by_account", "p2p_transfer_by_phone") and len(population) < 2:
+        kind = "mobile"
+
+    transfer = _money(rnd.lognormvariate(math.log(3_000), 1.3), 10, 300_000)
+    rub = Currency.RUB.value
+    if kind in ("self_topup", "helper_topup"):
+        amount = _money(rnd.lognormvariate(math.log(10_000), 1.2), 100, 1_000_000)
+        return (None, primary, TransactionType.TOPUP.value, amount, rub, "COMPLETED", initiator, kind, "0", None, created)
+    if kind == "p2p_transfer":
+        return (primary, str(population.savings[u]), TransactionType.TRANSFER.value, transfer, rub, "COMPLETED", initiator,
+                "p2p_transfer", "0", None, created)
+    if kind in ("p2p_transfer_by_account", "p2p_transfer_by_phone"):
+        other = recipient()
+        description = f"{kind}:{rub}:{_mask(population.primary_last4[other])}"
+        return (primary, str(population.primary[other]), TransactionType.TRANSFER.value, transfer, rub, "COMPLETED",
+                initiator, description, "0", None, created)
+    if kind == "external_transfer":
+        fee = (Decimal(transfer) * Decimal("0.05")).quantize(Decimal("0.01"))
+        description = f"external_transfer:{rub}:{_mask(rnd.randrange(10_000))}:fee_{fee}"
+        return (primary, None, TransactionType.TRANSFER.value, transfer, rub, "COMPLETED", initiator, description,
+                str(fee), None, created)
+    if kind == "p2p_by_phone_external":
+        fee = (Decimal(transfer) * Decimal("0.02")).quantize(Decimal("0.01"))
+        description = f"p2p_by_phone_external:{rnd.choice(banks)}:+79{rnd.randrange(10**9):09d}:fee_{fee}"
+        return (primary, None, TransactionType.TRANSFER.value, transfer, rub, "COMPLETED", initiator, description,
+                str(fee), None, created)
+    if kind == "fx_exchange":
+        target = FOREIGN[population.foreign_currency[u]]
+        target_amount = rates.convert(Decimal(transfer), Currency.RUB, target)
+        description = f"fx_exchange:{rub}->{target.value}:{target_amount}"
+        return (primary, str(population.foreign[u]), TransactionType.TRANSFER.value, transfer, rub, "COMPLETED", initiator,
+                description, "0", rates.version, created)
+    if kind == "vendor":
+        provider, length = rnd.choice(list(VENDOR_PROVIDERS.items()))
+        account_number = f"{rnd.randrange(10**length):0{length}d}"
+        amount = _money(rnd.lognormvariate(math.log(4_000), 1.0), 100, 500_000)
+        return (primary, None, TransactionType.PAYMENT.value, amount, rub, "COMPLETED", initiator,
+                f"vendor:{provider}:{account_number}", "0", None, created)
+    # mobile: чаще всего — свой номер
+    phone = _phone(user_id) if rnd.random() < 0.7 else f"+79{rnd.randrange(10**9):09d}"
+    amount = _money(rnd.lognormvariate(math.log(500), 0.8), 100, 12_000)
+    return (primary, None, TransactionType.PAYMENT.value, amount, rub, "COMPLETED", initiator,
+            f"mobile:{rnd.choice(MOBILE_OPERATORS)}:{phone}", "0", None, created)
+
+
+# --- CLI ---
+
+def _report(label: str, rows: int, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    print(f"  {label}: {rows} строк за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):,.0f} строк/с)")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000, help="Сколько пользователей создать")
+    parser.add_argument("--transactions", type=int, default=None, help="Сколько операций (по умолчанию 20 на пользователя)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Показатель s распределения Ципфа (активность)")
+    parser.add_argument("--days", type=int, default=365, help="За сколько дней распределить операции")
+    parser.add_argument("--method", choices=("copy", "insert"), default="copy", help="COPY или многострочные INSERT")
+    parser.add_argument("--batch", type=int, default=50_000, help="Строк в пачке (одна транзакция)")
+    parser.add_argument("--prefix", default="dg", help="Префикс логинов (латиница и цифры, до 8 символов)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора случайных чисел")
+    parser.add_argument("--no-analyze", action="store_true", help="Не выполнять ANALYZE после загрузки")
+    parser.add_argument("--drop", action="store_true", help="Удалить ранее сгенерированные данные с --prefix и выйти")
+    args = parser.parse_args(argv)
+    if not args.prefix.isalnum() or not args.prefix.isascii() or len(args.prefix) > 8:
+        parser.error("--prefix: only latin letters and digits, up to 8 characters")
+
+    if args.drop:
+        started = time.perf_counter()
+        drop_users(args.prefix)
+        print(f"данные с префиксом {args.prefix!r} удалены за {time.perf_counter() - started:.1f} с")
+        return
+
+    rnd = random.Random(args.seed)
+    transactions = args.users * 20 if args.transactions is None else args.transactions
+    banks = get_external_bank_codes()
+    since = datetime.utcnow() - timedelta(days=args.days)
+    population = Population()
+    print(f"{args.users} пользователей, {transactions} операций, метод {args.method}, пачка {args.batch}")
+
+    started = time.perf_counter()
+    accounts = links = 0
+    for offset in range(0, args.users, args.batch):
+        with engine.begin() as conn:
+            a, b = generate_users(conn, rnd, args.method, args.prefix, min(args.batch, args.users - offset),
+                                  banks, since, population)
+        accounts, links = accounts + a, links + b
+    _report("пользователи", len(population), started)
+    print(f"  счетов {accounts}, связей с банками {links}")
+
+    if transactions and len(population):
+        started = time.perf_counter()
+        zipf = ZipfPicker(rnd, len(population), args.zipf)
+        kinds, weights = list(KINDS), list(itertools.accumulate(KINDS.values()))
+        rates = build_snapshot(dict(DEFAULT_RATES_TO_RUB), "datagen")
+        step = timedelta(days=args.days) / transactions
+        for offset in range(0, transactions, args.batch):
+            count = min(args.batch, transactions - offset)
+            chosen = rnd.choices(kinds, cum_weights=weights, k=count)
+            rows = [
+                transaction_row(rnd, kind, population, zipf.pick(), zipf, banks, rates, (since + step * (offset + i)).isoformat(" "))
+                for i, kind in enumerate(chosen)
+            ]
+            with engine.begin() as conn:
+                load_rows(conn, args.method, Transaction.__table__, TRANSACTION_COLUMNS, rows)
+        _report("операции", transactions, started)
+
+    if not args.no_analyze:
+        started = time.perf_counter()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in ("users", "accounts", "user_banks", "transactions"):
+                conn.execute(text(f"ANALYZE {table}"))
+        print(f"  ANALYZE за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
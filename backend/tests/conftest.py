@@ -1,13 +1,26 @@
 """
-Фикстуры для API-автотестов. Тесты запускаются против поднятого сервера (docker compose up).
+Фикстуры для API-автотестов. По умолчанию тесты запускаются против поднятого сервера (docker compose up);
+с API_TEST_MODE=inprocess — против приложения в процессе pytest, каждый тест в своей откатываемой
+транзакции, можно параллельно: pytest -n auto (см. inprocess.py).
 Подготовка данных — только через API (регистрация, Helper).
 """
+import itertools
 import os
 import time
 import httpx
 import pytest
 
-BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001/api/v1")
+import inprocess
+import query_budget
+from inprocess import IN_PROCESS, _db_module_transaction, _db_savepoint, app_client, pytest_collection_modifyitems  # noqa: F401
+from query_budget import _query_budget_check, pytest_terminal_summary, record_response  # noqa: F401
+
+BASE_URL = inprocess.IN_PROCESS_BASE_URL if IN_PROCESS else os.getenv("API_BASE_URL", "http://localhost:8001/api/v1")
+
+
+def pytest_configure(config):
+    query_budget.pytest_configure(config)
+    inprocess.configure(config)
 
 
 @pytest.fixture(scope="session")
@@ -17,7 +30,12 @@ def base_url():
 
 @pytest.fixture(scope="session")
 def http_client():
-    with httpx.Client(base_url=BASE_URL, timeout=15.0) as client:
+    event_hooks = {"response": [record_response]}
+    if IN_PROCESS:
+        with app_client(event_hooks=event_hooks) as client:
+            yield client
+        return
+    with httpx.Client(base_url=BASE_URL, timeout=15.0, event_hooks=event_hooks) as client:
         yield client
 
 
@@ -33,10 +51,28 @@ def _headers(token: str | None = None):
     return {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
 
 
+_login_counter = itertools.count()
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, 36)
+        digits.append(_BASE36[digit])
+    return "".join(reversed(digits))
+
+
 @pytest.fixture
 def unique_login():
-    """Уникальный логин для регистрации (избегаем конфликтов между тестами). Логин только [A-Za-z0-9] по API."""
-    return f"user{int(time.time() * 1000)}"
+    """Уникальный логин для регистрации (избегаем конфликтов между тестами). Логин только [A-Za-z0-9] по API.
+
+    Поля фиксированной ширины — воркер xdist, время в мс, счётчик процесса: логины не совпадают между
+    параллельными воркерами и не бывают префиксами друг друга. Длина 16 — тесты дописывают суффиксы до 20.
+    """
+    worker = os.getenv("PYTEST_XDIST_WORKER", "gw")[2:]
+    worker = f"{int(worker):02d}" if worker else "00"
+    return f"user{worker}{_base36(int(time.time() * 1000), 8)}{_base36(next(_login_counter), 2)}"
 
 
 @pytest.fixture
@@ -0,0 +1,150 @@
+"""
+Режим тестов без сервера (API_TEST_MODE=inprocess): приложение app.main:app работает в процессе pytest.
+
+- Клиент — обычный синхронный httpx.Client; транспорт передаёт запросы в httpx.ASGITransport,
+  который выполняется в цикле событий фонового потока (портал anyio). Старт и остановка
+  приложения (startup/shutdown) — один раз на сессию, как у uvicorn.
+- Изоляция БД: на модуль тестов открывается одно соединение и транзакция, на каждый тест —
+  SAVEPOINT внутри неё. Сессии приложения (get_db, get_read_db) привязаны к этому соединению
+  с join_transaction_mode="create_savepoint": их commit — это RELEASE SAVEPOINT. После теста
+  его SAVEPOINT откатывается, после модуля — вся транзакция; в БД ничего не остаётся, а данные
+  модульных фикстур (test_statistics) живут до конца модуля.
+- Параллельный запуск (pytest -n auto, pytest-xdist): у каждого воркера своё приложение
+  и свои транзакции, незакоммиченные данные других воркеров не видны.
+
+Тесты с маркером live_server (одновременные запросы из нескольких потоков, бесконечный SSE-поток)
+требуют настоящего сервера и в этом режиме пропускаются.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+
+import httpx
+import pytest
+
+IN_PROCESS = os.getenv("API_TEST_MODE", "live") == "inprocess"
+IN_PROCESS_BASE_URL = "http://testserver/api/v1"
+
+if IN_PROCESS:
+    # Настройки читаются при импорте приложения: задаём их до него (сотни регистраций за прогон)
+    os.environ.setdefault("REGISTER_RATE_LIMIT_PER_MINUTE", "0")
+
+
+class InProcessTransport(httpx.BaseTransport):
+    """Синхронный транспорт поверх httpx.ASGITransport: запрос выполняется в цикле событий портала."""
+
+    def __init__(self, app, portal):
+        # Ошибка приложения — ответ 500, как от сервера, а не исключение в тесте
+        self._transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        self._portal = portal
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._portal.call(self._send, request)
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        # Тело как пришло от приложения (сжатое): распаковывает уже клиент, как с настоящим сервером
+        content = b"".join([chunk async for chunk in response.aiter_raw()])
+        return httpx.Response(
+            response.status_code, headers=response.headers, stream=httpx.ByteStream(content), request=request
+        )
+
+
+@contextlib.contextmanager
+def app_client(**kwargs):
+    """httpx.Client к приложению в этом процессе; приложение запущено, пока открыт контекст."""
+    from anyio.from_thread import start_blocking_portal
+
+    from app.main import app
+
+    with start_blocking_portal() as portal:
+        with portal.wrap_async_context_manager(app.router.lifespan_context(app)):
+            with httpx.Client(base_url=IN_PROCESS_BASE_URL, transport=InProcessTransport(app, portal), **kwargs) as client:
+                yield client
+
+
+class _ConnectionBind:
+    """Замена движка для потоковых выгрузок (current_read_engine): отдаёт соединение теста, не закрывая его.
+
+    execution_options (stream_results, yield_per) действуют на один запрос, а не на общее соединение:
+    иначе следующий ROLLBACK TO SAVEPOINT тоже ушёл бы в серверный курсор.
+    """
+
+    def __init__(self, connection, options: dict | None = None):
+        self.connection = connection
+        self.options = options or {}
+
+    @contextlib.contextmanager
+    def connect(self):
+        yield self
+
+    def execution_options(self, **options) -> _ConnectionBind:
+        return _ConnectionBind(self.connection, {**self.options, **options})
+
+    def execute(self, statement):
+        return self.connection.execute(statement, execution_options=self.options)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _db_module_transaction():
+    if not IN_PROCESS:
+        yield None
+        return
+    from sqlalchemy.orm import Session
+
+    from app.db import engine, get_db, get_read_db
+    from app.main import app
+    from app.routes import admin
+
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    def session():
+        db = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_read_db] = session
+    current_read_engine = admin.current_read_engine
+    admin.current_read_engine = lambda: _ConnectionBind(connection)
+    try:
+        yield connection
+    finally:
+        admin.current_read_engine = current_read_engine
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture(autouse=True)
+def _db_savepoint(_db_module_transaction):
+    if _db_module_transaction is None:
+        yield
+        return
+    savepoint = _db_module_transaction.begin_nested()
+    yield
+    if savepoint.is_active:
+        savepoint.rollback()
+
+
+def configure(config) -> None:
+    config.addinivalue_line(
+        "markers",
+        "live_server: тест требует настоящего сервера (параллельные запросы, SSE); в режиме inprocess пропускается",
+    )
+    if not IN_PROCESS and getattr(config.option, "numprocesses", None):
+        raise pytest.UsageError("parallel run (-n) needs API_TEST_MODE=inprocess: live-server tests share one database")
+
+
+def pytest_collection_modifyitems(items) -> None:
+    if not IN_PROCESS:
+        return
+    skip = pytest.mark.skip(reason="needs a live server (API_TEST_MODE=live)")
+    for item in items:
+        if item.get_closest_marker("live_server"):
+            item.add_marker(skip)
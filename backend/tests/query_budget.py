@@ -0,0 +1,83 @@
+"""
+Плагин pytest: бюджет SQL-запросов по заголовкам ответа (см. backend/app/query_budget.py).
+
+Каждый ответ общего клиента (http_client) с заголовком X-DB-Query-Count проверяется:
+- запросов больше X-DB-Query-Budget маршрута или больше max_queries из маркера
+  @pytest.mark.query_budget(max_queries=N) у теста — тест падает;
+- есть X-DB-Repeated-Query (один и тот же SQL повторился QUERY_N_PLUS_ONE_THRESHOLD+ раз) — тест падает.
+В конце прогона печатается максимум запросов по каждому эндпоинту. Если сервер заголовков
+не отдаёт (QUERY_BUDGET_ENABLED=false, прод) — плагин ничего не проверяет, а тесты с точным
+пределом на отдельный ответ (assert_query_count) пропускаются.
+"""
+import re
+
+import httpx
+import pytest
+
+_ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+# эндпоинт («МЕТОД /путь/{id}») → наибольшее число запросов за прогон
+_observed: dict[str, int] = {}
+# Нарушения текущего теста; None — тест не отслеживается (ответы вне тестов не проверяются)
+_violations: list[str] | None = None
+_max_queries: int | None = None
+
+
+def _endpoint(request: httpx.Request) -> str:
+    return f"{request.method} {_ID_SEGMENT_RE.sub('/{id}', request.url.path)}"
+
+
+def record_response(response: httpx.Response) -> None:
+    """Хук ответа httpx: запомнить число запросов и проверить бюджет."""
+    count = response.headers.get("x-db-query-count")
+    if count is None:
+        return
+    count = int(count)
+    endpoint = _endpoint(response.request)
+    _observed[endpoint] = max(_observed.get(endpoint, 0), count)
+    if _violations is None:
+        return
+    budget = int(response.headers.get("x-db-query-budget", count))
+    if _max_queries is not None:
+        budget = min(budget, _max_queries)
+    if count > budget:
+        _violations.append(f"{endpoint}: {count} SQL queries, budget {budget}")
+    repeated = response.headers.get("x-db-repeated-query")
+    if repeated is not None:
+        _violations.append(f"{endpoint}: same SQL statement executed {repeated} times (N+1?)")
+
+
+def assert_query_count(response: httpx.Response, max_queries: int) -> None:
+    """Ответ выполнил не больше max_queries SQL-запросов. Без X-DB-Query-Count проверить нечем — тест пропускается
+    (вызывать последней проверкой теста, чтобы остальные успели отработать)."""
+    count = response.headers.get("x-db-query-count")
+    if count is None:
+        pytest.skip("server does not report X-DB-Query-Count (QUERY_BUDGET_ENABLED=false)")
+    assert int(count) <= max_queries, f"{_endpoint(response.request)}: {count} SQL queries, expected <= {max_queries}"
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(max_queries): не больше max_queries SQL-запросов на каждый ответ API в тесте",
+    )
+
+
+@pytest.fixture(autouse=True)
+def _query_budget_check(request):
+    global _violations, _max_queries
+    marker = request.node.get_closest_marker("query_budget")
+    _max_queries = marker.kwargs.get("max_queries") if marker else None
+    _violations = []
+    yield
+    violations, _violations, _max_queries = _violations, None, None
+    if violations:
+        pytest.fail("query budget exceeded:\n" + "\n".join(violations), pytrace=False)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _observed:
+        return
+    terminalreporter.write_sep("-", "SQL queries per endpoint (max)")
+    for endpoint, count in sorted(_observed.items(), key=lambda item: (-item[1], item[0]))[:15]:
+        terminalreporter.write_line(f"{count:4d}  {endpoint}")
@@ -2,6 +2,7 @@
 import pytest
 
 from conftest import get_otp, helper_increase
+from inprocess import IN_PROCESS
 
 
 def test_accounts_list_empty_or_returns_own(client, auth_headers):
@@ -27,6 +28,54 @@ def test_accounts_create_currencies(client, auth_headers):
         assert r.json()["currency"] == currency
 
 
+def _luhn_ok(number: str) -> bool:
+    total = 0
+    for i, ch in enumerate(reversed(number)):
+        d = int(ch)
+        if i % 2 == 1:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return total % 10 == 0
+
+
+def test_accounts_number_format(client, auth_headers):
+    """Номер счёта: 16 цифр, префикс валюты, корректная контрольная цифра; соседние номера не подряд."""
+    prefixes = {"RUB": "2202", "USD": "3202"}
+    numbers = []
+    for currency, prefix in prefixes.items():
+        r = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": currency})
+        assert r.status_code == 201
+        number = r.json()["account_number"]
+        assert len(number) == 16 and number.isdigit()
+        assert number.startswith(prefix)
+        assert _luhn_ok(number)
+        numbers.append(number)
+    r = client.post("/accounts", headers=auth_headers, json={"account_type": "SAVINGS", "currency": "RUB"})
+    assert r.status_code == 201
+    assert abs(int(r.json()["account_number"]) - int(numbers[0])) > 1
+
+
+def test_accounts_number_collision_retried(client, auth_headers, registered_user, _db_module_transaction):
+    """Номер из последовательности уже занят (старый номер, другой ключ) — берётся следующий, а не 500."""
+    if not IN_PROCESS:
+        pytest.skip("the colliding account is written to the DB directly: needs API_TEST_MODE=inprocess")
+    from sqlalchemy import insert, text
+
+    from app.account_numbers import format_account_number
+    from app.models import Account, AccountType, Currency
+
+    conn = _db_module_transaction
+    last_value, is_called = conn.execute(text("SELECT last_value, is_called FROM account_number_seq_cny")).one()
+    taken = format_account_number(Currency.CNY, last_value + 1 if is_called else last_value)
+    conn.execute(insert(Account).values(
+        account_number=taken, user_id=registered_user[2]["id"], account_type=AccountType.DEBIT, currency=Currency.CNY,
+    ))
+    r = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "CNY"})
+    assert r.status_code == 201, r.text
+    assert r.json()["account_number"] != taken
+    assert r.json()["account_number"].startswith("5202")
+
+
 def test_accounts_create_savings(client, auth_headers):
     r = client.post("/accounts", headers=auth_headers, json={"account_type": "SAVINGS", "currency": "RUB"})
     assert r.status_code == 201
@@ -1,7 +1,12 @@
 """Автотесты: Admin API (список пользователей, блокировка, удаление, банки, транзакции)."""
+import json
+import re
+import time
+
 import pytest
 
 from conftest import get_otp, helper_increase
+from inprocess import IN_PROCESS
 
 
 def _admin_token(client):
@@ -25,6 +30,56 @@ def test_admin_list_users(client):
     assert any(u.get("login") == "admin" for u in users)
 
 
+def test_admin_list_users_keyset_pagination(client, unique_login, valid_password):
+    """Постраничный список: limit + after_id из заголовка X-Next-Cursor, страницы не пересекаются."""
+    for suffix in ("a", "b"):
+        r = client.post("/auth/register", json={"login": f"{unique_login}{suffix}", "password": valid_password})
+        assert r.status_code == 201
+
+    token = _admin_token(client)
+    r = client.get("/admin/users", headers=_headers(token), params={"limit": 1})
+    assert r.status_code == 200
+    first_page = r.json()
+    assert len(first_page) == 1
+    cursor = r.headers.get("X-Next-Cursor")
+    assert cursor == str(first_page[0]["id"])
+
+    r = client.get("/admin/users", headers=_headers(token), params={"limit": 1, "after_id": cursor})
+    assert r.status_code == 200
+    second_page = r.json()
+    assert len(second_page) == 1
+    assert second_page[0]["id"] > first_page[0]["id"]
+
+
+def test_admin_list_users_filters(client, unique_login, valid_password):
+    """Фильтры списка: префикс логина, статус, роль."""
+    r = client.post("/auth/register", json={"login": unique_login, "password": valid_password})
+    assert r.status_code == 201
+    user_id = r.json()["id"]
+
+    token = _admin_token(client)
+    r = client.get("/admin/users", headers=_headers(token), params={"login_prefix": unique_login})
+    assert r.status_code == 200
+    assert [u["id"] for u in r.json()] == [user_id]
+    assert "X-Next-Cursor" not in r.headers
+
+    r = client.post(f"/admin/users/{user_id}/block", headers=_headers(token))
+    assert r.status_code == 200
+    r = client.get(
+        "/admin/users", headers=_headers(token), params={"login_prefix": unique_login, "status": "BLOCKED"}
+    )
+    assert [u["id"] for u in r.json()] == [user_id]
+    r = client.get("/admin/users", headers=_headers(token), params={"login_prefix": unique_login, "role": "ADMIN"})
+    assert r.json() == []
+
+
+def test_admin_list_users_invalid_limit(client):
+    """limit вне диапазона 1–1000 — 422."""
+    token = _admin_token(client)
+    r = client.get("/admin/users", headers=_headers(token), params={"limit": 0})
+    assert r.status_code == 422
+
+
 def test_admin_user_not_found(client):
     """404 при несуществующем пользователе."""
     token = _admin_token(client)
@@ -286,3 +341,326 @@ def test_admin_restore_initial_state(client, unique_login, valid_password):
 
     r = client.post("/auth/login", json={"login": unique_login, "password": valid_password})
     assert r.status_code == 401
+
+
+def test_admin_bulk_block_unblock(client, unique_login, valid_password):
+    """Массовая блокировка/разблокировка по списку id: итог по каждому id, дефолтный админ пропускается."""
+    ids = []
+    for suffix in ("a", "b"):
+        r = client.post("/auth/register", json={"login": f"{unique_login}{suffix}", "password": valid_password})
+        assert r.status_code == 201
+        ids.append(r.json()["id"])
+
+    token = _admin_token(client)
+    admin_id = next(u["id"] for u in client.get("/admin/users", headers=_headers(token)).json() if u["login"] == "admin")
+    missing_id = 10**9
+    r = client.post(
+        "/admin/users/bulk/block", headers=_headers(token), json={"user_ids": [*ids, admin_id, missing_id]}
+    )
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    outcomes = {item["id"]: item["outcome"] for item in data["results"]}
+    assert outcomes == {ids[0]: "blocked", ids[1]: "blocked", admin_id: "cannot_block_admin", missing_id: "not_found"}
+    assert data["summary"] == {"blocked": 2, "cannot_block_admin": 1, "not_found": 1}
+
+    r = client.post("/auth/login", json={"login": f"{unique_login}a", "password": valid_password})
+    assert r.status_code == 403
+
+    r = client.post(
+        "/admin/users/bulk/unblock",
+        headers=_headers(token),
+        json={"filter": {"login_prefix": unique_login, "status": "BLOCKED"}},
+    )
+    assert r.status_code == 200
+    assert sorted(item["id"] for item in r.json()["results"]) == sorted(ids)
+    assert r.json()["summary"] == {"unblocked": 2}
+
+
+def test_admin_bulk_delete(client, unique_login, valid_password):
+    """Массовое удаление: пользователь со счётом не удаляется, без счетов — удаляется."""
+    r = client.post("/auth/register", json={"login": f"{unique_login}a", "password": valid_password})
+    plain_id = r.json()["id"]
+    r = client.post("/auth/register", json={"login": f"{unique_login}b", "password": valid_password})
+    with_account_id = r.json()["id"]
+    r = client.post("/auth/login", json={"login": f"{unique_login}b", "password": valid_password})
+    user_token = r.json()["access_token"]
+    r = client.post(
+        "/accounts", headers=_headers(user_token), json={"account_type": "DEBIT", "currency": "RUB"}
+    )
+    assert r.status_code in (200, 201)
+
+    token = _admin_token(client)
+    r = client.post("/admin/users/bulk/delete", headers=_headers(token), json={"user_ids": [plain_id, with_account_id]})
+    assert r.status_code == 200
+    outcomes = {item["id"]: item["outcome"] for item in r.json()["results"]}
+    assert outcomes == {plain_id: "deleted", with_account_id: "user_has_accounts"}
+    r = client.get("/admin/users", headers=_headers(token), params={"login_prefix": unique_login})
+    assert [u["id"] for u in r.json()] == [with_account_id]
+
+
+def test_admin_bulk_requires_target(client):
+    """Нужно ровно одно из user_ids / filter, пустой фильтр запрещён — 422."""
+    token = _admin_token(client)
+    assert client.post("/admin/users/bulk/block", headers=_headers(token), json={}).status_code == 422
+    r = client.post("/admin/users/bulk/block", headers=_headers(token), json={"filter": {}})
+    assert r.status_code == 422
+
+
+def test_admin_export_accounts_ndjson(client, auth_headers, rub_account):
+    """Выгрузка счетов NDJSON с keyset: строки по возрастанию id, есть логин владельца."""
+    import json
+
+    token = _admin_token(client)
+    params = {"format": "ndjson", "after_id": rub_account["id"] - 1, "limit": 1}
+    r = client.get("/admin/accounts", headers=_headers(token), params=params)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert len(rows) == 1
+    assert rows[0]["id"] == rub_account["id"]
+    assert rows[0]["account_number"] == rub_account["account_number"]
+    assert rows[0]["owner_login"]
+
+    r = client.get("/admin/accounts", headers=_headers(token), params={"after_id": rub_account["id"] - 1, "limit": 2})
+    assert r.status_code == 200
+    data = r.json()
+    assert data[0]["id"] == rub_account["id"]
+    assert all(a["id"] < b["id"] for a, b in zip(data, data[1:]))
+
+
+def test_admin_export_accounts_forbidden_for_client(client, auth_headers):
+    """Клиенту выгрузка недоступна — 403."""
+    r = client.get("/admin/accounts", headers=auth_headers)
+    assert r.status_code == 403
+
+
+def test_admin_password_pool_stats(client, auth_headers):
+    """Счётчики пула проверки паролей: админу — 200, клиенту — 403."""
+    token = _admin_token(client)
+    r = client.get("/admin/password-pool", headers=_headers(token))
+    assert r.status_code == 200
+    data = r.json()
+    for key in ("submitted", "completed", "rejected", "restarts", "in_flight", "max_pending"):
+        assert key in data
+    assert client.get("/admin/password-pool", headers=auth_headers).status_code == 403
+
+
+def test_admin_rates_refresh(client, auth_headers):
+    """Перечитывание курсов: версия совпадает с GET /transfers/rates; клиенту — 403."""
+    token = _admin_token(client)
+    r = client.post("/admin/rates/refresh", headers=_headers(token))
+    assert r.status_code == 200
+    version = r.json()["version"]
+    assert client.get("/transfers/rates", headers=auth_headers).json()["version"] == version
+    assert client.post("/admin/rates/refresh", headers=auth_headers).status_code == 403
+
+
+@pytest.mark.parametrize("coding", ["zstd", "br", "gzip"])
+def test_admin_users_compressed(client, coding):
+    """Большой список пользователей сжимается выбранной кодировкой; тело совпадает с несжатым."""
+    token = _admin_token(client)
+    plain = client.get("/admin/users", headers={**_headers(token), "Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    r = client.get("/admin/users", headers={**_headers(token), "Accept-Encoding": coding})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == coding
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) < len(plain.content)
+    assert r.json() == plain.json()
+
+
+def test_admin_accounts_export_compressed_stream(client, auth_headers):
+    """Потоковая выгрузка (StreamingResponse) тоже сжимается; тело — валидный NDJSON."""
+    ids = [
+        client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": currency}).json()["id"]
+        for currency in ("RUB", "RUB", "RUB", "USD", "EUR", "CNY")
+    ]
+    token = _admin_token(client)
+    r = client.get(
+        "/admin/accounts",
+        headers={**_headers(token), "Accept-Encoding": "gzip"},
+        params={"format": "ndjson", "after_id": min(ids) - 1},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    rows = [json.loads(line) for line in r.text.split("\n") if line]
+    assert set(ids) <= {row["id"] for row in rows}
+
+
+def test_small_response_not_compressed(client, auth_headers):
+    """Ответы меньше COMPRESSION_MIN_SIZE отдаются как есть."""
+    r = client.get("/profile", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert "content-encoding" not in r.headers
+
+
+def test_slow_queries_admin_only(client, auth_headers):
+    """Журнал медленных запросов — только админу; 404 not_found, если журнал выключен."""
+    assert client.get("/dev/slow-queries", headers=auth_headers).status_code == 403
+    token = _admin_token(client)
+    r = client.get("/dev/slow-queries", headers=_headers(token), params={"limit": 5})
+    if r.status_code == 404:
+        assert r.json().get("detail") == "not_found"
+        assert client.post("/dev/slow-queries/clear", headers=_headers(token)).status_code == 404
+        return
+    assert r.status_code == 200
+    assert r.json()["enabled"] is True
+
+
+@pytest.fixture
+def slow_query_log(monkeypatch):
+    """Журнал медленных запросов включён на время теста (только inprocess), порог 0 — медленный каждый запрос."""
+    if not IN_PROCESS:
+        pytest.skip("slow-query settings are toggled in the app: needs API_TEST_MODE=inprocess")
+    from app import slow_queries
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "slow_query_log_enabled", True)
+    monkeypatch.setattr(settings, "slow_query_explain", True)
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 0.0)
+    slow_queries.shutdown_slow_query_log()
+    slow_queries.clear_slow_queries()
+    slow_queries.init_slow_query_log()
+    yield
+    slow_queries.shutdown_slow_query_log()
+    slow_queries.clear_slow_queries()
+
+
+def test_slow_queries_report_and_safe_explain(client, token, auth_headers, two_rub_accounts, slow_query_log):
+    """Отчёт по отпечаткам; EXPLAIN ANALYZE — только для чистого чтения, блокирующие SELECT и nextval не выполняются."""
+    a, b = two_rub_accounts
+    helper_increase(client, token, a["id"], "100")
+    admin = _headers(_admin_token(client))
+    r = client.post("/transfers", headers=auth_headers, json={"from_account_id": a["id"], "to_account_id": b["id"], "amount": "10.00"})
+    assert r.status_code == 201
+    assert client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "USD"}).status_code == 201
+
+    items = []
+    for _ in range(50):
+        items = client.get("/dev/slow-queries", headers=admin, params={"limit": 500}).json()["items"]
+        if items and all(i["explain"] or i["explain_error"] for i in items):
+            break
+        time.sleep(0.1)
+    for item in items:
+        assert "'" not in item["fingerprint"]  # литералы заменены на ?
+        assert item["p50_ms"] <= item["p99_ms"] <= item["max_ms"]
+        assert 1 <= item["slow_calls"] <= item["calls"]
+
+    def plan(pattern: str) -> str:
+        item = next(i for i in items if re.search(pattern, i["fingerprint"], re.IGNORECASE))
+        assert item["explain"], item
+        return item["explain"]
+
+    assert "actual time" in plan(r"^SELECT .* FROM users WHERE users\.id = \?")
+    locked = plan(r"FOR (NO KEY )?UPDATE")
+    assert "LockRows" in locked and "actual time" not in locked
+    assert "actual time" not in plan(r"nextval\(")
+
+    assert client.post("/dev/slow-queries/clear", headers=admin).json() == {"detail": "slow_queries_cleared"}
+    assert client.get("/dev/slow-queries", headers=admin).json()["fingerprints"] <= 2
+
+
+def test_admin_tracing_status(client, auth_headers):
+    """Счётчики трассировки — только админу; при включённой трассировке входящий traceparent продолжается."""
+    token = _admin_token(client)
+    r = client.get("/admin/tracing", headers=_headers(token))
+    assert r.status_code == 200
+    stats = r.json()
+    for key in ("enabled", "requests", "kept_head", "kept_tail", "dropped_queue_full", "exported"):
+        assert key in stats
+    assert client.get("/admin/tracing", headers=auth_headers).status_code == 403
+    if stats["enabled"]:
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        r = client.get("/accounts", headers={**auth_headers, "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+        assert r.headers["traceparent"].startswith(f"00-{trace_id}-")
+        assert r.headers["traceparent"].endswith("-01")
+
+
+@pytest.fixture
+def tracing_export(tmp_path, monkeypatch):
+    """Трассировка включена на время теста (только inprocess): head-сэмплинг выключен, всё пишется в файл."""
+    if not IN_PROCESS:
+        pytest.skip("tracing settings are toggled in the app: needs API_TEST_MODE=inprocess")
+    from app import tracing
+    from app.core.config import settings
+
+    export_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "tracing_enabled", True)
+    monkeypatch.setattr(settings, "tracing_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "tracing_slow_ms", 60_000.0)
+    monkeypatch.setattr(settings, "tracing_export_file", str(export_file))
+    tracing.shutdown_tracing()
+    tracing.init_tracing()
+
+    def spans() -> dict[str, list[dict]]:
+        """Остановить экспортёр (он дописывает очередь) и собрать спаны из файла по trace_id."""
+        tracing.shutdown_tracing()
+        traces: dict[str, list[dict]] = {}
+        for line in export_file.read_text().splitlines():
+            for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]:
+                traces.setdefault(span["traceId"], []).append(span)
+        return traces
+
+    yield spans
+    tracing.shutdown_tracing()
+
+
+def _span_attrs(span: dict) -> dict:
+    return {a["key"]: next(iter(a["value"].values())) for a in span["attributes"]}
+
+
+def test_tracing_tail_sampling_keeps_slow_requests(client, auth_headers, tracing_export, monkeypatch):
+    """Без head-сэмплинга быстрый запрос отбрасывается, медленный сохраняется хвостовым сэмплингом со спанами SQL."""
+    from app.core.config import settings
+
+    token = _admin_token(client)
+    before = client.get("/admin/tracing", headers=_headers(token)).json()
+    assert before["enabled"] is True
+    fast = client.get("/accounts", headers=auth_headers)
+    assert fast.headers["traceparent"].endswith("-00")
+    monkeypatch.setattr(settings, "tracing_slow_ms", 0.0)
+    slow = client.get("/accounts", headers=auth_headers)
+    assert slow.headers["traceparent"].endswith("-00")
+    monkeypatch.setattr(settings, "tracing_slow_ms", 60_000.0)
+    after = client.get("/admin/tracing", headers=_headers(token)).json()
+    assert after["kept_tail"] == before["kept_tail"] + 1
+    assert after["kept_head"] == before["kept_head"]
+
+    traces = tracing_export()
+    assert fast.headers["traceparent"].split("-")[1] not in traces
+    spans = traces[slow.headers["traceparent"].split("-")[1]]
+    root = next(s for s in spans if "parentSpanId" not in s)
+    assert root["name"] == "GET /api/v1/accounts"
+    root_attrs = _span_attrs(root)
+    assert root_attrs["http.response.status_code"] == "200"
+    sql = [s for s in spans if s.get("parentSpanId") == root["spanId"]]
+    assert sql and int(root_attrs["db.query_count"]) == len(sql)
+    for span in sql:
+        assert span["name"].startswith("SQL ")
+        assert _span_attrs(span)["db.query.text"]
+        assert int(root["startTimeUnixNano"]) <= int(span["startTimeUnixNano"]) <= int(span["endTimeUnixNano"])
+        assert int(span["endTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+    assert root_attrs["db.duration_ms"] > 0
+
+
+def test_tracing_head_sampled_transfer_has_lock_wait(client, token, auth_headers, two_rub_accounts, tracing_export):
+    """Входящий traceparent с флагом 01 сохраняется целиком; SELECT … FOR UPDATE перевода несёт db.lock_wait_ms."""
+    a, b = two_rub_accounts
+    helper_increase(client, token, a["id"], "100")
+    trace_id = "0af7651916cd43dd8448eb211c80319c"
+    r = client.post(
+        "/transfers",
+        headers={**auth_headers, "traceparent": f"00-{trace_id}-b7ad6b7169203331-01"},
+        json={"from_account_id": a["id"], "to_account_id": b["id"], "amount": "10.00"},
+    )
+    assert r.status_code == 201
+    assert r.headers["traceparent"].startswith(f"00-{trace_id}-")
+
+    spans = tracing_export()[trace_id]
+    root = next(s for s in spans if s.get("parentSpanId") == "b7ad6b7169203331")
+    locked = [s for s in spans if _span_attrs(s).get("db.for_update")]
+    assert locked
+    assert all("db.lock_wait_ms" in _span_attrs(s) for s in locked)
+    total_lock_wait = sum(_span_attrs(s)["db.lock_wait_ms"] for s in locked)
+    assert _span_attrs(root)["db.lock_wait_ms"] == pytest.approx(total_lock_wait, abs=0.01)
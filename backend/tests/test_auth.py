@@ -1,5 +1,9 @@
 """Автотесты: авторизация (регистрация, логин)."""
+import bcrypt
 import pytest
+from sqlalchemy import text
+
+from inprocess import IN_PROCESS
 
 
 def test_register_success(client, unique_login, valid_password):
@@ -30,6 +34,22 @@ def test_register_login_not_unique(client, registered_user):
     assert r.json().get("detail") == "validation_error: login_not_unique"
 
 
+@pytest.mark.live_server
+def test_register_concurrent_same_login(base_url, unique_login, valid_password):
+    """Параллельная регистрация одного логина: ровно один 201, остальные — 409 (уникальный индекс в БД)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import httpx
+
+    def register(_):
+        with httpx.Client(base_url=base_url, timeout=15.0) as c:
+            return c.post("/auth/register", json={"login": unique_login, "password": valid_password}).status_code
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        codes = sorted(pool.map(register, range(6)))
+    assert codes == [201] + [409] * 5
+
+
 def test_login_empty_credentials(client):
     """Валидация LoginRequest: пустые логин/пароль — 422."""
     r = client.post("/auth/login", json={"login": "", "password": "x"})
@@ -45,6 +65,33 @@ def test_login_invalid_credentials(client, registered_user):
     assert r.json().get("detail") == "invalid_credentials"
 
 
+@pytest.mark.live_server
+def test_login_failed_attempts_concurrent_block(base_url, client, registered_user):
+    """Параллельные неверные пароли не теряют инкременты: после 5 неудач вход блокируется."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import httpx
+
+    login, password, _ = registered_user
+
+    def bad_login(_):
+        with httpx.Client(base_url=base_url, timeout=15.0) as c:
+            return c.post("/auth/login", json={"login": login, "password": "WrongPass123!"}).status_code
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        codes = list(pool.map(bad_login, range(4)))
+    assert codes == [401] * 4
+    r = client.post("/auth/login", json={"login": login, "password": password})
+    assert r.status_code == 200  # 4 неудачи — ещё не блокировка, успешный вход сбрасывает счётчик
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        codes = list(pool.map(bad_login, range(5)))
+    assert set(codes) <= {401, 403}
+    r = client.post("/auth/login", json={"login": login, "password": password})
+    assert r.status_code == 403
+    assert r.json().get("detail") == "user_blocked"
+
+
 def test_register_login_too_short(client):
     r = client.post("/auth/register", json={"login": "abc", "password": "ValidPass123!"})
     assert r.status_code == 422
@@ -55,11 +102,11 @@ def test_register_login_too_long(client):
     assert r.status_code == 422
 
 
-def test_register_login_boundary_valid(client):
+def test_register_login_boundary_valid(client, unique_login):
     """Логин ровно 6 символов (мин) и 20 символов (макс) — допустимы."""
-    r = client.post("/auth/register", json={"login": "abcdef", "password": "ValidPass123!"})
+    r = client.post("/auth/register", json={"login": unique_login[-6:], "password": "ValidPass123!"})
     assert r.status_code == 201
-    r = client.post("/auth/register", json={"login": "a" * 20, "password": "ValidPass123!"})
+    r = client.post("/auth/register", json={"login": unique_login.ljust(20, "a"), "password": "ValidPass123!"})
     assert r.status_code == 201
 
 
@@ -105,3 +152,88 @@ def test_login_nonexistent_user(client):
     r = client.post("/auth/login", json={"login": "nonexistent999", "password": "SomePass123!"})
     assert r.status_code == 401
     assert r.json().get("detail") == "invalid_credentials"
+
+
+@pytest.fixture
+def legacy_user(_db_module_transaction, registered_user):
+    """Пользователь со старым bcrypt-паролем ($2...). Такой записи не сделать через API —
+    хеш пишется прямо в БД, поэтому только в режиме API_TEST_MODE=inprocess (откатывается после теста)."""
+    if not IN_PROCESS:
+        pytest.skip("legacy bcrypt hash is written to the DB directly: needs API_TEST_MODE=inprocess")
+    login, password, _ = registered_user
+    # 4 раунда вместо 12: формат тот же, проверка в пуле — миллисекунды
+    legacy_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=4)).decode()
+    _set_password_hash(_db_module_transaction, login, legacy_hash)
+    return login, password, legacy_hash
+
+
+def _set_password_hash(connection, login: str, value: str) -> None:
+    connection.execute(text("UPDATE users SET password_hash = :value WHERE login = :login"), {"value": value, "login": login})
+
+
+def _password_hash(connection, login: str) -> str:
+    return connection.scalar(text("SELECT password_hash FROM users WHERE login = :login"), {"login": login})
+
+
+def _pool_stats(client) -> dict:
+    r = client.post("/auth/login", json={"login": "admin", "password": "admin"})
+    r = client.get("/admin/password-pool", headers={"Authorization": f"Bearer {r.json()['access_token']}"})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_login_legacy_bcrypt_rehashed(client, legacy_user, _db_module_transaction):
+    """Старый bcrypt-пароль проверяется в пуле процессов и после входа переписывается в текущий формат."""
+    login, password, _ = legacy_user
+    before = _pool_stats(client)
+    r = client.post("/auth/login", json={"login": login, "password": password})
+    assert r.status_code == 200
+    assert r.json()["access_token"]
+    assert _password_hash(_db_module_transaction, login) == password
+    after = _pool_stats(client)
+    assert after["submitted"] == before["submitted"] + 1
+    assert after["completed"] == before["completed"] + 1
+    # Повторный вход — уже без пула
+    assert client.post("/auth/login", json={"login": login, "password": password}).status_code == 200
+    assert _pool_stats(client)["submitted"] == after["submitted"]
+
+
+def test_login_legacy_bcrypt_wrong_password(client, legacy_user, _db_module_transaction):
+    """Неверный пароль к bcrypt-хешу — 401, хеш не переписывается."""
+    login, _, legacy_hash = legacy_user
+    r = client.post("/auth/login", json={"login": login, "password": "WrongPass123!"})
+    assert r.status_code == 401
+    assert r.json().get("detail") == "invalid_credentials"
+    assert _password_hash(_db_module_transaction, login) == legacy_hash
+
+
+def test_login_legacy_pool_overloaded(client, legacy_user, _db_module_transaction, monkeypatch):
+    """Очередь пула заполнена — сразу 503 с Retry-After, пароль не проверяется и не переписывается."""
+    from app.core.config import settings
+
+    login, password, legacy_hash = legacy_user
+    monkeypatch.setattr(settings, "password_pool_max_pending", 0)
+    rejected = _pool_stats(client)["rejected"]
+    r = client.post("/auth/login", json={"login": login, "password": password})
+    assert r.status_code == 503
+    assert r.json().get("detail") == "password_verification_overloaded"
+    assert r.headers["retry-after"] == "1"
+    assert _pool_stats(client)["rejected"] == rejected + 1
+    assert _password_hash(_db_module_transaction, login) == legacy_hash
+
+
+def test_login_legacy_pool_recovers_after_worker_death(client, legacy_user, _db_module_transaction):
+    """Процесс пула умер (BrokenProcessPool) — пул пересоздаётся, вход проходит, а не 500."""
+    from app import password_pool
+
+    login, password, legacy_hash = legacy_user
+    assert client.post("/auth/login", json={"login": login, "password": password}).status_code == 200
+    for process in list(password_pool._executor._processes.values()):
+        process.kill()
+        process.join()
+    restarts = _pool_stats(client)["restarts"]
+    _set_password_hash(_db_module_transaction, login, legacy_hash)
+    r = client.post("/auth/login", json={"login": login, "password": password})
+    assert r.status_code == 200
+    assert _pool_stats(client)["restarts"] == restarts + 1
+    assert _password_hash(_db_module_transaction, login) == password
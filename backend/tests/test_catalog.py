@@ -1,7 +1,12 @@
 """Автотесты: справочники и служебные эндпоинты (health, operators, providers, rates, banks, clear-browser)."""
+import json
+import re
+import time
+
 import pytest
 
 from conftest import get_otp
+from inprocess import IN_PROCESS
 
 
 def test_health(client):
@@ -52,6 +57,108 @@ def test_exchange_rates(client, auth_headers):
     assert float(data["toRub"]["CNY"]) == 13.5
 
 
+def test_exchange_rates_etag_is_snapshot_version(client, auth_headers):
+    """ETag курсов — версия снимка и id пользователя: одинаков во всех воркерах и после перезапуска."""
+    r = client.get("/transfers/rates", headers=auth_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert r.headers["etag"].removeprefix("W/") == f'"{data["version"]}-{data["userId"]}"'
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/payments/mobile/operators", "/payments/vendor/providers", "/transfers/rates", "/transfers/banks"],
+)
+def test_reference_data_etag(client, auth_headers, path):
+    """Справочники: ETag и кешируемый Cache-Control; с If-None-Match — 304 без тела."""
+    r = client.get(path, headers=auth_headers)
+    assert r.status_code == 200
+    # Сжатый ответ (CompressionMiddleware) получает слабый ETag; If-None-Match сравнивает без учёта W/
+    etag = r.headers["etag"]
+    assert etag.removeprefix("W/").startswith('"')
+    assert "no-store" not in r.headers["cache-control"]
+    assert r.headers["cache-control"].startswith("private")
+
+    r2 = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""
+    assert r2.headers["etag"].removeprefix("W/") == etag.removeprefix("W/")
+
+    r3 = client.get(path, headers={**auth_headers, "If-None-Match": '"stale"'})
+    assert r3.status_code == 200
+    assert r3.json() == r.json()
+
+
+def test_external_banks_list(client, auth_headers):
+    """GET /transfers/banks — внешние банки без нашего; обычные эндпоинты API по-прежнему no-store."""
+    r = client.get("/transfers/banks", headers=auth_headers)
+    assert r.status_code == 200
+    ids = [b["id"] for b in r.json()["banks"]]
+    assert "shlapabank" not in ids
+    assert "sber" in ids and len(ids) == 15
+    r = client.get("/accounts", headers=auth_headers)
+    assert "no-store" in r.headers["cache-control"]
+
+
+def test_ui_assets_fingerprinted(client):
+    """HTML ссылается на /ui/assets/<имя с хешем>; такие файлы кешируются на год и отдаются сжатыми."""
+    root = str(client._base_url).split("/api/v1")[0]
+    page = client.get(root + "/dashboard")
+    assert page.status_code == 200
+    assert "no-store" in page.headers["cache-control"]
+    match = re.search(r'/ui/assets/(dashboard\.[0-9a-f]{10}\.js)', page.text)
+    assert match, "dashboard.js не переписан на имя с хешем"
+    assert "/ui/assets/hat-side." in page.text and "/ui/hat-side.png" not in page.text
+
+    r = client.get(root + match.group(0), headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["content-type"].startswith(("application/javascript", "text/javascript"))
+    assert "loadAccounts" in r.text
+
+    r2 = client.get(root + match.group(0), headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]})
+    assert r2.status_code == 304
+    assert client.get(root + "/ui/assets/dashboard.0000000000.js").status_code == 404
+
+
+def test_metrics_endpoint(client, auth_headers):
+    """GET /metrics: счётчики по шаблону маршрута, гистограммы задержек и числа SQL-запросов, ошибки по detail."""
+    client.get("/accounts", headers=auth_headers)
+    client.delete("/accounts/999999999", headers=auth_headers)
+    root = str(client._base_url).split("/api/v1")[0]
+    r = client.get(root + "/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert '# TYPE shlapabank_http_request_duration_seconds histogram' in text
+    assert 'shlapabank_http_requests_total{method="GET",route="/api/v1/accounts",status="200"}' in text
+    assert 'shlapabank_http_request_duration_seconds_bucket{method="GET",route="/api/v1/accounts",le="+Inf"}' in text
+    assert 'shlapabank_db_queries_per_request_count{route="/api/v1/accounts"}' in text
+    assert 'detail="account_not_found"' in text
+    # В режиме inprocess commit сессии приложения — RELEASE SAVEPOINT (см. inprocess.py)
+    outcome = "release_savepoint" if IN_PROCESS else "commit"
+    assert f'shlapabank_db_transactions_total{{outcome="{outcome}"}}' in text
+    # Корзины гистограммы не убывают, +Inf совпадает с _count
+    buckets: dict[str, list[int]] = {}
+    counts: dict[str, int] = {}
+    for line in text.splitlines():
+        match = re.match(r'^(shlapabank_\w+)_(bucket|count)\{(.*?)(?:,?le="[^"]*")?\} (\d+)$', line)
+        if match:
+            series = f"{match.group(1)}{{{match.group(3)}}}"
+            if match.group(2) == "bucket":
+                buckets.setdefault(series, []).append(int(match.group(4)))
+            else:
+                counts[series] = int(match.group(4))
+    assert buckets and buckets.keys() == counts.keys()
+    for series, values in buckets.items():
+        assert values == sorted(values), series
+        assert values[-1] == counts[series], series
+    # Путь без маршрута не размножает метки
+    client.get(root + "/no-such-page-12345")
+    assert "no-such-page" not in client.get(root + "/metrics").text
+
+
 def test_daily_usage_structure(client, auth_headers):
     """Суточные лимиты имеют правильную структуру."""
     r = client.get("/transfers/daily-usage", headers=auth_headers)
@@ -85,3 +192,54 @@ def test_helper_accounts_list(client, auth_headers):
     assert r.status_code == 200
     data = r.json()
     assert isinstance(data, list)
+
+
+def test_dev_trace_recent_since(client, auth_headers):
+    """Учебная трассировка: с курсором since приходят только новые записи, next растёт."""
+    r = client.get("/dev/trace/recent")
+    if r.status_code == 404:
+        pytest.skip("ENABLE_DEV_TRACE=false")
+    assert r.status_code == 200
+    cursor = r.json()["next"]
+    marker = f"since{time.time_ns()}"
+    client.get("/accounts", headers={**auth_headers, "X-SB-Correlation-Id": marker})
+    found = []
+    for _ in range(20):
+        time.sleep(0.05)
+        data = client.get("/dev/trace/recent", params={"since": cursor}).json()
+        assert all(e["seq"] > cursor for e in data["entries"])
+        assert data["next"] >= cursor
+        cursor = data["next"]
+        found += [e for e in data["entries"] if e.get("correlation_id") == marker]
+        if found:
+            break
+    assert len(found) == 1 and found[0]["path"] == "/api/v1/accounts"
+    again = client.get("/dev/trace/recent", params={"since": cursor}).json()
+    assert not [e for e in again["entries"] if e.get("correlation_id") == marker]
+
+
+@pytest.mark.live_server
+def test_dev_trace_stream(client, auth_headers):
+    """SSE-поток трассировки: новая запись приходит событием, id события — её seq."""
+    r = client.get("/dev/trace/recent")
+    if r.status_code == 404:
+        pytest.skip("ENABLE_DEV_TRACE=false")
+    cursor = r.json()["next"]
+    marker = f"stream{time.time_ns()}"
+    with client.stream("GET", "/dev/trace/stream", params={"since": cursor}) as stream:
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in stream.headers
+        client.get("/accounts", headers={**auth_headers, "X-SB-Correlation-Id": marker})
+        event: dict[str, str] = {}
+        for line in stream.iter_lines():
+            if line:
+                key, _, value = line.partition(": ")
+                event[key] = value
+                continue
+            if "data" in event and marker in event["data"]:
+                break
+            event = {}
+    entry = json.loads(event["data"])
+    assert entry["correlation_id"] == marker
+    assert int(event["id"]) == entry["seq"] > cursor
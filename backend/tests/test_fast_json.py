@@ -0,0 +1,83 @@
+"""Автотесты: быстрый путь сериализации списков (FAST_JSON_RESPONSES) отдаёт то же, что обычный.
+
+Флаг читается в каждом запросе, поэтому тесты переключают его в приложении — только в режиме
+API_TEST_MODE=inprocess; против живого сервера сравнивать не с чем.
+"""
+import pytest
+
+from conftest import _headers, get_otp, helper_increase
+from inprocess import IN_PROCESS
+
+pytestmark = pytest.mark.skipif(not IN_PROCESS, reason="needs API_TEST_MODE=inprocess to toggle FAST_JSON_RESPONSES")
+
+
+def _admin_token(client):
+    r = client.post("/auth/login", json={"login": "admin", "password": "admin"})
+    assert r.status_code == 200, (r.status_code, r.json())
+    return r.json()["access_token"]
+
+
+@pytest.fixture
+def both_paths(client, monkeypatch):
+    """GET path в обоих режимах: (обычный JSON, быстрый JSON)."""
+    from app.core.config import settings
+
+    def get(path, headers, **params):
+        bodies = []
+        for fast in (False, True):
+            monkeypatch.setattr(settings, "fast_json_responses", fast)
+            r = client.get(path, headers=headers, params=params)
+            assert r.status_code == 200, (fast, r.status_code, r.text)
+            bodies.append(r.json())
+        return bodies
+
+    return get
+
+
+@pytest.fixture
+def account_with_history(client, token, auth_headers, two_rub_accounts):
+    """Два счёта с пополнением, переводом между своими и переводом с комиссией (по номеру счёта)."""
+    a, b = two_rub_accounts
+    helper_increase(client, token, a["id"], "1000.50")
+    r = client.post("/transfers", headers=auth_headers, json={"from_account_id": a["id"], "to_account_id": b["id"], "amount": "123.45"})
+    assert r.status_code == 201, (r.status_code, r.json())
+    r = client.post(
+        "/transfers/by-account",
+        headers=auth_headers,
+        json={"from_account_id": b["id"], "target_account_number": a["account_number"], "amount": "10.00",
+              "otp_code": get_otp(client, token)},
+    )
+    assert r.status_code == 201, (r.status_code, r.json())
+    return a, b
+
+
+def test_fast_json_transactions_match(both_paths, auth_headers, account_with_history):
+    from app.fast_json import transaction_list_adapter
+
+    plain, fast = both_paths("/transactions", auth_headers)
+    assert len(plain) >= 3
+    assert fast == plain
+    assert transaction_list_adapter.dump_python(transaction_list_adapter.validate_python(fast), mode="json") == plain
+
+
+def test_fast_json_accounts_match(both_paths, auth_headers, account_with_history):
+    from app.fast_json import account_list_adapter
+
+    plain, fast = both_paths("/accounts", auth_headers)
+    assert len(plain) >= 2
+    assert fast == plain
+    assert account_list_adapter.dump_python(account_list_adapter.validate_python(fast), mode="json") == plain
+
+
+def test_fast_json_admin_lists_match(client, both_paths, registered_user, account_with_history):
+    from app.fast_json import user_list_adapter
+
+    headers = _headers(_admin_token(client))
+    plain, fast = both_paths("/admin/users", headers, login_prefix=registered_user[0])
+    assert len(plain) == 1
+    assert fast == plain
+    assert user_list_adapter.dump_python(user_list_adapter.validate_python(fast), mode="json") == plain
+
+    plain, fast = both_paths(f"/admin/users/{plain[0]['id']}/transactions", headers)
+    assert len(plain) >= 3
+    assert fast == plain
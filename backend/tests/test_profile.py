@@ -1,4 +1,6 @@
 """Автотесты: профиль (GET/PUT, валидация, смена пароля)."""
+import time
+
 import pytest
 
 
@@ -17,13 +19,15 @@ def test_profile_get_without_token(client):
 
 
 def test_profile_put_update_name_phone_email(client, auth_headers, unique_login):
+    # Телефон уникален среди пользователей: +79991234567 уже у сидированного полного клиента
+    phone = f"+7999{time.time_ns() // 1000 % 10**7:07d}"
     r = client.put(
         "/profile",
         headers=auth_headers,
         json={
             "first_name": "Ivan",
             "last_name": "Petrov",
-            "phone": "+79991234567",
+            "phone": phone,
             "email": f"{unique_login}@test.com",
         },
     )
@@ -31,7 +35,7 @@ def test_profile_put_update_name_phone_email(client, auth_headers, unique_login)
     data = r.json()
     assert data.get("first_name") == "Ivan"
     assert data.get("last_name") == "Petrov"
-    assert data.get("phone") == "+79991234567"
+    assert data.get("phone") == phone
     assert data.get("email") == f"{unique_login}@test.com"
 
 
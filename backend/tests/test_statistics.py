@@ -9,13 +9,9 @@
 
 Логика computeStats() из dashboard.js воспроизведена здесь для верификации.
 """
-import os
 import time
-import httpx
 import pytest
 
-BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001/api/v1")
-
 
 def _headers(token: str | None = None):
     if not token:
@@ -113,12 +109,6 @@ def compute_stats(transactions: list, owned_ids: list[int]) -> dict:
     return {"incomeByCurrency": income_by_currency, "expenseByCurrency": expense_by_currency}
 
 
-@pytest.fixture(scope="module")
-def http_client():
-    with httpx.Client(base_url=BASE_URL, timeout=20.0) as client:
-        yield client
-
-
 @pytest.fixture(scope="module")
 def stats_test_user(http_client):
     """Пользователь с полным набором операций для теста статистики."""
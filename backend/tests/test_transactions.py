@@ -2,6 +2,7 @@
 import pytest
 
 from conftest import get_otp, helper_increase
+from query_budget import assert_query_count
 
 
 def test_transactions_list(client, auth_headers):
@@ -85,6 +86,7 @@ def test_transactions_fields(client, auth_headers, token, rub_account):
         assert "amount" in t["money"] and "fee" in t["money"] and "total" in t["money"] and "currency" in t["money"]
 
 
+@pytest.mark.query_budget(max_queries=5)
 def test_receipt_download(client, auth_headers, token, rub_account):
     """GET /transactions/{id}/receipt возвращает HTML-чек по своей операции."""
     otp = get_otp(client, token)
@@ -106,6 +108,8 @@ def test_receipt_download(client, auth_headers, token, rub_account):
     assert "Чек операции" in html
     assert str(tx_id) in html
     assert "50.00" in html
+    # Пользователь из токена + операция со счетами одним запросом
+    assert_query_count(rec, 2)
 
 
 def test_receipt_not_found(client, auth_headers):
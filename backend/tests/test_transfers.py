@@ -4,6 +4,7 @@ import time
 import pytest
 
 from conftest import get_otp, helper_increase
+from query_budget import assert_query_count
 
 
 # ── Между своими счетами ──
@@ -328,6 +329,8 @@ def test_transfers_by_phone_check_in_our_bank(client, auth_headers, registered_u
     assert data["inOurBank"] is True
     assert isinstance(data["availableBanks"], list)
     assert any(b["id"] == "shlapabank" for b in data["availableBanks"])
+    # Пользователь из токена + получатель с банками одним запросом
+    assert_query_count(r, 2)
 
 
 def test_transfers_by_phone_check_not_in_our_bank(client, auth_headers):
@@ -409,6 +412,7 @@ def test_transfers_rates(client, auth_headers):
     assert "toRub" in data
     for c in ("RUB", "USD", "EUR", "CNY"):
         assert c in data["toRub"]
+    assert data["version"]
 
 
 def test_transfers_daily_usage(client, auth_headers):
@@ -466,6 +470,88 @@ def test_transfers_exchange_success(client, auth_headers, token):
     data = r.json()
     assert "fx_exchange" in data["description"]
     assert "RUB" in data["description"] and "USD" in data["description"]
+    # Обмен помечен версией снимка курсов, по которому выполнен
+    rates = client.get("/transfers/rates", headers=auth_headers).json()
+    assert data["rate_snapshot_id"] == rates["version"]
+    assert data["description"].endswith(":10.00")  # 950 RUB / 95
+
+
+def test_transfers_exchange_quote(client, auth_headers, token):
+    """Котировка фиксирует курс и сумму; после quote_mismatch она остаётся в силе; обмен по quote_id
+    зачисляет ровно target_amount, повторно — 400."""
+    r1 = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "RUB"})
+    r2 = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "EUR"})
+    a_rub, a_eur = r1.json(), r2.json()
+    helper_increase(client, token, a_rub["id"], "10000")
+    body = {"from_account_id": a_rub["id"], "to_account_id": a_eur["id"], "amount": "1050.00"}
+
+    r = client.post("/transfers/exchange/quote", headers=auth_headers, json=body)
+    assert r.status_code == 201, r.json()
+    quote = r.json()
+    assert quote["source_currency"] == "RUB" and quote["target_currency"] == "EUR"
+    assert float(quote["target_amount"]) == 10.00  # 1050 RUB / 105
+    assert quote["quote_id"] and quote["expires_at"]
+
+    r = client.post(
+        "/transfers/exchange",
+        headers=auth_headers,
+        json={**body, "amount": "1000.00", "otp_code": get_otp(client, token), "quote_id": quote["quote_id"]},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "quote_mismatch"
+
+    r = client.post(
+        "/transfers/exchange",
+        headers=auth_headers,
+        json={**body, "otp_code": get_otp(client, token), "quote_id": quote["quote_id"]},
+    )
+    assert r.status_code == 201, r.json()
+    assert r.json()["rate_snapshot_id"] == quote["rate_snapshot_id"]
+    accounts = {a["id"]: a for a in client.get("/accounts", headers=auth_headers).json()}
+    assert float(accounts[a_eur["id"]]["balance"]) == float(quote["target_amount"])
+
+    r = client.post(
+        "/transfers/exchange",
+        headers=auth_headers,
+        json={**body, "otp_code": get_otp(client, token), "quote_id": quote["quote_id"]},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "quote_not_found_or_expired"
+
+
+def test_transfers_exchange_quote_survives_insufficient_funds(client, auth_headers, token):
+    """Обмен по котировке отклонён из-за нехватки средств — после пополнения та же котировка проходит."""
+    r1 = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "RUB"})
+    r2 = client.post("/accounts", headers=auth_headers, json={"account_type": "DEBIT", "currency": "USD"})
+    a_rub, a_usd = r1.json(), r2.json()
+    helper_increase(client, token, a_rub["id"], "500")
+    body = {"from_account_id": a_rub["id"], "to_account_id": a_usd["id"], "amount": "950.00"}
+    quote = client.post("/transfers/exchange/quote", headers=auth_headers, json=body).json()
+
+    exchange = {**body, "quote_id": quote["quote_id"]}
+    r = client.post("/transfers/exchange", headers=auth_headers, json={**exchange, "otp_code": get_otp(client, token)})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "insufficient_funds"
+
+    helper_increase(client, token, a_rub["id"], "500")
+    r = client.post("/transfers/exchange", headers=auth_headers, json={**exchange, "otp_code": get_otp(client, token)})
+    assert r.status_code == 201, r.json()
+    assert r.json()["rate_snapshot_id"] == quote["rate_snapshot_id"]
+    accounts = {a["id"]: a for a in client.get("/accounts", headers=auth_headers).json()}
+    assert float(accounts[a_rub["id"]]["balance"]) == 50.00
+    assert float(accounts[a_usd["id"]]["balance"]) == float(quote["target_amount"]) == 10.00
+
+
+def test_transfers_exchange_quote_same_currency(client, auth_headers, two_rub_accounts):
+    """Котировка между счетами одной валюты — 400 currency_mismatch."""
+    a1, a2 = two_rub_accounts
+    r = client.post(
+        "/transfers/exchange/quote",
+        headers=auth_headers,
+        json={"from_account_id": a1["id"], "to_account_id": a2["id"], "amount": "100.00"},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "currency_mismatch"
 
 
 def test_transfers_exchange_currency_mismatch(client, auth_headers, token, two_rub_accounts):
@@ -1,14 +1,20 @@
 /**
- * Учебная панель: перехват fetch (клиент) + опрос GET /api/v1/dev/trace/recent (сервер).
+ * Учебная панель: перехват fetch (клиент) + серверные записи трассировки. Основной путь — поток
+ * GET /api/v1/dev/trace/stream (EventSource, сервер сам присылает новые записи); если поток недоступен —
+ * опрос GET /api/v1/dev/trace/recent?since=…. Панель копит записи сама (не больше MAX_SERVER).
  * Секреты в телах JSON маскируются.
  */
 (function () {
   var MAX_CLIENT = 100;
+  var MAX_SERVER = 200;
   var POLL_MS = 1800;
   var clientEntries = [];
   var serverEntries = [];
+  var serverCursor = 0;
   var panelOpen = false;
   var pollTimer = null;
+  var stream = null;
+  var renderQueued = false;
   var paused = false;
   var LOG_H_KEY = "sb_dev_log_panel_h_px";
   var freezeLogRender = false;
@@ -410,37 +416,83 @@
     if (!panelOpen || paused) return;
     var o = apiOrigin();
     origFetch
-      .call(window, o + "/api/v1/dev/trace/recent", { headers: { Accept: "application/json" } })
+      .call(window, o + "/api/v1/dev/trace/recent?since=" + serverCursor, { headers: { Accept: "application/json" } })
       .then(function (r) {
         if (r.status === 404) {
           serverEntries = [];
+          serverCursor = 0;
           render();
           return null;
         }
         return r.json();
       })
       .then(function (data) {
-        if (data && Array.isArray(data.entries)) {
-          serverEntries = data.entries;
-          render();
-        }
+        if (!data || !Array.isArray(data.entries)) return;
+        if (typeof data.next === "number") serverCursor = data.next;
+        addServerEntries(data.entries);
       })
       .catch(function () {});
   }
 
-  function startPoll() {
-    stopPoll();
+  function addServerEntries(list) {
+    if (!list.length) return;
+    serverEntries = serverEntries.concat(list);
+    if (serverEntries.length > MAX_SERVER) serverEntries = serverEntries.slice(-MAX_SERVER);
+    // Поток может прислать много записей подряд — перерисовка не чаще кадра
+    if (renderQueued) return;
+    renderQueued = true;
+    requestAnimationFrame(function () {
+      renderQueued = false;
+      render();
+    });
+  }
+
+  function startIntervalPoll() {
     pollTimer = window.setInterval(function () {
       pollServer();
     }, POLL_MS);
     pollServer();
   }
 
+  function openStream() {
+    var es = new EventSource(apiOrigin() + "/api/v1/dev/trace/stream?since=" + serverCursor);
+    stream = es;
+    es.onmessage = function (ev) {
+      var entry;
+      try {
+        entry = JSON.parse(ev.data);
+      } catch (e) {
+        return;
+      }
+      if (typeof entry.seq === "number") serverCursor = entry.seq;
+      addServerEntries([entry]);
+    };
+    es.onerror = function () {
+      // Обрыв — EventSource переподключится сам (с Last-Event-ID); CLOSED — сервер отказал (404/503): опрос
+      if (es.readyState !== EventSource.CLOSED || stream !== es) return;
+      stream = null;
+      if (panelOpen && !paused && !pollTimer) startIntervalPoll();
+    };
+  }
+
+  function startPoll() {
+    stopPoll();
+    if (typeof window.EventSource === "function") {
+      openStream();
+    } else {
+      startIntervalPoll();
+    }
+  }
+
   function stopPoll() {
     if (pollTimer) {
       window.clearInterval(pollTimer);
       pollTimer = null;
     }
+    if (stream) {
+      stream.close();
+      stream = null;
+    }
   }
 
   function buildUi() {
@@ -610,10 +662,10 @@
           headers: { Accept: "application/json" },
         })
         .then(function () {
-          if (panelOpen && !paused) pollServer();
+          if (panelOpen && !paused && !stream) pollServer();
         })
         .catch(function () {
-          if (panelOpen && !paused) pollServer();
+          if (panelOpen && !paused && !stream) pollServer();
         });
     });
 
@@ -647,7 +699,11 @@
     document.getElementById("sbDevLogPause").addEventListener("click", function () {
       paused = !paused;
       document.getElementById("sbDevLogPause").textContent = paused ? "Продолжить" : "Пауза";
-      if (!paused && panelOpen) pollServer();
+      if (paused) {
+        stopPoll();
+      } else if (panelOpen) {
+        startPoll();
+      }
     });
   }
 